@@ -1,208 +1,1541 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import seaborn as sns
-from datetime import datetime, timedelta
+import argparse
+import contextlib
+import hashlib
+import io
+import json
+import logging
+import os
+import queue
+import sys
+import threading
+import time
+import tracemalloc
 import warnings
+import zlib
+from collections import OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor
+from types import MappingProxyType
+try:
+    import resource
+except ImportError:  # Windows : pas de mesure du RSS
+    resource = None
 warnings.filterwarnings('ignore')
 
+
+def _pyplot():
+    """Importe matplotlib.pyplot au premier rendu : générer des données ne charge pas la pile graphique"""
+    import matplotlib.pyplot as plt
+    return plt
+
+
+# Calendrier des chocs appliqués au marché bordelais. Chaque événement
+# multiplie une colonne sur une plage d'années (annee_fin=None : sans fin),
+# éventuellement restreinte à une liste de communes (communes=None : toutes).
+BORDEAUX_EVENTS = [
+    # Développement du tramway (phases successives)
+    {"evenement": "Lancement tramway", "annee_debut": 2003, "annee_fin": 2004,
+     "colonne": "Investissement_Transport", "multiplicateur": 2.5, "communes": None},
+    {"evenement": "Extensions tramway", "annee_debut": 2007, "annee_fin": 2008,
+     "colonne": "Investissement_Transport", "multiplicateur": 2.0, "communes": None},
+    {"evenement": "Nouvelles lignes tramway", "annee_debut": 2014, "annee_fin": 2015,
+     "colonne": "Investissement_Transport", "multiplicateur": 1.8, "communes": None},
+    # Boom immobilier bordelais (2010-2019)
+    {"evenement": "Boom immobilier", "annee_debut": 2010, "annee_fin": 2019,
+     "colonne": "Prix_m2_Moyen", "multiplicateur": 1.05, "communes": None},
+    {"evenement": "Boom immobilier", "annee_debut": 2010, "annee_fin": 2019,
+     "colonne": "Transactions_Immobilieres", "multiplicateur": 1.08, "communes": None},
+    {"evenement": "Boom immobilier", "annee_debut": 2010, "annee_fin": 2019,
+     "colonne": "Investissement_Immobilier", "multiplicateur": 1.3, "communes": None},
+    # Effet Cité du Vin (2016)
+    {"evenement": "Cité du Vin", "annee_debut": 2016, "annee_fin": 2016,
+     "colonne": "Investissement_Tourisme", "multiplicateur": 2.0, "communes": None},
+    {"evenement": "Cité du Vin", "annee_debut": 2016, "annee_fin": 2016,
+     "colonne": "Investissement_Culture", "multiplicateur": 1.8, "communes": None},
+    # Impact COVID-19 (2020-2021) - marché résilient à Bordeaux
+    {"evenement": "COVID-19", "annee_debut": 2020, "annee_fin": 2020,
+     "colonne": "Transactions_Immobilieres", "multiplicateur": 0.80, "communes": None},
+    {"evenement": "Reprise post-COVID", "annee_debut": 2021, "annee_fin": 2021,
+     "colonne": "Prix_m2_Moyen", "multiplicateur": 1.03, "communes": None},
+    {"evenement": "Reprise post-COVID", "annee_debut": 2021, "annee_fin": 2021,
+     "colonne": "Transactions_Immobilieres", "multiplicateur": 1.10, "communes": None},
+    # Plan de relance métropolitain (2022-2025)
+    {"evenement": "Plan de relance", "annee_debut": 2022, "annee_fin": None,
+     "colonne": "Investissement_Transport", "multiplicateur": 1.15, "communes": None},
+    {"evenement": "Plan de relance", "annee_debut": 2022, "annee_fin": None,
+     "colonne": "Investissement_Immobilier", "multiplicateur": 1.20, "communes": None},
+    {"evenement": "Plan de relance", "annee_debut": 2022, "annee_fin": None,
+     "colonne": "Nouveaux_Logements", "multiplicateur": 1.25, "communes": None},
+]
+
+
+def load_events(path):
+    """Charge des événements de scénario depuis un fichier JSON ou CSV
+    
+    Le JSON est une liste d'objets reprenant les clés de BORDEAUX_EVENTS.
+    Le CSV a les mêmes colonnes ; annee_fin et communes peuvent être vides,
+    les communes étant séparées par des points-virgules. Les colonnes
+    facultatives mois_debut et mois_fin (1-12) situent le choc dans l'année
+    pour les séries trimestrielles ou mensuelles.
+    """
+    if os.path.splitext(path)[1].lower() == '.json':
+        with open(path, encoding='utf-8') as f:
+            raw_events = json.load(f)
+    else:
+        raw_events = pd.read_csv(path, dtype=str, keep_default_na=False).to_dict('records')
+    
+    events = []
+    for raw in raw_events:
+        annee_fin = raw.get("annee_fin")
+        mois_debut = raw.get("mois_debut")
+        mois_fin = raw.get("mois_fin")
+        communes = raw.get("communes")
+        if isinstance(communes, str):
+            communes = [c.strip() for c in communes.split(';') if c.strip()]
+        events.append({
+            "evenement": raw.get("evenement", ""),
+            "annee_debut": int(raw["annee_debut"]),
+            "annee_fin": int(annee_fin) if annee_fin not in (None, "") else None,
+            "mois_debut": int(mois_debut) if mois_debut not in (None, "") else None,
+            "mois_fin": int(mois_fin) if mois_fin not in (None, "") else None,
+            "colonne": raw["colonne"],
+            "multiplicateur": float(raw["multiplicateur"]),
+            "communes": communes or None,
+        })
+    return events
+
+
+# Version du modèle de simulation : à incrémenter à chaque changement des
+# formules ou du calendrier, afin d'invalider les résultats en cache
+MODEL_VERSION = 4
+
+# Indicateurs produits par generate_financial_data, dans l'ordre des colonnes
+INDICATOR_COLUMNS = [
+    'Population', 'Menages',
+    'Recettes_Totales', 'Impots_Locaux', 'Dotations_Etat', 'Autres_Recettes',
+    'Depenses_Totales', 'Fonctionnement', 'Investissement', 'Charge_Dette', 'Personnel',
+    'Epargne_Brute', 'Dette_Totale', 'Taux_Endettement', 'Taux_Fiscalite',
+    'Prix_m2_Moyen', 'Transactions_Immobilieres', 'Nouveaux_Logements', 'Taxe_Fonciere', 'Taxe_Habitation',
+    'Investissement_Immobilier', 'Investissement_Transport', 'Investissement_Viticole',
+    'Investissement_Tourisme', 'Investissement_Culture', 'Investissement_Education',
+]
+
+# Fréquences de la série produite : nombre de périodes par an
+FREQUENCIES = {"A": 1, "Q": 4, "M": 12}
+
+# Indicateurs de stock (niveaux, taux, prix) : interpolés d'une fin d'année à la suivante.
+# Les autres indicateurs sont des flux annuels, répartis également entre les périodes.
+STOCK_COLUMNS = ['Population', 'Menages', 'Dette_Totale', 'Taux_Endettement', 'Taux_Fiscalite',
+                 'Prix_m2_Moyen']
+
+# Panneaux du tableau de bord, dans l'ordre de la grille 5 x 2 :
+# (nom, méthode de tracé, colonnes lues en plus de Annee)
+DASHBOARD_PANELS = [
+    ("recettes_depenses", "_plot_revenue_expenses", ['Recettes_Totales', 'Depenses_Totales']),
+    ("structure_recettes", "_plot_revenue_structure", ['Impots_Locaux', 'Dotations_Etat', 'Autres_Recettes']),
+    ("prix_immobiliers", "_plot_real_estate_prices", ['Prix_m2_Moyen']),
+    ("activite_immobiliere", "_plot_real_estate_activity", ['Transactions_Immobilieres', 'Nouveaux_Logements']),
+    ("structure_depenses", "_plot_expenses_structure",
+     ['Fonctionnement', 'Investissement', 'Charge_Dette', 'Personnel']),
+    ("investissements", "_plot_investments",
+     ['Investissement_Immobilier', 'Investissement_Transport', 'Investissement_Viticole',
+      'Investissement_Tourisme', 'Investissement_Education']),
+    ("dette", "_plot_debt", ['Dette_Totale', 'Taux_Endettement']),
+    ("performance", "_plot_performance_indicators", ['Epargne_Brute', 'Taux_Fiscalite']),
+    ("demographie", "_plot_demography", ['Population', 'Menages']),
+    ("investissements_sectoriels", "_plot_sectorial_investments",
+     ['Investissement_Immobilier', 'Investissement_Transport', 'Investissement_Viticole',
+      'Investissement_Tourisme', 'Investissement_Education']),
+]
+
+# Taille d'une tuile de panneau (pouces) : la moitié de la largeur du tableau de bord
+PANEL_FIGSIZE = (10, 5.6)
+
+# Tableau de bord complet : taille (pouces), mise en page fixe et résolutions prédéfinies
+DASHBOARD_FIGSIZE = (20, 28)
+DASHBOARD_LAYOUT = dict(left=0.05, right=0.95, bottom=0.03, top=0.95, wspace=0.3, hspace=0.3)
+RENDER_PRESETS = {
+    "preview": {"dpi": 50},
+    "screen": {"dpi": 100},
+    "print": {"dpi": 300},
+}
+
+# Vue comparative (petits multiples) : taille d'une case (pouces) et espaces entre cases
+# (en fraction de case : place des noms de communes et des graduations)
+COMPARISON_CELL_SIZE = (2.4, 1.6)
+COMPARISON_GAPS = (0.18, 0.45)
+
+# Liste des communes de Bordeaux Métropole
+BORDEAUX_METROPOLE_COMMUNES = [
+    "Bordeaux", "Mérignac", "Pessac", "Talence", "Bègles", 
+    "Villenave-d'Ornon", "Gradignan", "Cenon", "Floirac", "Bouliac",
+    "Parempuyre", "Le Haillan", "Saint-Médard-en-Jalles", "Eysines", 
+    "Bruges", "Blanquefort", "Lormont", "Carbon-Blanc", "Ambès", "Bassens"
+]
+
+# Référentiel des communes (configuration de chaque commune, par code INSEE et par nom)
+COMMUNES_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'communes.json')
+
+# Configuration des communes absentes du référentiel
+DEFAULT_COMMUNE_CONFIG = {
+    "population_base": 15000,
+    "budget_base": 30,
+    "type": "residentielle",
+    "specialites": ["residential", "commerce_local", "services"],
+    "prix_m2_base": 2000,
+    "segment_immobilier": "mixte"
+}
+
+# Champs numériques de la configuration, exposés en tableaux float64
+NUMERIC_CONFIG_KEYS = ("population_base", "budget_base", "prix_m2_base")
+
+
+class CommuneRegistry:
+    """Référentiel immuable des configurations de communes, indexé par nom et code INSEE
+    
+    Le fichier (JSON, TOML ou CSV) n'est lu qu'une fois par processus :
+    CommuneRegistry.load() garde les registres chargés au niveau de la classe.
+    Les configurations sont stockées en colonnes (tableaux NumPy en lecture
+    seule, types et segments codés en entiers) ; une commune se retrouve en
+    O(1) par son nom ou son code INSEE.
+    """
+    
+    _loaded = {}
+    _lock = threading.Lock()
+    
+    def __init__(self, records, default=None):
+        records = list(records)
+        default = dict(default or DEFAULT_COMMUNE_CONFIG)
+        default["specialites"] = tuple(default["specialites"])
+        self.default = MappingProxyType(default)
+        self.names = tuple(record["nom"] for record in records)
+        self.insee = tuple(str(record.get("insee") or "") for record in records)
+        self.departements = tuple(str(record.get("departement") or self._departement(code))
+                                  for record, code in zip(records, self.insee))
+        
+        self._index = {}
+        for row, (name, code) in enumerate(zip(self.names, self.insee)):
+            self._index[name] = row
+            if code:
+                self._index[code] = row
+        
+        self.arrays = {}
+        for key in NUMERIC_CONFIG_KEYS:
+            self.arrays[key] = self._frozen(np.array([float(record[key]) for record in records]))
+        # Types et segments : libellés triés et code entier de chaque commune
+        for key, attribute in (("type", "types"), ("segment_immobilier", "segments")):
+            labels = tuple(sorted({record[key] for record in records}))
+            codes = {label: code for code, label in enumerate(labels)}
+            setattr(self, attribute, labels)
+            self.arrays[key + "_code"] = self._frozen(
+                np.array([codes[record[key]] for record in records], dtype=np.int32))
+        self.specialites = tuple(tuple(record["specialites"]) for record in records)
+        
+        self._configs = tuple(MappingProxyType({
+            "population_base": record["population_base"],
+            "budget_base": record["budget_base"],
+            "type": record["type"],
+            "specialites": specialites,
+            "prix_m2_base": record["prix_m2_base"],
+            "segment_immobilier": record["segment_immobilier"],
+        }) for record, specialites in zip(records, self.specialites))
+    
+    @staticmethod
+    def _departement(code):
+        """Département déduit du code INSEE (trois caractères outre-mer)"""
+        return code[:3] if code.startswith('97') else code[:2]
+    
+    @staticmethod
+    def _frozen(array):
+        """Rend un tableau non modifiable (le registre est partagé par tout le processus)"""
+        array.flags.writeable = False
+        return array
+    
+    @classmethod
+    def load(cls, path=None):
+        """Retourne le registre du fichier donné, lu et indexé au premier appel seulement"""
+        path = os.path.abspath(path or COMMUNES_FILE)
+        registry = cls._loaded.get(path)
+        if registry is None:
+            with cls._lock:
+                registry = cls._loaded.get(path)
+                if registry is None:
+                    registry = cls._loaded[path] = cls(*cls._read(path))
+        return registry
+    
+    @staticmethod
+    def _read(path):
+        """Lit les communes (et une éventuelle configuration par défaut) d'un fichier JSON, TOML ou CSV"""
+        extension = os.path.splitext(path)[1].lower()
+        if extension == '.csv':
+            import csv
+            with open(path, encoding='utf-8', newline='') as f:
+                records = list(csv.DictReader(f))
+            for record in records:
+                record["specialites"] = [s.strip() for s in record["specialites"].split(';') if s.strip()]
+                for key in NUMERIC_CONFIG_KEYS:
+                    record[key] = float(record[key])
+            return records, None
+        
+        if extension == '.toml':
+            import tomllib
+            with open(path, 'rb') as f:
+                content = tomllib.load(f)
+        else:
+            with open(path, encoding='utf-8') as f:
+                content = json.load(f)
+        return content["communes"], content.get("defaut")
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def __contains__(self, key):
+        return key in self._index
+    
+    def row(self, key):
+        """Indice de la commune (nom ou code INSEE) dans les tableaux du registre, -1 si inconnue"""
+        return self._index.get(key, -1)
+    
+    def name(self, key):
+        """Nom de la commune désignée par son nom ou son code INSEE (la clé elle-même si inconnue)"""
+        row = self.row(key)
+        return self.names[row] if row >= 0 else key
+    
+    def config(self, key):
+        """Configuration (non modifiable) d'une commune, ou la configuration par défaut"""
+        row = self.row(key)
+        return self._configs[row] if row >= 0 else self.default
+    
+    def columns(self, keys):
+        """Configurations de plusieurs communes en colonnes (une ligne par commune)
+        
+        Les champs numériques sont des tableaux float64, les autres des tableaux
+        d'objets ; les communes inconnues reçoivent la configuration par défaut.
+        """
+        # L'indice -1 des communes inconnues désigne la configuration par défaut, ajoutée en dernier
+        rows = np.array([self.row(key) for key in keys], dtype=np.int64)
+        columns = {}
+        for key in NUMERIC_CONFIG_KEYS:
+            columns[key] = np.append(self.arrays[key], float(self.default[key]))[rows]
+        configs = self._configs + (self.default,)
+        for key in ("type", "specialites", "segment_immobilier"):
+            column = np.empty(len(rows), dtype=object)
+            for i, row in enumerate(rows):
+                column[i] = configs[row][key]
+            columns[key] = column
+        return columns
+
+
+def commune_registry(path=None):
+    """Registre des communes du processus
+    
+    Sans chemin, le fichier est celui de la variable d'environnement
+    BORD_COMMUNES_FILE (héritée par les workers), sinon communes.json.
+    """
+    return CommuneRegistry.load(path or os.environ.get('BORD_COMMUNES_FILE'))
+
+
+def metropole_communes():
+    """Retourne toutes les communes du référentiel, celles de la liste métropolitaine en premier"""
+    registry = commune_registry()
+    communes = [name for name in BORDEAUX_METROPOLE_COMMUNES if name in registry]
+    communes += [name for name in registry.names if name not in communes]
+    return communes
+
+
+# Le flux d'une commune est tiré année par année, NOISE_COLUMNS tirages par année (un par
+# indicateur bruité, dans l'ordre de _simulate_columns) : l'année start_year + i reçoit
+# toujours la ligne i, quelle que soit la période simulée, et seules les années utiles sont tirées
+NOISE_COLUMNS = 24
+
+# Monte Carlo : chaque tranche de MONTE_CARLO_BLOCK réplicats a son propre flux, de clé
+# (MONTE_CARLO_STREAM, numéro de tranche) ; la taille des blocs traités n'y change rien
+MONTE_CARLO_STREAM = zlib.crc32(b'monte_carlo')
+MONTE_CARLO_BLOCK = 256
+
+
+def commune_seed_sequence(seed, commune, replicate=0):
+    """Dérive la SeedSequence indépendante d'une commune et d'un réplicat
+    
+    La clé de dérivation ne dépend que du nom de la commune et du numéro de
+    réplicat : l'ordre de traitement ou la répartition des communes entre
+    plusieurs workers n'a donc aucune influence sur les tirages. Le réplicat
+    peut aussi être un tuple d'entiers (bloc de réplicats de Monte Carlo).
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    commune_key = zlib.crc32(commune.encode('utf-8'))
+    replicate_key = tuple(replicate) if isinstance(replicate, tuple) else (replicate,)
+    return np.random.SeedSequence(seed.entropy,
+                                  spawn_key=tuple(seed.spawn_key) + (commune_key,) + replicate_key)
+
+
+def resample_to_periods(values, periods, stock=False, anchor=None):
+    """Passe une série annuelle (dernier axe) à `periods` périodes par an
+    
+    Un flux est réparti également entre les périodes de l'année. Un stock est
+    interpolé linéairement entre la fin de l'année précédente et la fin de
+    l'année, la dernière période retrouvant exactement la valeur annuelle
+    (la première année, avant tout point d'ancrage, reste constante). Pour
+    prolonger une série, `anchor` donne la fin de l'année qui précède.
+    """
+    if periods == 1:
+        return values
+    values = np.asarray(values, dtype=float)
+    if stock:
+        first = values[..., :1] if anchor is None else np.broadcast_to(anchor, values.shape[:-1])[..., None]
+        previous = np.concatenate([first, values[..., :-1]], axis=-1)
+        weights = np.arange(1, periods + 1) / periods
+        resampled = previous[..., None] + (values - previous)[..., None] * weights
+    else:
+        resampled = np.broadcast_to((values / periods)[..., None], values.shape + (periods,))
+    return resampled.reshape(values.shape[:-1] + (values.shape[-1] * periods,))
+
+
+def aggregate_to_annual(df):
+    """Ramène une série infra-annuelle (colonne Periode) à l'année : somme des flux, fin d'année des stocks"""
+    if 'Periode' not in df.columns:
+        return df
+    keys = [column for column in ('Commune', 'Annee') if column in df.columns]
+    rules = {column: 'last' if column in STOCK_COLUMNS else 'sum'
+             for column in df.columns if column not in keys + ['Periode']}
+    return df.groupby(keys, sort=False, observed=True).agg(rules).reset_index()
+
+
+# Fichiers DVF (Demandes de Valeurs Foncières) : colonnes lues et leur nom commun, selon la
+# présentation du fichier, brute de la DGFiP (valeursfoncieres-AAAA.txt, séparateur |)
+# ou géolocalisée d'Etalab (AAAA.csv, séparateur ,)
+DVF_LAYOUTS = {
+    "dgfip": {"sep": "|", "columns": {
+        "No disposition": "disposition", "Date mutation": "date", "Nature mutation": "nature",
+        "Valeur fonciere": "valeur",
+        "Code departement": "departement", "Code commune": "code_commune",
+        "Type local": "type_local", "Surface reelle bati": "surface"}},
+    "etalab": {"sep": ",", "columns": {
+        "id_mutation": "mutation", "date_mutation": "date", "nature_mutation": "nature",
+        "valeur_fonciere": "valeur", "code_commune": "insee",
+        "type_local": "type_local", "surface_reelle_bati": "surface"}},
+}
+
+# Mutations retenues : ventes d'un seul logement, avec au plus des dépendances (et terrains)
+DVF_RESIDENTIAL_TYPES = ('Appartement', 'Maison')
+DVF_ANNEX_TYPES = ('Dépendance',)
+
+# Histogramme des prix au m² (€) par commune et par année : bornes et largeur des classes.
+# Tant qu'une commune compte au plus DVF_EXACT_SALES ventes dans l'année, ses prix sont
+# gardés et la médiane est exacte ; au-delà, elle est interpolée dans sa classe de
+# l'histogramme (à moins d'une classe près), en mémoire fixe quel que soit le volume lu.
+DVF_PRICE_RANGE = (0, 30000)
+DVF_PRICE_BIN = 10
+DVF_EXACT_SALES = 1000
+DVF_CHUNKSIZE = 250_000
+
+
+class DvfAccumulator:
+    """Agrège des ventes en mémoire bornée : prix au m² par commune et par année
+    
+    Chaque commune-année garde ses prix tant qu'elle n'a pas plus de
+    exact_sales ventes (médiane exacte), et alimente dans tous les cas un
+    histogramme qui prend le relais au-delà. La mémoire ne dépend que du
+    nombre de communes, d'années, de classes et d'exact_sales, pas du nombre
+    de ventes. Les prix hors de price_range comptent dans la première ou la
+    dernière classe de l'histogramme.
+    """
+    
+    def __init__(self, codes, price_range=DVF_PRICE_RANGE, bin_width=DVF_PRICE_BIN,
+                 exact_sales=DVF_EXACT_SALES):
+        self.codes = pd.Index(codes)
+        self.low = price_range[0]
+        self.bin_width = bin_width
+        self.bins = int(np.ceil((price_range[1] - price_range[0]) / bin_width))
+        self.exact_sales = exact_sales
+        self.histograms = {}
+        # (année, indice de commune) -> prix gardés, ou None une fois exact_sales dépassé
+        self.prices = {}
+    
+    def add(self, insee, years, prices):
+        """Ajoute des ventes : code INSEE, année et prix au m² de chacune"""
+        rows = self.codes.get_indexer(insee)
+        prices = np.asarray(prices, dtype=float)
+        bins = np.clip((prices - self.low) // self.bin_width, 0, self.bins - 1).astype(np.int64)
+        years = np.asarray(years)
+        for year in np.unique(years):
+            selected = years == year
+            histogram = self.histograms.setdefault(int(year), np.zeros((len(self.codes), self.bins), np.int64))
+            histogram += np.bincount(rows[selected] * self.bins + bins[selected],
+                                     minlength=histogram.size).reshape(histogram.shape)
+            for row in np.unique(rows[selected]):
+                key = (int(year), int(row))
+                kept = self.prices.get(key, [])
+                if kept is None:
+                    continue
+                kept.append(prices[selected & (rows == row)])
+                self.prices[key] = kept if histogram[row].sum() <= self.exact_sales else None
+    
+    def table(self):
+        """Nombre de ventes et prix médian au m² par commune et par année (communes sans vente exclues)"""
+        frames = []
+        for year, histogram in sorted(self.histograms.items()):
+            counts = histogram.sum(axis=1)
+            rows = np.flatnonzero(counts)
+            histogram, counts = histogram[rows], counts[rows]
+            cumulative = histogram.cumsum(axis=1)
+            half = counts / 2
+            # Classe de la médiane, puis interpolation linéaire à l'intérieur de la classe
+            median_bin = (cumulative < half[:, None]).sum(axis=1)
+            before = np.where(median_bin > 0, cumulative[np.arange(len(rows)), median_bin - 1], 0)
+            inside = histogram[np.arange(len(rows)), median_bin]
+            median = self.low + self.bin_width * (median_bin + (half - before) / inside)
+            # Médiane exacte des communes dont les prix ont été gardés
+            for i, row in enumerate(rows):
+                kept = self.prices.get((year, int(row)))
+                if kept is not None:
+                    median[i] = np.median(np.concatenate(kept))
+            frames.append(pd.DataFrame({'Insee': self.codes[rows], 'Annee': year,
+                                        'Prix_m2_Moyen': median, 'Transactions_Immobilieres': counts}))
+        columns = ['Insee', 'Annee', 'Prix_m2_Moyen', 'Transactions_Immobilieres']
+        return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=columns)
+
+
+def _dvf_layout(path):
+    """Présentation (DVF_LAYOUTS) d'un fichier DVF, reconnue à son en-tête"""
+    for layout, spec in DVF_LAYOUTS.items():
+        header = pd.read_csv(path, sep=spec["sep"], nrows=0)
+        if set(spec["columns"]) <= set(header.columns):
+            return layout
+    raise ValueError(f"{path}: en-tête DVF non reconnu (fichier DGFiP ou Etalab attendu)")
+
+
+def _dvf_chunks(path, codes, chunksize=DVF_CHUNKSIZE):
+    """Lit un fichier DVF par blocs et ne garde que les ventes des communes données
+    
+    Chaque bloc a les colonnes mutation, insee, annee, nature, valeur,
+    type_local et surface. Les lignes d'une même mutation se suivent dans les
+    fichiers : la dernière mutation d'un bloc est reportée au bloc suivant.
+    Les fichiers DGFiP n'ont pas d'identifiant de mutation : date, valeur,
+    commune et numéro de disposition en tiennent lieu. Deux ventes distinctes
+    d'une même commune, le même jour et au même prix y sont donc confondues
+    (et écartées si chacune porte un logement) ; les fichiers Etalab, qui
+    ont un identifiant, n'ont pas cette limite.
+    """
+    layout = _dvf_layout(path)
+    spec = DVF_LAYOUTS[layout]
+    reader = pd.read_csv(path, sep=spec["sep"], usecols=list(spec["columns"]), dtype=str,
+                         chunksize=chunksize)
+    carry = None
+    for chunk in reader:
+        chunk = chunk.rename(columns=spec["columns"])
+        if layout == "dgfip":
+            departement = chunk['departement'].str.zfill(2)
+            departement = departement.where(~departement.str.startswith('97'), departement.str[:2])
+            chunk['insee'] = departement + chunk['code_commune'].str.zfill(3)
+            chunk['mutation'] = (chunk['date'] + '|' + chunk['valeur'] + '|' + chunk['insee'] + '|'
+                                 + chunk['disposition'].fillna(''))
+            chunk['annee'] = chunk['date'].str[-4:]
+        else:
+            chunk['annee'] = chunk['date'].str[:4]
+        chunk = chunk.loc[chunk['insee'].isin(codes) & (chunk['nature'] == 'Vente'),
+                          ['mutation', 'insee', 'annee', 'nature', 'valeur', 'type_local', 'surface']]
+        if carry is not None:
+            chunk = pd.concat([carry, chunk], ignore_index=True)
+        if chunk.empty:
+            carry = None
+            continue
+        last = chunk['mutation'].to_numpy() == chunk['mutation'].iat[-1]
+        carry = chunk[last]
+        if not last.all():
+            yield chunk[~last]
+    if carry is not None:
+        yield carry
+
+
+def _dvf_sales(rows):
+    """Ventes d'un seul logement parmi les lignes DVF : (code INSEE, année, prix au m²) de chacune"""
+    residential = rows['type_local'].isin(DVF_RESIDENTIAL_TYPES)
+    other = rows['type_local'].notna() & ~residential & ~rows['type_local'].isin(DVF_ANNEX_TYPES)
+    surface = pd.to_numeric(rows['surface'], errors='coerce').where(residential, 0.0)
+    mutations = pd.DataFrame({
+        'mutation': rows['mutation'], 'insee': rows['insee'], 'annee': rows['annee'],
+        'valeur': pd.to_numeric(rows['valeur'].str.replace(',', '.', regex=False), errors='coerce'),
+        'logements': residential, 'autres': other, 'surface': surface,
+    }).groupby('mutation', sort=False).agg(
+        insee=('insee', 'first'), annee=('annee', 'first'), valeur=('valeur', 'first'),
+        logements=('logements', 'sum'), autres=('autres', 'sum'), surface=('surface', 'sum'))
+    sales = mutations[(mutations['logements'] == 1) & (mutations['autres'] == 0) &
+                      (mutations['surface'] > 0) & (mutations['valeur'] > 0)]
+    return sales['insee'].to_numpy(), sales['annee'].astype(int).to_numpy(), \
+        (sales['valeur'] / sales['surface']).to_numpy()
+
+
+def read_dvf(paths, communes=None, chunksize=DVF_CHUNKSIZE, registry=None,
+             price_range=DVF_PRICE_RANGE, bin_width=DVF_PRICE_BIN, exact_sales=DVF_EXACT_SALES):
+    """Lit des fichiers DVF et retourne prix médian au m² et nombre de ventes par commune et par année
+    
+    Les fichiers (DGFiP ou Etalab, éventuellement compressés) sont lus par
+    blocs de `chunksize` lignes : une année nationale complète passe en
+    mémoire bornée. Seules les ventes d'un seul appartement ou d'une seule
+    maison des communes données (par défaut, celles de la métropole) sont
+    retenues. La médiane est exacte jusqu'à exact_sales ventes par commune et
+    par année (voir DvfAccumulator). Le tableau obtenu (Insee, Commune, Annee,
+    Prix_m2_Moyen, Transactions_Immobilieres) s'utilise comme `observations`
+    des analyseurs.
+    """
+    registry = registry if registry is not None else commune_registry()
+    communes = communes if communes is not None else metropole_communes()
+    codes = [registry.insee[registry.row(commune)] for commune in communes if registry.row(commune) >= 0]
+    codes = [code for code in codes if code]
+    accumulator = DvfAccumulator(codes, price_range=price_range, bin_width=bin_width, exact_sales=exact_sales)
+    for path in ([paths] if isinstance(paths, (str, os.PathLike)) else paths):
+        with span("dvf", fichier=os.fspath(path)):
+            for rows in _dvf_chunks(path, set(codes), chunksize):
+                accumulator.add(*_dvf_sales(rows))
+    table = accumulator.table()
+    table.insert(1, 'Commune', [registry.name(code) for code in table['Insee']])
+    return table
+
+
+# Formats de sortie disponibles et extension des fichiers correspondants
+OUTPUT_FORMATS = {
+    'csv': '.csv',
+    'csv.gz': '.csv.gz',
+    'parquet': '.parquet',
+    'feather': '.feather',
+    'npz': '.npz',
+    'json': '.json',
+}
+
+# Colonnes de comptage stockées en entiers par la politique compacte
+COUNT_COLUMNS = ['Population', 'Menages', 'Transactions_Immobilieres', 'Nouveaux_Logements']
+
+
+def compact_dtypes(df):
+    """Applique la politique de types compacte : float32, entiers et catégories
+    
+    Les années et les comptages sont arrondis en entiers, les montants et
+    taux passent en float32, les colonnes textuelles (Commune, Statistique)
+    deviennent catégorielles.
+    """
+    df = df.copy()
+    for column in df.columns:
+        if column == 'Annee':
+            df[column] = df[column].astype(np.int16)
+        elif column == 'Periode':
+            df[column] = df[column].astype(np.int8)
+        elif column in COUNT_COLUMNS:
+            df[column] = np.rint(df[column]).astype(np.int32)
+        elif df[column].dtype == object:
+            df[column] = df[column].astype('category')
+        elif pd.api.types.is_float_dtype(df[column].dtype):
+            df[column] = df[column].astype(np.float32)
+    return df
+
+
+def _require_pyarrow(fmt):
+    """Vérifie que pyarrow est disponible pour les formats colonnaires"""
+    try:
+        import pyarrow  # noqa: F401
+    except ImportError:
+        raise ImportError(f"Le format {fmt} nécessite pyarrow (pip install pyarrow)") from None
+
+
+def save_financial_data(df, path, fmt='csv', compact=False):
+    """Sauvegarde des données au format choisi et retourne le chemin du fichier
+    
+    `path` est le chemin sans extension : celle du format y est ajoutée.
+    Parquet et Feather sont compressés en zstd, le .npz avec zlib ; le JSON
+    est une liste d'enregistrements (une ligne du tableau par objet).
+    """
+    if fmt not in OUTPUT_FORMATS:
+        raise ValueError(f"Format inconnu: {fmt} (formats: {', '.join(OUTPUT_FORMATS)})")
+    if compact:
+        df = compact_dtypes(df)
+    output_file = path + OUTPUT_FORMATS[fmt]
+    
+    if fmt in ('csv', 'csv.gz'):
+        df.to_csv(output_file, index=False)
+    elif fmt == 'parquet':
+        _require_pyarrow(fmt)
+        df.to_parquet(output_file, index=False, compression='zstd')
+    elif fmt == 'feather':
+        _require_pyarrow(fmt)
+        df.reset_index(drop=True).to_feather(output_file, compression='zstd')
+    elif fmt == 'json':
+        df.to_json(output_file, orient='records', force_ascii=False, indent=2)
+    else:
+        arrays = {}
+        for column in df.columns:
+            values = df[column]
+            if isinstance(values.dtype, pd.CategoricalDtype) or values.dtype == object:
+                arrays[column] = values.to_numpy(dtype=str)
+            else:
+                arrays[column] = values.to_numpy()
+        np.savez_compressed(output_file, __columns__=np.array(df.columns, dtype=str), **arrays)
+    return output_file
+
+
+def load_financial_data(path):
+    """Relit des données sauvegardées par save_financial_data (format déduit de l'extension)"""
+    if path.endswith('.parquet'):
+        return pd.read_parquet(path)
+    if path.endswith('.feather'):
+        return pd.read_feather(path)
+    if path.endswith('.json'):
+        return pd.read_json(path, orient='records')
+    if path.endswith('.npz'):
+        with np.load(path) as data:
+            return pd.DataFrame({column: data[column] for column in data['__columns__']})
+    return pd.read_csv(path)
+
+
+class JsonLinesSink:
+    """Destination des mesures : une ligne JSON par étape, ajoutée au fichier"""
+    
+    def __init__(self, path):
+        self.path = path
+    
+    def emit(self, record):
+        with open(self.path, 'a', encoding='utf-8') as f:
+            f.write(json.dumps(record, ensure_ascii=False) + '\n')
+
+
+class MemorySink:
+    """Destination des mesures : liste en mémoire (tests, notebooks, benchmarks)"""
+    
+    def __init__(self):
+        self.records = []
+    
+    def emit(self, record):
+        self.records.append(record)
+
+
+class LoggingSink:
+    """Destination des mesures : module logging"""
+    
+    def __init__(self, logger=None, level=logging.INFO):
+        self.logger = logger or logging.getLogger('Bord')
+        self.level = level
+    
+    def emit(self, record):
+        self.logger.log(self.level, "%s: %.3f s (CPU %.3f s)%s", record["etape"], record["duree_s"],
+                        record["cpu_s"], f", pic mémoire {record['memoire_pic_octets'] / 1024 ** 2:.1f} Mo"
+                        if record.get("memoire_pic_octets") is not None else "")
+
+
+# Instrumentation désactivée par défaut : span() retourne alors un contexte vide partagé
+_SPAN_SINKS = []
+_SPAN_OPTIONS = {"memoire": False}
+_SPAN_STATE = threading.local()
+_NULL_SPAN = contextlib.nullcontext()
+
+
+def enable_instrumentation(*sinks, memory=False):
+    """Active la mesure des étapes vers les destinations données (emit(record))
+    
+    Avec memory=True, le pic d'allocation Python de chaque étape est mesuré
+    avec tracemalloc, ce qui ralentit nettement l'exécution.
+    """
+    _SPAN_SINKS[:] = sinks
+    _SPAN_OPTIONS["memoire"] = memory
+    if memory and not tracemalloc.is_tracing():
+        tracemalloc.start()
+
+
+def disable_instrumentation():
+    """Désactive la mesure des étapes"""
+    _SPAN_SINKS.clear()
+    if _SPAN_OPTIONS["memoire"] and tracemalloc.is_tracing():
+        tracemalloc.stop()
+    _SPAN_OPTIONS["memoire"] = False
+
+
+def span(name, **attributes):
+    """Mesure une étape (temps réel, temps CPU, pic mémoire) si l'instrumentation est active"""
+    if not _SPAN_SINKS:
+        return _NULL_SPAN
+    return _span(name, attributes)
+
+
+@contextlib.contextmanager
+def _span(name, attributes):
+    """Contexte de mesure d'une étape ; les étapes imbriquées connaissent leur parent"""
+    stack = getattr(_SPAN_STATE, 'stack', None)
+    if stack is None:
+        stack = _SPAN_STATE.stack = []
+    
+    frame = {"etape": name, "pic": 0}
+    memory = _SPAN_OPTIONS["memoire"] and tracemalloc.is_tracing()
+    if memory:
+        # Le pic courant appartient au parent : le conserver avant de le remettre à zéro
+        peak = tracemalloc.get_traced_memory()[1]
+        if stack:
+            stack[-1]["pic"] = max(stack[-1]["pic"], peak)
+        tracemalloc.reset_peak()
+    stack.append(frame)
+    
+    started = time.time()
+    wall = time.perf_counter()
+    cpu = time.process_time()
+    try:
+        yield
+    finally:
+        record = {
+            "etape": name,
+            "parent": stack[-2]["etape"] if len(stack) > 1 else None,
+            "debut": started,
+            "duree_s": time.perf_counter() - wall,
+            "cpu_s": time.process_time() - cpu,
+            "memoire_pic_octets": None,
+            "rss_max_ko": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss if resource else None,
+            "pid": os.getpid(),
+        }
+        record.update(attributes)
+        stack.pop()
+        if memory:
+            frame["pic"] = max(frame["pic"], tracemalloc.get_traced_memory()[1])
+            record["memoire_pic_octets"] = frame["pic"]
+            if stack:
+                stack[-1]["pic"] = max(stack[-1]["pic"], frame["pic"])
+            tracemalloc.reset_peak()
+        for sink in _SPAN_SINKS:
+            sink.emit(record)
+
+
+class ResultCache:
+    """Cache disque des jeux de données générés, adressé par l'empreinte de leurs entrées
+    
+    Chaque entrée est un DataFrame picklé nommé d'après sa clé. La date de
+    modification du fichier sert d'horodatage LRU : une lecture la rafraîchit
+    et les entrées les plus anciennes sont évincées au-delà de max_bytes.
+    """
+    
+    def __init__(self, directory, max_bytes=512 * 1024 ** 2):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(directory, exist_ok=True)
+    
+    def _path(self, key):
+        """Retourne le fichier d'une entrée du cache"""
+        return os.path.join(self.directory, f'{key}.pkl')
+    
+    def get(self, key):
+        """Retourne le DataFrame associé à la clé, ou None s'il n'est pas en cache"""
+        path = self._path(key)
+        try:
+            df = pd.read_pickle(path)
+        except FileNotFoundError:
+            return None
+        except Exception:
+            # Entrée tronquée ou illisible (écriture interrompue, autre version) : traitée comme absente
+            self.invalidate(key)
+            return None
+        os.utime(path)
+        return df
+    
+    def put(self, key, df):
+        """Enregistre un DataFrame (écriture atomique) puis applique la limite de taille"""
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        df.to_pickle(tmp_path)
+        os.replace(tmp_path, path)
+        self._evict()
+    
+    def invalidate(self, key):
+        """Supprime une entrée du cache"""
+        try:
+            os.remove(self._path(key))
+        except FileNotFoundError:
+            pass
+    
+    def clear(self):
+        """Vide entièrement le cache et retourne le nombre d'entrées supprimées"""
+        removed = 0
+        for name in os.listdir(self.directory):
+            if name.endswith('.pkl'):
+                os.remove(os.path.join(self.directory, name))
+                removed += 1
+        return removed
+    
+    def _evict(self):
+        """Évince les entrées les moins récemment utilisées au-delà de max_bytes"""
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith('.pkl'):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            os.remove(path)
+            total -= size
+
+
+class PanelCache:
+    """Cache disque des tuiles PNG de panneaux, adressé par le contenu des colonnes lues
+    
+    La clé d'une tuile combine le nom du panneau, la résolution, la version du
+    modèle et les octets des colonnes que le panneau lit : un changement sur
+    un indicateur n'invalide que les panneaux qui l'utilisent.
+    """
+    
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+    
+    @staticmethod
+    def key(name, df, columns, dpi):
+        """Empreinte d'une tuile : panneau, résolution et contenu des colonnes lues"""
+        digest = hashlib.sha256(f'{MODEL_VERSION}:{name}:{dpi}'.encode('utf-8'))
+        for column in ['Annee'] + list(columns):
+            digest.update(column.encode('utf-8'))
+            digest.update(np.ascontiguousarray(df[column].to_numpy(dtype=np.float64)).tobytes())
+        return digest.hexdigest()
+    
+    def _path(self, key):
+        """Retourne le fichier d'une tuile"""
+        return os.path.join(self.directory, f'{key}.png')
+    
+    def get(self, key):
+        """Retourne les octets PNG d'une tuile, ou None si elle n'est pas en cache"""
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def put(self, key, png):
+        """Enregistre une tuile (écriture atomique)"""
+        path = self._path(key)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(png)
+        os.replace(tmp_path, path)
+
+
+class StreamingMoments:
+    """Moyenne et variance calculées bloc par bloc (formules de fusion de Chan et al.)"""
+    
+    def __init__(self):
+        self.count = 0
+        self.mean = None
+        self.m2 = None
+    
+    def update(self, block):
+        """Intègre un bloc d'échantillons (axe 0 : échantillons)"""
+        n = block.shape[0]
+        if n == 0:
+            return
+        block_mean = block.mean(axis=0)
+        block_m2 = ((block - block_mean) ** 2).sum(axis=0)
+        
+        if self.count == 0:
+            self.mean, self.m2 = block_mean, block_m2
+        else:
+            total = self.count + n
+            delta = block_mean - self.mean
+            self.mean = self.mean + delta * n / total
+            self.m2 = self.m2 + block_m2 + delta ** 2 * self.count * n / total
+        self.count += n
+    
+    @property
+    def variance(self):
+        """Variance empirique non biaisée"""
+        return self.m2 / max(self.count - 1, 1)
+
+
+# Mémoire des histogrammes de StreamingQuantiles (cellules x classes x 8 octets) : au-delà,
+# le nombre de classes est réduit, sans descendre sous QUANTILE_MIN_BINS
+QUANTILE_SKETCH_BYTES = 64 * 1024 ** 2
+QUANTILE_MIN_BINS = 64
+
+
+class StreamingQuantiles:
+    """Quantiles approchés par histogramme, en mémoire bornée
+    
+    Les bornes de l'histogramme de chaque cellule sont fixées sur le premier
+    bloc puis élargies (margin x étendue de part et d'autre) ; les rares
+    valeurs qui en sortent sont comptées dans les classes extrêmes. La
+    précision obtenue est de l'ordre d'une largeur de classe. Le nombre de
+    classes (au plus bins) est choisi d'après le nombre de cellules pour que
+    les histogrammes tiennent dans max_bytes.
+    """
+    
+    def __init__(self, bins=1024, margin=0.5, max_bytes=QUANTILE_SKETCH_BYTES):
+        self.bins = bins
+        self.margin = margin
+        self.max_bytes = max_bytes
+        self.counts = None
+    
+    def update(self, block):
+        """Intègre un bloc d'échantillons (axe 0 : échantillons)"""
+        n = block.shape[0]
+        if n == 0:
+            return
+        flat = block.reshape(n, -1)
+        
+        if self.counts is None:
+            self.shape = block.shape[1:]
+            affordable = self.max_bytes // (flat.shape[1] * np.dtype(np.int64).itemsize)
+            self.bins = int(min(self.bins, max(affordable, QUANTILE_MIN_BINS)))
+            low, high = flat.min(axis=0), flat.max(axis=0)
+            span = high - low
+            span = np.where(span > 0, span, np.maximum(np.abs(low), 1.0) * 1e-6)
+            self.low = low - self.margin * span
+            self.width = span * (1 + 2 * self.margin) / self.bins
+            self.counts = np.zeros((flat.shape[1], self.bins), dtype=np.int64)
+        
+        cells = flat.shape[1]
+        index = np.floor((flat - self.low) / self.width).astype(np.int64)
+        np.clip(index, 0, self.bins - 1, out=index)
+        index += np.arange(cells) * self.bins
+        self.counts += np.bincount(index.ravel(), minlength=cells * self.bins).reshape(cells, self.bins)
+    
+    def quantile(self, q):
+        """Retourne le quantile q (entre 0 et 1) de chaque cellule"""
+        cumulative = np.cumsum(self.counts, axis=1)
+        target = q * cumulative[:, -1]
+        cells = np.arange(self.counts.shape[0])
+        
+        bin_index = np.argmax(cumulative >= target[:, None], axis=1)
+        in_bin = self.counts[cells, bin_index]
+        before = cumulative[cells, bin_index] - in_bin
+        fraction = (target - before) / np.maximum(in_bin, 1)
+        return (self.low + (bin_index + fraction) * self.width).reshape(self.shape)
+
+
+class MonteCarloSummary:
+    """Résumé d'une simulation de Monte Carlo : moyenne, écart-type et quantiles par année"""
+    
+    def __init__(self, years, columns, count, mean, std, quantiles):
+        self.n_replicates = count
+        self.mean = self._frame(years, columns, mean)
+        self.std = self._frame(years, columns, std)
+        self.quantiles = {q: self._frame(years, columns, values)
+                          for q, values in sorted(quantiles.items())}
+    
+    @staticmethod
+    def _frame(years, columns, values):
+        """Met en forme un tableau (périodes x indicateurs) comme generate_financial_data
+        
+        `years` est soit le tableau des années, soit un dictionnaire des colonnes
+        d'index (Annee, Periode) d'une série infra-annuelle.
+        """
+        labels = years if isinstance(years, dict) else {'Annee': years}
+        df = pd.DataFrame(values, columns=columns)
+        for position, (name, label) in enumerate(labels.items()):
+            df.insert(position, name, label)
+        return df
+    
+    def band(self, column, inner=False):
+        """Retourne les bornes (basse, haute) de la bande extérieure ou intérieure d'un indicateur"""
+        levels = list(self.quantiles)
+        pairs = len(levels) // 2
+        if pairs == 0 or (inner and pairs < 2):
+            return None
+        rank = 1 if inner else 0
+        return (self.quantiles[levels[rank]][column].to_numpy(),
+                self.quantiles[levels[-1 - rank]][column].to_numpy())
+    
+    def to_frame(self):
+        """Retourne le résumé en format long avec une colonne Statistique"""
+        frames = [self.mean.assign(Statistique='moyenne'), self.std.assign(Statistique='ecart_type')]
+        frames += [df.assign(Statistique=f'q{q * 100:g}') for q, df in self.quantiles.items()]
+        summary = pd.concat(frames, ignore_index=True)
+        return summary[['Statistique'] + [c for c in summary.columns if c != 'Statistique']]
+
+
+def summarize_blocks(blocks, years, columns, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), bins=1024):
+    """Réduit un flux de blocs (réplicats x années x indicateurs) en MonteCarloSummary"""
+    moments = StreamingMoments()
+    sketch = StreamingQuantiles(bins=bins)
+    for block in blocks:
+        moments.update(block)
+        sketch.update(block)
+    
+    return MonteCarloSummary(years, columns, moments.count, moments.mean,
+                             np.sqrt(moments.variance),
+                             {q: sketch.quantile(q) for q in quantiles})
+
+
+# Suffixe du fichier d'état qui accompagne un jeu de données et permet de le prolonger
+GENERATOR_STATE_SUFFIX = '.etat.json'
+
+
+def _data_stem(path):
+    """Chemin d'un jeu de données sans extension de format ni suffixe d'état"""
+    for extension in (GENERATOR_STATE_SUFFIX,) + tuple(sorted(OUTPUT_FORMATS.values(), key=len, reverse=True)):
+        if path.endswith(extension):
+            return path[:-len(extension)]
+    return path
+
+
+def save_generator_state(analyzer, df, path, formats, compact=False):
+    """Enregistre à côté des données (chemin sans extension) l'état nécessaire pour les prolonger
+    
+    Le fichier .etat.json décrit la génération (communes, période, fréquence,
+    graine racine, événements de scénario), les formats écrits et les stocks
+    de la dernière période : append_financial_data n'a pas à relire
+    l'historique pour ajouter de nouvelles années.
+    """
+    seed = analyzer.seed_sequence
+    state = {
+        "modele": MODEL_VERSION,
+        "generateur": type(analyzer).__name__,
+        "communes": list(getattr(analyzer, 'communes', [analyzer.commune])),
+        "codes": getattr(analyzer, 'codes', None),
+        "periode": [analyzer.start_year, analyzer.end_year],
+        "frequence": analyzer.frequency,
+        "graine": {"entropie": seed.entropy, "spawn_key": list(seed.spawn_key)},
+        "evenements": analyzer.events[len(BORDEAUX_EVENTS):],
+        "formats": list(formats),
+        "compact": compact,
+        "ancrages": analyzer.period_anchors(df),
+    }
+    state_file = path + GENERATOR_STATE_SUFFIX
+    with open(state_file, 'w', encoding='utf-8') as f:
+        json.dump(state, f, ensure_ascii=False, indent=2)
+    return state_file
+
+
+def append_financial_data(path, end_year):
+    """Prolonge jusqu'à end_year un jeu de données sauvegardé, sans regénérer ni réécrire l'historique
+    
+    `path` désigne l'un des fichiers du jeu ou son fichier d'état. Seules les
+    nouvelles années sont simulées (coût proportionnel à leur nombre) ; elles
+    sont ajoutées à la fin des fichiers CSV, les autres formats étant
+    réécrits. Les fichiers dont le nom porte la période (_2002_2025) sont
+    renommés. Retourne les lignes ajoutées.
+    """
+    stem = _data_stem(path)
+    with open(stem + GENERATOR_STATE_SUFFIX, encoding='utf-8') as f:
+        state = json.load(f)
+    if state["modele"] != MODEL_VERSION:
+        raise ValueError(f"Données générées par le modèle v{state['modele']} (modèle actuel : v{MODEL_VERSION}): "
+                         f"regénérer l'historique")
+    
+    start_year, last_year = state["periode"]
+    seed = np.random.SeedSequence(state["graine"]["entropie"], spawn_key=tuple(state["graine"]["spawn_key"]))
+    options = dict(seed=seed, events=state["evenements"], start_year=start_year, end_year=last_year,
+                   frequency=state["frequence"])
+    if state["generateur"] == BordeauxMetropoleBatch.__name__:
+        insee = state["codes"] is not None
+        analyzer = BordeauxMetropoleBatch(state["codes"] if insee else state["communes"], insee=insee, **options)
+    else:
+        analyzer = BordeauxCommuneImmobilierAnalyzer(state["communes"][0], **options)
+    with span("prolongation", fichier=os.path.basename(stem), annees=end_year - last_year):
+        rows = analyzer.extend_financial_data(end_year, anchors=state["ancrages"])
+    
+    directory, name = os.path.split(stem)
+    period = f'_{start_year}_{last_year}'
+    if period in name:
+        head, _, tail = name.rpartition(period)
+        name = f'{head}_{start_year}_{end_year}{tail}'
+    new_stem = os.path.join(directory, name)
+    
+    for fmt in state["formats"]:
+        data_file = stem + OUTPUT_FORMATS[fmt]
+        with span("export", fichier=os.path.basename(data_file), format=fmt):
+            if fmt in ('csv', 'csv.gz'):
+                # Ajout en fin de fichier (un nouveau membre gzip pour csv.gz)
+                appended = compact_dtypes(rows) if state["compact"] else rows
+                appended.to_csv(data_file, mode='a', header=False, index=False)
+            else:
+                save_financial_data(pd.concat([load_financial_data(data_file), rows], ignore_index=True),
+                                    stem, fmt=fmt, compact=state["compact"])
+        os.replace(data_file, new_stem + OUTPUT_FORMATS[fmt])
+        print(f"💾 {len(rows)} ligne(s) ajoutée(s): {new_stem + OUTPUT_FORMATS[fmt]}")
+    
+    save_generator_state(analyzer, rows, new_stem, state["formats"], compact=state["compact"])
+    if new_stem != stem:
+        os.remove(stem + GENERATOR_STATE_SUFFIX)
+    return rows
+
+
+# Indicateurs d'insights classés entre communes (rang 1 : valeur la plus élevée)
+INSIGHT_RANKINGS = ['Prix_m2_Actuel', 'Croissance_Prix_Pct', 'Croissance_Population_Pct',
+                    'Part_Impots_Locaux_Pct', 'Impact_COVID_Pct']
+
+
+def compute_insights(df, commune=None, covid_year=2020):
+    """Calcule les insights de toutes les communes d'un panel en un seul passage groupé
+    
+    `df` est un panel long (colonne Commune) ou les données d'une seule
+    commune, nommée par `commune`. Retourne une table indexée par commune :
+    moyennes, croissances, parts des recettes, impact COVID sur les prix et
+    rangs entre communes (colonnes Rang_*), partagée par le rapport texte,
+    les exports JSON et les alertes. Une série infra-annuelle est d'abord
+    ramenée à l'année. Un CommunePanel est lu par sa vue en panel long.
+    """
+    if isinstance(df, CommunePanel):
+        df = df.to_frame()
+    df = aggregate_to_annual(df)
+    if 'Commune' in df.columns:
+        keys = df['Commune']
+    else:
+        keys = pd.Series(np.full(len(df), commune, dtype=object), index=df.index, name='Commune')
+    
+    columns = ['Annee', 'Population', 'Recettes_Totales', 'Depenses_Totales', 'Impots_Locaux',
+               'Dotations_Etat', 'Taxe_Fonciere', 'Prix_m2_Moyen', 'Transactions_Immobilieres']
+    grouped = df[columns].groupby(keys, sort=False, observed=True)
+    mean, first, last = grouped.mean(), grouped.first(), grouped.last()
+    # Prix de l'année COVID : un seul masque pour toutes les communes
+    covid = df['Annee'] == covid_year
+    price_covid = df.loc[covid, 'Prix_m2_Moyen'].groupby(keys[covid], sort=False, observed=True).first()
+    
+    table = pd.DataFrame({
+        'Annee_Debut': first['Annee'],
+        'Annee_Fin': last['Annee'],
+        'Recettes_Moyennes': mean['Recettes_Totales'],
+        'Depenses_Moyennes': mean['Depenses_Totales'],
+        'Prix_m2_Moyen': mean['Prix_m2_Moyen'],
+        'Transactions_Moyennes': mean['Transactions_Immobilieres'],
+        'Croissance_Prix_Pct': (last['Prix_m2_Moyen'] / first['Prix_m2_Moyen'] - 1) * 100,
+        'Croissance_Population_Pct': (last['Population'] / first['Population'] - 1) * 100,
+        'Part_Impots_Locaux_Pct': mean['Impots_Locaux'] / mean['Recettes_Totales'] * 100,
+        'Part_Dotations_Etat_Pct': mean['Dotations_Etat'] / mean['Recettes_Totales'] * 100,
+        'Part_Taxe_Fonciere_Pct': mean['Taxe_Fonciere'] / mean['Recettes_Totales'] * 100,
+        'Prix_m2_Actuel': last['Prix_m2_Moyen'],
+        'Impact_COVID_Pct': (last['Prix_m2_Moyen'] / price_covid.reindex(last.index) - 1) * 100,
+    })
+    # Rangs entiers ; 0 : commune non classée (valeur absente, par exemple 2020 hors période)
+    for column in INSIGHT_RANKINGS:
+        table['Rang_' + column] = table[column].rank(ascending=False, method='min').fillna(0).astype(np.int32)
+    table.index.name = 'Commune'
+    return table
+
+
+def print_insight_rankings(table, top=5):
+    """Affiche, pour chaque indicateur classé, les communes en tête du panel"""
+    print(f"\n🏆 CLASSEMENTS ({len(table)} communes):")
+    for column in INSIGHT_RANKINGS:
+        leaders = table[column].dropna().nlargest(top)
+        print(f"• {column}: " + ", ".join(f"{commune} ({value:.1f})" for commune, value in leaders.items()))
+
+
+def value_at_year(df, column, year):
+    """Valeur d'une colonne pour une année d'une série annuelle, None si l'année est absente
+    
+    Les années d'une série annuelle se suivent : la ligne est trouvée par
+    décalage depuis la première année, sans parcourir la colonne Annee.
+    """
+    years = df['Annee'].to_numpy()
+    offset = int(year - years[0]) if len(years) else -1
+    if 0 <= offset < len(years) and years[offset] == year:
+        return df[column].to_numpy()[offset]
+    return None
+
+
+class CommunePanel:
+    """Panel compact (communes x périodes x indicateurs) stocké dans un seul tableau float64 contigu
+    
+    Chaque axe est nommé et indexé (libellé -> position en O(1)) : communes,
+    périodes (Annee, ou (Annee, Periode) pour une série infra-annuelle) et
+    indicateurs. Les tranches NumPy et les DataFrame exportés (une commune ou
+    le panel long) sont des vues du tableau, sans copie : simulation,
+    tendances, insights et graphiques partagent le même tampon.
+    """
+    
+    def __init__(self, communes, labels, indicators=None, data=None, codes=None):
+        self.communes = list(communes)
+        self.codes = list(codes) if codes is not None else None
+        self.labels = {name: np.asarray(values) for name, values in labels.items()}
+        self.indicators = list(indicators or INDICATOR_COLUMNS)
+        shape = (len(self.communes), len(self.labels['Annee']), len(self.indicators))
+        if data is None:
+            data = np.zeros(shape)
+        elif data.shape != shape or not data.flags.c_contiguous:
+            raise ValueError(f"Tableau incompatible avec le panel: {data.shape} au lieu de {shape} contigu")
+        self.data = data
+        
+        self._communes = {commune: i for i, commune in enumerate(self.communes)}
+        self._indicators = {indicator: i for i, indicator in enumerate(self.indicators)}
+        if 'Periode' in self.labels:
+            keys = zip(self.labels['Annee'].tolist(), self.labels['Periode'].tolist())
+        else:
+            keys = self.labels['Annee'].tolist()
+        self._periods = {key: i for i, key in enumerate(keys)}
+    
+    @classmethod
+    def from_frame(cls, df, commune=None):
+        """Construit un panel à partir d'un panel long (colonne Commune) ou des données d'une commune"""
+        labels = [name for name in ('Annee', 'Periode') if name in df.columns]
+        indicators = [column for column in INDICATOR_COLUMNS if column in df.columns]
+        if 'Commune' in df.columns:
+            communes = list(pd.unique(df['Commune']))
+            periods = len(df) // len(communes)
+        else:
+            communes, periods = [commune], len(df)
+        data = np.ascontiguousarray(df[indicators].to_numpy(dtype=np.float64))
+        codes = list(pd.unique(df['Insee'])) if 'Insee' in df.columns else None
+        return cls(communes, {name: df[name].to_numpy()[:periods] for name in labels}, indicators,
+                   data.reshape(len(communes), periods, len(indicators)), codes=codes)
+    
+    @property
+    def shape(self):
+        return self.data.shape
+    
+    def __contains__(self, indicator):
+        return indicator in self._indicators
+    
+    def commune_offset(self, commune):
+        """Position d'une commune sur le premier axe"""
+        return self._communes[commune]
+    
+    def period_offset(self, year, period=None):
+        """Position d'une année (et d'une période pour une série infra-annuelle) sur le deuxième axe"""
+        return self._periods[year if period is None else (year, period)]
+    
+    def indicator_offset(self, indicator):
+        """Position d'un indicateur sur le troisième axe"""
+        return self._indicators[indicator]
+    
+    def indicator(self, indicator):
+        """Vue (communes x périodes) d'un indicateur"""
+        return self.data[:, :, self._indicators[indicator]]
+    
+    def series(self, commune, indicator):
+        """Vue de la série d'un indicateur pour une commune"""
+        return self.data[self._communes[commune], :, self._indicators[indicator]]
+    
+    def value(self, commune, indicator, year, period=None):
+        """Valeur d'un indicateur pour une commune et une période, lue en O(1)"""
+        return self.data[self._communes[commune], self.period_offset(year, period),
+                         self._indicators[indicator]]
+    
+    def frame(self, commune):
+        """DataFrame (Annee[, Periode], indicateurs) d'une commune, vue sur le tampon"""
+        df = pd.DataFrame(self.data[self._communes[commune]], columns=self.indicators, copy=False)
+        for position, (name, values) in enumerate(self.labels.items()):
+            df.insert(position, name, values)
+        return df
+    
+    def to_frame(self):
+        """Panel long (Commune[, Insee], Annee[, Periode], indicateurs), indicateurs en vue sur le tampon"""
+        n_communes, n_periods, n_indicators = self.data.shape
+        df = pd.DataFrame(self.data.reshape(n_communes * n_periods, n_indicators),
+                          columns=self.indicators, copy=False)
+        columns = {'Commune': np.repeat(self.communes, n_periods)}
+        if self.codes is not None:
+            columns['Insee'] = np.repeat(self.codes, n_periods)
+        for name, values in self.labels.items():
+            columns[name] = np.tile(values, n_communes)
+        for position, (name, values) in enumerate(columns.items()):
+            df.insert(position, name, values)
+        return df
+
+
 class BordeauxCommuneImmobilierAnalyzer:
-    def __init__(self, commune_name):
-        self.commune = commune_name
+    def __init__(self, commune_name, seed=None, events=None, start_year=2002, end_year=2025,
+                 cache=None, frequency='A', registry=None, observations=None):
+        # Référentiel des communes : la commune peut être désignée par son nom ou son code INSEE
+        self.registry = registry if registry is not None else commune_registry()
+        self.commune = self.registry.name(commune_name)
         self.colors = ['#8B0000', '#FFD700', '#00008B', '#228B22', '#FF6B6B', 
                       '#4ECDC4', '#45B7D1', '#F9A602', '#6A0572', '#AB83A1']
         
-        self.start_year = 2002
-        self.end_year = 2025
+        self.start_year = start_year
+        self.end_year = end_year
+        
+        # Fréquence de la série produite : annuelle (A), trimestrielle (Q) ou mensuelle (M)
+        if frequency not in FREQUENCIES:
+            raise ValueError(f"Fréquence inconnue: {frequency} (fréquences: {', '.join(FREQUENCIES)})")
+        self.frequency = frequency
+        self.periods = FREQUENCIES[frequency]
+        
+        # Graine racine (entier ou SeedSequence) : sans graine, l'entropie est
+        # tirée une fois pour toutes et reste consultable via seed_sequence.entropy
+        if isinstance(seed, np.random.SeedSequence):
+            self.seed_sequence = seed
+        else:
+            self.seed_sequence = np.random.SeedSequence(seed)
+        self.rng = self._make_rng()
+        # Le cache n'est utilisé qu'avec une graine explicite (résultat reproductible)
+        self.cache = cache if seed is not None else None
+        # Réplicats de Monte Carlo tirés simultanément (premier, nombre) ; None : une seule trajectoire
+        self._replicates = None
         
         # Configuration spécifique à chaque commune bordelaise
         self.config = self._get_commune_config()
         
+        # Calendrier des événements : chocs bordelais + scénarios utilisateur
+        self.events = BORDEAUX_EVENTS + list(events or [])
+        
+        # Valeurs observées (Insee, Annee, indicateurs ; voir read_dvf) : elles remplacent
+        # la simulation des années et communes couvertes, sans effet des événements
+        self.observations = observations
+        
     def _get_commune_config(self):
         """Retourne la configuration spécifique pour chaque commune bordelaise"""
-        configs = {
-            "Bordeaux": {
-                "population_base": 250000,
-                "budget_base": 450,
-                "type": "metropole",
-                "specialites": ["vin", "tourisme", "administration", "commerce", "universite"],
-                "prix_m2_base": 2500,
-                "segment_immobilier": "haut_de_gamme"
-            },
-            "Mérignac": {
-                "population_base": 72000,
-                "budget_base": 120,
-                "type": "aeroportuaire",
-                "specialites": ["aeroport", "zones_activites", "commerce", "logistique"],
-                "prix_m2_base": 2200,
-                "segment_immobilier": "mixte"
-            },
-            "Pessac": {
-                "population_base": 65000,
-                "budget_base": 95,
-                "type": "universitaire",
-                "specialites": ["universite", "recherche", "vin", "residential"],
-                "prix_m2_base": 2300,
-                "segment_immobilier": "universitaire"
-            },
-            "Talence": {
-                "population_base": 43000,
-                "budget_base": 75,
-                "type": "universitaire",
-                "specialites": ["universite", "recherche", "sport", "residential"],
-                "prix_m2_base": 2400,
-                "segment_immobilier": "universitaire"
-            },
-            "Bègles": {
-                "population_base": 30000,
-                "budget_base": 65,
-                "type": "industrielle",
-                "specialites": ["industrie", "port", "commerce", "residential"],
-                "prix_m2_base": 2100,
-                "segment_immobilier": "mixte"
-            },
-            "Villenave-d'Ornon": {
-                "population_base": 36000,
-                "budget_base": 60,
-                "type": "residentielle",
-                "specialites": ["residential", "agriculture", "vin", "recherche"],
-                "prix_m2_base": 2000,
-                "segment_immobilier": "residentiel"
-            },
-            "Gradignan": {
-                "population_base": 25000,
-                "budget_base": 45,
-                "type": "residentielle",
-                "specialites": ["residential", "espaces_verts", "commerce", "education"],
-                "prix_m2_base": 2600,
-                "segment_immobilier": "haut_de_gamme"
-            },
-            "Cenon": {
-                "population_base": 25000,
-                "budget_base": 50,
-                "type": "urbaine",
-                "specialites": ["residential", "commerce", "transport", "culture"],
-                "prix_m2_base": 1900,
-                "segment_immobilier": "abordable"
-            },
-            "Floirac": {
-                "population_base": 17000,
-                "budget_base": 35,
-                "type": "residentielle",
-                "specialites": ["residential", "espaces_verts", "vin", "vue_bordeaux"],
-                "prix_m2_base": 2100,
-                "segment_immobilier": "mixte"
-            },
-            "Bouliac": {
-                "population_base": 5000,
-                "budget_base": 15,
-                "type": "residentielle",
-                "specialites": ["residential", "vignobles", "vue_bordeaux", "calme"],
-                "prix_m2_base": 2800,
-                "segment_immobilier": "premium"
-            },
-            "Parempuyre": {
-                "population_base": 10000,
-                "budget_base": 25,
-                "type": "rurale",
-                "specialites": ["agriculture", "residential", "zones_activites", "calme"],
-                "prix_m2_base": 1800,
-                "segment_immobilier": "abordable"
-            },
-            "Le Haillan": {
-                "population_base": 11000,
-                "budget_base": 28,
-                "type": "residentielle",
-                "specialites": ["residential", "commerce", "sport", "calme"],
-                "prix_m2_base": 2200,
-                "segment_immobilier": "mixte"
-            },
-            "Saint-Médard-en-Jalles": {
-                "population_base": 32000,
-                "budget_base": 70,
-                "type": "industrielle",
-                "specialites": ["industrie", "aeronautique", "defense", "residential"],
-                "prix_m2_base": 1900,
-                "segment_immobilier": "industriel"
-            },
-            "Eysines": {
-                "population_base": 25000,
-                "budget_base": 55,
-                "type": "residentielle",
-                "specialites": ["maraichage", "residential", "commerce", "proximite_bordeaux"],
-                "prix_m2_base": 2300,
-                "segment_immobilier": "mixte"
-            },
-            "Bruges": {
-                "population_base": 20000,
-                "budget_base": 48,
-                "type": "commerciale",
-                "specialites": ["commerce", "zones_activites", "residential", "proximite_aeroport"],
-                "prix_m2_base": 2100,
-                "segment_immobilier": "commercial"
-            },
-            "Blanquefort": {
-                "population_base": 16000,
-                "budget_base": 42,
-                "type": "industrielle",
-                "specialites": ["industrie", "chateau", "residential", "commerce"],
-                "prix_m2_base": 2000,
-                "segment_immobilier": "mixte"
-            },
-            "Lormont": {
-                "population_base": 23000,
-                "budget_base": 52,
-                "type": "urbaine",
-                "specialites": ["residential", "port", "transport", "culture"],
-                "prix_m2_base": 1700,
-                "segment_immobilier": "abordable"
-            },
-            "Carbon-Blanc": {
-                "population_base": 8000,
-                "budget_base": 22,
-                "type": "residentielle",
-                "specialites": ["residential", "commerce", "proximite_bordeaux", "transport"],
-                "prix_m2_base": 1850,
-                "segment_immobilier": "abordable"
-            },
-            "Ambès": {
-                "population_base": 3000,
-                "budget_base": 12,
-                "type": "industrielle",
-                "specialites": ["industrie", "port", "raffinerie", "nature"],
-                "prix_m2_base": 1500,
-                "segment_immobilier": "industriel"
-            },
-            "Bassens": {
-                "population_base": 7000,
-                "budget_base": 20,
-                "type": "portuaire",
-                "specialites": ["port", "industrie", "logistique", "residential"],
-                "prix_m2_base": 1600,
-                "segment_immobilier": "industriel"
-            },
-            # Configuration par défaut
-            "default": {
-                "population_base": 15000,
-                "budget_base": 30,
-                "type": "residentielle",
-                "specialites": ["residential", "commerce_local", "services"],
-                "prix_m2_base": 2000,
-                "segment_immobilier": "mixte"
-            }
+        return self.registry.config(self.commune)
+    
+    def _make_rng(self, replicate=0):
+        """Crée le générateur aléatoire propre à la commune et au réplicat"""
+        return np.random.default_rng(
+            commune_seed_sequence(self.seed_sequence, self.commune, replicate))
+    
+    def cache_key(self, replicate=0):
+        """Empreinte des entrées de la génération : configuration, période, graine, événements, modèle"""
+        inputs = {
+            "modele": MODEL_VERSION,
+            "generateur": type(self).__name__,
+            "communes": self._cache_communes(),
+            "periode": [self.start_year, self.end_year],
+            "frequence": self.frequency,
+            "graine": [self.seed_sequence.entropy, list(self.seed_sequence.spawn_key)],
+            "replicat": replicate,
+            "evenements": self.events,
         }
-        
-        return configs.get(self.commune, configs["default"])
+        observed = self._observations() if self.observations is not None else None
+        if observed is not None and len(observed):
+            inputs["observations"] = [list(observed.columns)] + observed.to_numpy().tolist()
+        encoded = json.dumps(inputs, sort_keys=True, ensure_ascii=False, default=str)
+        return hashlib.sha256(encoded.encode('utf-8')).hexdigest()
+    
+    def _observation_codes(self):
+        """Codes INSEE des communes simulées, pour retrouver leurs valeurs observées"""
+        row = self.registry.row(self.commune)
+        return [self.registry.insee[row] if row >= 0 else '']
+    
+    def _observations(self):
+        """Valeurs observées des communes simulées, triées par commune et par année"""
+        columns = ['Insee', 'Annee'] + [column for column in INDICATOR_COLUMNS if column in self.observations]
+        observed = self.observations.loc[self.observations['Insee'].isin(self._observation_codes()), columns]
+        return observed.sort_values(['Insee', 'Annee'], ignore_index=True)
+    
+    def _observed_columns(self, dates):
+        """Valeurs observées par indicateur (communes x années, NaN hors observation)"""
+        if self.observations is None:
+            return {}
+        codes, years = self._observation_codes(), self._years(dates)
+        observed = self._observations().set_index(['Insee', 'Annee'])
+        index = pd.MultiIndex.from_product([codes, years])
+        return {column: self._observed_values(observed[column].reindex(index).to_numpy(dtype=float)
+                                              .reshape(len(codes), len(years)))
+                for column in observed.columns}
     
-    def generate_financial_data(self):
+    def _observed_values(self, values):
+        """Valeurs observées de la commune analysée"""
+        return values[0]
+    
+    def _cache_communes(self):
+        """Communes et configurations entrant dans l'empreinte du cache"""
+        return [[self.commune, dict(self.config)]]
+    
+    def generate_financial_data(self, replicate=0):
         """Génère des données financières et immobilières pour la commune bordelaise"""
+        key = self.cache_key(replicate) if self.cache is not None else None
+        if key is not None:
+            with span("cache_lecture", commune=self.commune):
+                df = self.cache.get(key)
+            if df is not None:
+                print(f"♻️ Données de {self.commune} lues dans le cache")
+                return df
+        
+        with span("generation", commune=self.commune, replicat=replicate):
+            df = self._generate(replicate)
+        if key is not None:
+            with span("cache_ecriture", commune=self.commune):
+                self.cache.put(key, df)
+        return df
+    
+    def _generate(self, replicate):
+        """Simule les indicateurs de la commune et applique les tendances bordelaises"""
         print(f"🏛️ Génération des données financières et immobilières pour {self.commune}...")
+        return self._panel_frame(self.generate_panel(replicate))
+    
+    def _panel_frame(self, panel):
+        """DataFrame des données générées : celles de la commune analysée"""
+        return panel.frame(self.commune)
+    
+    def generate_panel(self, replicate=0):
+        """Simule les indicateurs dans un CommunePanel, tendances comprises (sans passer par le cache)"""
+        # Chaque réplicat repart de son propre flux : résultat reproductible
+        self.rng = self._make_rng(replicate)
+        return self._simulate_panel(self._dates())
+    
+    def extend_panel(self, end_year, replicate=0, anchors=None):
+        """Simule seulement les années qui suivent end_year actuel, sans toucher à l'historique
+        
+        Les termes de croissance restent indexés sur start_year et le calendrier
+        d'événements s'applique aux nouvelles années comme à l'historique. Le
+        bruit d'une année ne dépend que de son rang depuis start_year (voir
+        _noise) : prolonger d'un coup, année par année ou regénérer toute la
+        période avec la même graine donne le même résultat. `anchors` (stocks de fin de série, avant événements)
+        raccorde l'interpolation infra-annuelle des stocks à l'historique.
+        """
+        if end_year <= self.end_year:
+            raise ValueError(f"La série va déjà jusqu'à {self.end_year}: rien à prolonger jusqu'à {end_year}")
+        self.rng = self._make_rng(replicate)
+        panel = self._simulate_panel(self._dates(self.end_year + 1, end_year), anchors)
+        self.end_year = end_year
+        return panel
+    
+    def extend_financial_data(self, end_year, replicate=0, anchors=None):
+        """Retourne seulement les lignes des années ajoutées jusqu'à end_year (voir extend_panel)"""
+        print(f"🏛️ Prolongation des données de {self.commune} jusqu'à {end_year}...")
+        return self._panel_frame(self.extend_panel(end_year, replicate, anchors))
+    
+    def period_anchors(self, df):
+        """Stocks de la dernière période des données, avant événements, pour les prolonger (voir extend_panel)"""
+        panel = CommunePanel.from_frame(df, self.commune)
+        last = {name: values[-1:] for name, values in panel.labels.items()}
+        multipliers = self._event_multipliers(last['Annee'], last.get('Periode'))
+        return {column: (panel.indicator(column)[:, -1] /
+                         np.broadcast_to(multipliers.get(column, 1.0), (len(panel.communes), 1))[:, -1]).tolist()
+                for column in STOCK_COLUMNS}
+    
+    def _simulate_panel(self, dates, anchors=None):
+        """Simule les séries annuelles dans un panel, les répartit entre les périodes et applique les tendances"""
+        panel = self._empty_panel(self._period_labels(dates))
+        observed = self._observed_columns(dates)
+        with span("simulation", commune=self.commune, communes=len(panel.communes)):
+            data = self._simulate_columns(dates)
+            # Le bruit est tiré comme sans observation : les autres indicateurs ne changent pas
+            for column, values in observed.items():
+                data[column] = np.where(np.isnan(values), data[column], values)
+            for column, values in self._to_periods(data, anchors).items():
+                panel.indicator(column)[...] = values
         
-        # Créer une base de données annuelle
-        dates = pd.date_range(start=f'{self.start_year}-01-01', 
-                             end=f'{self.end_year}-12-31', freq='Y')
+        # Ajouter des tendances spécifiques au marché immobilier bordelais
+        with span("tendances", commune=self.commune, communes=len(panel.communes)):
+            self._add_bordeaux_trends(panel, observed)
         
-        data = {'Annee': [date.year for date in dates]}
+        return panel
+    
+    def _empty_panel(self, labels):
+        """Panel à remplir par la simulation : la seule commune analysée"""
+        return CommunePanel([self.commune], labels)
+    
+    def _dates(self, first_year=None, last_year=None):
+        """Retourne le calendrier annuel de la période analysée (ou d'une partie)"""
+        years = range(first_year or self.start_year, (last_year or self.end_year) + 1)
+        return pd.DatetimeIndex([pd.Timestamp(year, 12, 31) for year in years])
+    
+    def _period_labels(self, dates):
+        """Colonnes d'index de la série : Annee, et Periode (1..P) si elle est infra-annuelle"""
+        years = np.array([date.year for date in dates])
+        if self.periods == 1:
+            return {'Annee': years}
+        return {'Annee': np.repeat(years, self.periods),
+                'Periode': np.tile(np.arange(1, self.periods + 1), len(years))}
+    
+    def _to_periods(self, data, anchors=None):
+        """Répartit les indicateurs annuels simulés entre les périodes de l'année"""
+        anchors = anchors or {}
+        return {column: resample_to_periods(values, self.periods, stock=column in STOCK_COLUMNS,
+                                            anchor=self._anchor(anchors.get(column)))
+                for column, values in data.items()}
+    
+    def _anchor(self, values):
+        """Point d'ancrage d'un stock : valeur de la commune analysée"""
+        return None if values is None else values[0]
+    
+    def _simulate_columns(self, dates):
+        """Simule toutes les colonnes d'indicateurs, dans l'ordre de tirage du bruit"""
+        self._draw_noise_table(dates)
+        data = {}
         
         # Données démographiques
         data['Population'] = self._simulate_population(dates)
@@ -242,598 +1575,629 @@ class BordeauxCommuneImmobilierAnalyzer:
         data['Investissement_Culture'] = self._simulate_culture_investment(dates)
         data['Investissement_Education'] = self._simulate_education_investment(dates)
         
-        df = pd.DataFrame(data)
-        
-        # Ajouter des tendances spécifiques au marché immobilier bordelais
-        self._add_bordeaux_trends(df)
-        
-        return df
+        return data
+    
+    def _years(self, dates):
+        """Retourne les années de la période sous forme de tableau NumPy"""
+        return np.asarray(dates.year)
+    
+    def _draw_noise_table(self, dates):
+        """Tire les lignes du flux qui correspondent aux années données et les prépare pour _noise
+        
+        Les lignes start_year..dernière année sont tirées (années x
+        NOISE_COLUMNS) puis celles des années données sont gardées : le bruit
+        d'une année ne dépend ni de end_year ni des années déjà générées, si
+        bien qu'une série prolongée (extend_panel) est identique à une
+        génération complète.
+        """
+        years = self._years(dates)
+        first, stop = int(years[0]) - self.start_year, int(years[-1]) - self.start_year + 1
+        table = self._noise_table(stop)[..., first:stop, :]
+        self._noise_columns = iter(np.moveaxis(table, -1, 0))
+    
+    def _noise(self, sigma, dates):
+        """Bruit multiplicatif de l'indicateur suivant : sa colonne de la table tirée par _draw_noise_table"""
+        return 1 + sigma * next(self._noise_columns)
+    
+    def _noise_table(self, stop):
+        """Tirages normaux des stop premières années de la commune (années x NOISE_COLUMNS)"""
+        return self._draw_noise(self.rng, stop)
+    
+    def _draw_noise(self, rng, stop):
+        """Tirages d'une commune : son flux, ou (réplicats x années x colonnes) en Monte Carlo
+        
+        En Monte Carlo, `rng` contient les générateurs des tranches couvertes
+        par les réplicats en cours : chaque tranche est tirée en entier puis
+        découpée, le réplicat r reçoit donc toujours les mêmes valeurs.
+        """
+        if self._replicates is None:
+            return rng.standard_normal((stop, NOISE_COLUMNS))
+        start, size = self._replicates
+        offset = start % MONTE_CARLO_BLOCK
+        noise = np.concatenate([block.standard_normal((MONTE_CARLO_BLOCK, stop, NOISE_COLUMNS)) for block in rng])
+        return noise[offset:offset + size]
+    
+    def _config_rate(self, key, rates, default):
+        """Associe un taux à une valeur catégorielle de la configuration (type, segment)"""
+        return rates.get(self.config[key], default)
+    
+    def _has_specialty(self, specialty):
+        """Indique si la commune possède la spécialité donnée"""
+        return specialty in self.config["specialites"]
     
     def _simulate_population(self, dates):
         """Simule la population de la commune (croissance bordelaise forte)"""
         base_population = self.config["population_base"]
+        i = self._years(dates) - self.start_year
         
-        population = []
-        for i, date in enumerate(dates):
-            # Croissance démographique bordelaise (forte attractivité)
-            if self.config["type"] == "metropole":
-                growth_rate = 0.012  # Croissance forte à Bordeaux
-            elif self.config["type"] == "universitaire":
-                growth_rate = 0.015  # Croissance très forte autour des universités
-            elif self.config["type"] == "residentielle":
-                growth_rate = 0.018  # Croissance explosive dans les communes résidentielles
-            else:
-                growth_rate = 0.010  # Croissance moyenne
-                
-            growth = 1 + growth_rate * i
-            population.append(base_population * growth)
+        # Croissance démographique bordelaise (forte attractivité)
+        growth_rate = self._config_rate("type", {
+            "metropole": 0.012,      # Croissance forte à Bordeaux
+            "universitaire": 0.015,  # Croissance très forte autour des universités
+            "residentielle": 0.018,  # Croissance explosive dans les communes résidentielles
+        }, default=0.010)            # Croissance moyenne
         
-        return population
+        growth = 1 + growth_rate * i
+        return base_population * growth
     
     def _simulate_households(self, dates):
         """Simule le nombre de ménages"""
         base_households = self.config["population_base"] / 2.2  # Taille des ménages plus petite
+        i = self._years(dates) - self.start_year
         
-        households = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.014 * i  # Croissance forte
-            households.append(base_households * growth)
-        
-        return households
+        growth = 1 + 0.014 * i  # Croissance forte
+        return base_households * growth
     
     def _simulate_total_revenue(self, dates):
         """Simule les recettes totales de la commune"""
         base_revenue = self.config["budget_base"]
+        i = self._years(dates) - self.start_year
         
-        revenue = []
-        for i, date in enumerate(dates):
-            # Croissance économique bordelaise (forte)
-            if self.config["type"] == "metropole":
-                growth_rate = 0.038  # Croissance très forte à Bordeaux
-            elif self.config["type"] == "universitaire":
-                growth_rate = 0.035  # Croissance forte dans les villes universitaires
-            else:
-                growth_rate = 0.032  # Croissance moyenne
-                
-            growth = 1 + growth_rate * i
-            noise = np.random.normal(1, 0.06)
-            revenue.append(base_revenue * growth * noise)
+        # Croissance économique bordelaise (forte)
+        growth_rate = self._config_rate("type", {
+            "metropole": 0.038,      # Croissance très forte à Bordeaux
+            "universitaire": 0.035,  # Croissance forte dans les villes universitaires
+        }, default=0.032)            # Croissance moyenne
         
-        return revenue
+        growth = 1 + growth_rate * i
+        return base_revenue * growth * self._noise(0.06, dates)
     
     def _simulate_tax_revenue(self, dates):
         """Simule les recettes fiscales"""
         base_tax = self.config["budget_base"] * 0.38
+        i = self._years(dates) - self.start_year
         
-        tax_revenue = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.030 * i
-            noise = np.random.normal(1, 0.07)
-            tax_revenue.append(base_tax * growth * noise)
-        
-        return tax_revenue
+        growth = 1 + 0.030 * i
+        return base_tax * growth * self._noise(0.07, dates)
     
     def _simulate_state_grants(self, dates):
         """Simule les dotations de l'État"""
         base_grants = self.config["budget_base"] * 0.35
+        years = self._years(dates)
         
-        grants = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year >= 2010:
-                increase = 1 + 0.008 * (year - 2010)
-            else:
-                increase = 1
-            
-            noise = np.random.normal(1, 0.05)
-            grants.append(base_grants * increase * noise)
-        
-        return grants
+        increase = np.where(years >= 2010, 1 + 0.008 * (years - 2010), 1.0)
+        return base_grants * increase * self._noise(0.05, dates)
     
     def _simulate_other_revenue(self, dates):
         """Simule les autres recettes"""
         base_other = self.config["budget_base"] * 0.27
+        i = self._years(dates) - self.start_year
         
-        other_revenue = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.028 * i
-            noise = np.random.normal(1, 0.08)
-            other_revenue.append(base_other * growth * noise)
-        
-        return other_revenue
+        growth = 1 + 0.028 * i
+        return base_other * growth * self._noise(0.08, dates)
     
     def _simulate_total_expenses(self, dates):
         """Simule les dépenses totales"""
         base_expenses = self.config["budget_base"] * 0.97
+        i = self._years(dates) - self.start_year
         
-        expenses = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.034 * i
-            noise = np.random.normal(1, 0.05)
-            expenses.append(base_expenses * growth * noise)
-        
-        return expenses
+        growth = 1 + 0.034 * i
+        return base_expenses * growth * self._noise(0.05, dates)
     
     def _simulate_operating_expenses(self, dates):
         """Simule les dépenses de fonctionnement"""
         base_operating = self.config["budget_base"] * 0.62
+        i = self._years(dates) - self.start_year
         
-        operating = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.030 * i
-            noise = np.random.normal(1, 0.04)
-            operating.append(base_operating * growth * noise)
-        
-        return operating
+        growth = 1 + 0.030 * i
+        return base_operating * growth * self._noise(0.04, dates)
     
     def _simulate_investment_expenses(self, dates):
         """Simule les dépenses d'investissement"""
         base_investment = self.config["budget_base"] * 0.35
+        years = self._years(dates)
+        i = years - self.start_year
         
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2007, 2013, 2019, 2024]:
-                multiplier = 1.6
-            elif year in [2009, 2015, 2021]:
-                multiplier = 0.8
-            else:
-                multiplier = 1.0
-            
-            growth = 1 + 0.028 * i
-            noise = np.random.normal(1, 0.15)
-            investment.append(base_investment * growth * multiplier * noise)
+        multiplier = np.select(
+            [np.isin(years, [2007, 2013, 2019, 2024]), np.isin(years, [2009, 2015, 2021])],
+            [1.6, 0.8], default=1.0)
         
-        return investment
+        growth = 1 + 0.028 * i
+        return base_investment * growth * multiplier * self._noise(0.15, dates)
     
     def _simulate_debt_charges(self, dates):
         """Simule les charges de la dette"""
         base_debt_charge = self.config["budget_base"] * 0.06
+        years = self._years(dates)
         
-        debt_charges = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year >= 2005:
-                increase = 1 + 0.007 * (year - 2005)
-            else:
-                increase = 1
-            
-            noise = np.random.normal(1, 0.08)
-            debt_charges.append(base_debt_charge * increase * noise)
-        
-        return debt_charges
+        increase = np.where(years >= 2005, 1 + 0.007 * (years - 2005), 1.0)
+        return base_debt_charge * increase * self._noise(0.08, dates)
     
     def _simulate_staff_costs(self, dates):
         """Simule les dépenses de personnel"""
         base_staff = self.config["budget_base"] * 0.42
+        i = self._years(dates) - self.start_year
         
-        staff_costs = []
-        for i, date in enumerate(dates):
-            growth = 1 + 0.029 * i
-            noise = np.random.normal(1, 0.03)
-            staff_costs.append(base_staff * growth * noise)
-        
-        return staff_costs
+        growth = 1 + 0.029 * i
+        return base_staff * growth * self._noise(0.03, dates)
     
     def _simulate_gross_savings(self, dates):
         """Simule l'épargne brute"""
-        savings = []
-        for i, date in enumerate(dates):
-            base_saving = self.config["budget_base"] * 0.03
-            
-            year = date.year
-            if year >= 2010:
-                improvement = 1 + 0.009 * (year - 2010)
-            else:
-                improvement = 1
-            
-            noise = np.random.normal(1, 0.12)
-            savings.append(base_saving * improvement * noise)
+        base_saving = self.config["budget_base"] * 0.03
+        years = self._years(dates)
         
-        return savings
+        improvement = np.where(years >= 2010, 1 + 0.009 * (years - 2010), 1.0)
+        return base_saving * improvement * self._noise(0.12, dates)
     
     def _simulate_total_debt(self, dates):
         """Simule la dette totale"""
         base_debt = self.config["budget_base"] * 0.80
+        years = self._years(dates)
         
-        debt = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2007, 2013, 2019, 2024]:
-                change = 1.22
-            elif year in [2009, 2015, 2021]:
-                change = 0.90
-            else:
-                change = 1.0
-            
-            noise = np.random.normal(1, 0.07)
-            debt.append(base_debt * change * noise)
+        change = np.select(
+            [np.isin(years, [2007, 2013, 2019, 2024]), np.isin(years, [2009, 2015, 2021])],
+            [1.22, 0.90], default=1.0)
         
-        return debt
+        return base_debt * change * self._noise(0.07, dates)
     
     def _simulate_debt_ratio(self, dates):
-        """Simule le taux d'endettement"""
-        ratios = []
-        for i, date in enumerate(dates):
-            base_ratio = 0.72
-            
-            year = date.year
-            if year >= 2010:
-                improvement = 1 - 0.011 * (year - 2010)
-            else:
-                improvement = 1
-            
-            noise = np.random.normal(1, 0.05)
-            ratios.append(base_ratio * improvement * noise)
+        """Simule le taux d'endettement"""
+        base_ratio = 0.72
+        years = self._years(dates)
         
-        return ratios
+        improvement = np.where(years >= 2010, 1 - 0.011 * (years - 2010), 1.0)
+        return base_ratio * improvement * self._noise(0.05, dates)
     
     def _simulate_tax_rate(self, dates):
         """Simule le taux de fiscalité (moyen)"""
-        rates = []
-        for i, date in enumerate(dates):
-            base_rate = 0.88
-            
-            year = date.year
-            if year >= 2010:
-                increase = 1 + 0.004 * (year - 2010)
-            else:
-                increase = 1
-            
-            noise = np.random.normal(1, 0.03)
-            rates.append(base_rate * increase * noise)
+        base_rate = 0.88
+        years = self._years(dates)
         
-        return rates
+        increase = np.where(years >= 2010, 1 + 0.004 * (years - 2010), 1.0)
+        return base_rate * increase * self._noise(0.03, dates)
     
     def _simulate_avg_price_per_sqm(self, dates):
         """Simule le prix moyen au m² (spécifique à Bordeaux)"""
         base_price = self.config["prix_m2_base"]
-        
-        prices = []
-        for i, date in enumerate(dates):
-            year = date.year
-            
-            # Croissance forte du marché immobilier bordelais
-            if self.config["segment_immobilier"] == "premium":
-                growth_rate = 0.045  # Croissance très forte pour le premium
-            elif self.config["segment_immobilier"] == "haut_de_gamme":
-                growth_rate = 0.042  # Croissance forte pour le haut de gamme
-            elif self.config["segment_immobilier"] == "universitaire":
-                growth_rate = 0.038  # Croissance forte autour des universités
-            else:
-                growth_rate = 0.035  # Croissance moyenne
-            
-            # Ajustements annuels basés sur des événements réels
-            if 2002 <= year <= 2007:
-                # Période de forte croissance pré-crise
-                multiplier = 1 + 0.06 * (year - 2002)
-            elif 2008 <= year <= 2009:
-                # Impact modéré de la crise financière à Bordeaux
-                multiplier = 0.96
-            elif 2010 <= year <= 2019:
-                # Forte reprise et boom immobilier bordelais
-                multiplier = 1 + 0.05 * (year - 2010)
-            elif 2020 <= year <= 2021:
-                # Résilience pendant le COVID
-                multiplier = 1.02
-            else:
-                # Croissance soutenue post-COVID
-                multiplier = 1 + 0.04 * (year - 2022)
-            
-            growth = 1 + growth_rate * i
-            noise = np.random.normal(1, 0.08)
-            prices.append(base_price * growth * multiplier * noise)
-        
-        return prices
+        years = self._years(dates)
+        i = years - self.start_year
+        
+        # Croissance forte du marché immobilier bordelais
+        growth_rate = self._config_rate("segment_immobilier", {
+            "premium": 0.045,        # Croissance très forte pour le premium
+            "haut_de_gamme": 0.042,  # Croissance forte pour le haut de gamme
+            "universitaire": 0.038,  # Croissance forte autour des universités
+        }, default=0.035)            # Croissance moyenne
+        
+        # Ajustements annuels basés sur des événements réels
+        multiplier = np.select(
+            [years < 2002,                        # Avant 2002 : niveau de 2002 maintenu
+             (2002 <= years) & (years <= 2007),   # Période de forte croissance pré-crise
+             (2008 <= years) & (years <= 2009),   # Impact modéré de la crise financière à Bordeaux
+             (2010 <= years) & (years <= 2019),   # Forte reprise et boom immobilier bordelais
+             (2020 <= years) & (years <= 2021)],  # Résilience pendant le COVID
+            [1.0,
+             1 + 0.06 * (years - 2002),
+             0.96,
+             1 + 0.05 * (years - 2010),
+             1.02],
+            default=1 + 0.04 * (years - 2022))    # Croissance soutenue post-COVID
+        
+        growth = 1 + growth_rate * i
+        return base_price * growth * multiplier * self._noise(0.08, dates)
     
     def _simulate_real_estate_transactions(self, dates):
         """Simule le nombre de transactions immobilières"""
         base_transactions = self.config["population_base"] / 100  # Base proportionnelle à la population
-        
-        transactions = []
-        for i, date in enumerate(dates):
-            year = date.year
-            
-            # Variations selon la conjoncture
-            if 2002 <= year <= 2007:
-                multiplier = 1 + 0.08 * (year - 2002)  # Forte activité
-            elif 2008 <= year <= 2009:
-                multiplier = 0.75  # Baisse pendant la crise
-            elif 2010 <= year <= 2019:
-                multiplier = 1 + 0.06 * (year - 2010)  # Reprise progressive
-            elif 2020 <= year <= 2021:
-                multiplier = 0.85  # Ralentissement COVID
-            else:
-                multiplier = 1 + 0.05 * (year - 2022)  # Reprise post-COVID
-            
-            growth = 1 + 0.015 * i
-            noise = np.random.normal(1, 0.12)
-            transactions.append(base_transactions * growth * multiplier * noise)
-        
-        return transactions
+        years = self._years(dates)
+        i = years - self.start_year
+        
+        # Variations selon la conjoncture
+        multiplier = np.select(
+            [years < 2002,
+             (2002 <= years) & (years <= 2007),
+             (2008 <= years) & (years <= 2009),
+             (2010 <= years) & (years <= 2019),
+             (2020 <= years) & (years <= 2021)],
+            [1.0,                        # Avant 2002 : niveau de 2002 maintenu
+             1 + 0.08 * (years - 2002),  # Forte activité
+             0.75,                       # Baisse pendant la crise
+             1 + 0.06 * (years - 2010),  # Reprise progressive
+             0.85],                      # Ralentissement COVID
+            default=1 + 0.05 * (years - 2022))  # Reprise post-COVID
+        
+        growth = 1 + 0.015 * i
+        return base_transactions * growth * multiplier * self._noise(0.12, dates)
     
     def _simulate_new_housing(self, dates):
         """Simule le nombre de nouveaux logements construits"""
         base_housing = self.config["population_base"] / 500  # Base proportionnelle
+        years = self._years(dates)
+        i = years - self.start_year
         
-        housing = []
-        for i, date in enumerate(dates):
-            year = date.year
-            
-            # Pics de construction selon les programmes
-            if year in [2005, 2010, 2015, 2020]:
-                multiplier = 2.0  # Années de grands programmes
-            elif year in [2008, 2014, 2021]:
-                multiplier = 0.7  # Ralentissements
-            else:
-                multiplier = 1.0
-            
-            growth = 1 + 0.018 * i
-            noise = np.random.normal(1, 0.20)
-            housing.append(base_housing * growth * multiplier * noise)
+        # Pics de construction selon les programmes
+        multiplier = np.select(
+            [np.isin(years, [2005, 2010, 2015, 2020]),  # Années de grands programmes
+             np.isin(years, [2008, 2014, 2021])],       # Ralentissements
+            [2.0, 0.7], default=1.0)
         
-        return housing
+        growth = 1 + 0.018 * i
+        return base_housing * growth * multiplier * self._noise(0.20, dates)
     
     def _simulate_property_tax(self, dates):
         """Simule la taxe foncière"""
         base_tax = self.config["budget_base"] * 0.15
+        years = self._years(dates)
         
-        tax = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year >= 2010:
-                increase = 1 + 0.012 * (year - 2010)
-            else:
-                increase = 1
-            
-            noise = np.random.normal(1, 0.06)
-            tax.append(base_tax * increase * noise)
-        
-        return tax
+        increase = np.where(years >= 2010, 1 + 0.012 * (years - 2010), 1.0)
+        return base_tax * increase * self._noise(0.06, dates)
     
     def _simulate_residence_tax(self, dates):
         """Simule la taxe d'habitation (en diminution)"""
         base_tax = self.config["budget_base"] * 0.12
+        years = self._years(dates)
         
-        tax = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year >= 2018:
-                # Réduction progressive de la taxe d'habitation
-                reduction = 1 - 0.15 * min(4, year - 2018)  # Suppression progressive
-            else:
-                reduction = 1
-            
-            noise = np.random.normal(1, 0.05)
-            tax.append(base_tax * reduction * noise)
-        
-        return tax
+        # Réduction progressive de la taxe d'habitation (suppression progressive)
+        reduction = np.where(years >= 2018, 1 - 0.15 * np.minimum(4, years - 2018), 1.0)
+        return base_tax * reduction * self._noise(0.05, dates)
     
     def _simulate_real_estate_investment(self, dates):
         """Simule l'investissement immobilier"""
         base_investment = self.config["budget_base"] * 0.08
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 1.5 if "residential" in self.config["specialites"] else 0.9
-        
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2006, 2012, 2018, 2023]:
-                year_multiplier = 1.8
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.035 * i
-            noise = np.random.normal(1, 0.16)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
+        multiplier = np.where(self._has_specialty("residential"), 1.5, 0.9)
+        year_multiplier = np.where(np.isin(years, [2006, 2012, 2018, 2023]), 1.8, 1.0)
         
-        return investment
+        growth = 1 + 0.035 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.16, dates)
     
     def _simulate_transport_investment(self, dates):
         """Simule l'investissement en transport (tramway, etc.)"""
         base_investment = self.config["budget_base"] * 0.06
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 1.6 if "transport" in self.config["specialites"] else 1.0
-        
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            # Pics d'investissement liés au tramway
-            if year in [2003, 2007, 2014, 2020]:
-                year_multiplier = 2.2
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.030 * i
-            noise = np.random.normal(1, 0.18)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
+        multiplier = np.where(self._has_specialty("transport"), 1.6, 1.0)
+        # Pics d'investissement liés au tramway
+        year_multiplier = np.where(np.isin(years, [2003, 2007, 2014, 2020]), 2.2, 1.0)
         
-        return investment
+        growth = 1 + 0.030 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.18, dates)
     
     def _simulate_wine_investment(self, dates):
         """Simule l'investissement viticole (spécifique à Bordeaux)"""
         base_investment = self.config["budget_base"] * 0.04
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 2.0 if "vin" in self.config["specialites"] else 0.5
-        
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2005, 2010, 2015, 2020]:
-                year_multiplier = 1.9
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.032 * i
-            noise = np.random.normal(1, 0.22)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
+        multiplier = np.where(self._has_specialty("vin"), 2.0, 0.5)
+        year_multiplier = np.where(np.isin(years, [2005, 2010, 2015, 2020]), 1.9, 1.0)
         
-        return investment
+        growth = 1 + 0.032 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.22, dates)
     
     def _simulate_tourism_investment(self, dates):
         """Simule l'investissement touristique"""
         base_investment = self.config["budget_base"] * 0.05
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 1.7 if "tourisme" in self.config["specialites"] else 0.8
-        
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2007, 2013, 2019, 2024]:
-                year_multiplier = 1.8
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.028 * i
-            noise = np.random.normal(1, 0.17)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
+        multiplier = np.where(self._has_specialty("tourisme"), 1.7, 0.8)
+        year_multiplier = np.where(np.isin(years, [2007, 2013, 2019, 2024]), 1.8, 1.0)
         
-        return investment
+        growth = 1 + 0.028 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.17, dates)
     
     def _simulate_culture_investment(self, dates):
         """Simule l'investissement culturel"""
         base_investment = self.config["budget_base"] * 0.03
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 1.6 if "culture" in self.config["specialites"] else 0.8
+        multiplier = np.where(self._has_specialty("culture"), 1.6, 0.8)
+        year_multiplier = np.where(np.isin(years, [2010, 2016, 2022]), 1.9, 1.0)
         
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2010, 2016, 2022]:
-                year_multiplier = 1.9
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.025 * i
-            noise = np.random.normal(1, 0.15)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
-        
-        return investment
+        growth = 1 + 0.025 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.15, dates)
     
     def _simulate_education_investment(self, dates):
         """Simule l'investissement éducatif"""
         base_investment = self.config["budget_base"] * 0.07
+        years = self._years(dates)
+        i = years - self.start_year
         
         # Ajustement selon les spécialités
-        multiplier = 1.8 if "universite" in self.config["specialites"] else 1.0
-        
-        investment = []
-        for i, date in enumerate(dates):
-            year = date.year
-            if year in [2008, 2014, 2020]:
-                year_multiplier = 1.7
-            else:
-                year_multiplier = 1.0
-            
-            growth = 1 + 0.030 * i
-            noise = np.random.normal(1, 0.14)
-            investment.append(base_investment * growth * year_multiplier * multiplier * noise)
+        multiplier = np.where(self._has_specialty("universite"), 1.8, 1.0)
+        year_multiplier = np.where(np.isin(years, [2008, 2014, 2020]), 1.7, 1.0)
         
-        return investment
+        growth = 1 + 0.030 * i
+        return base_investment * growth * year_multiplier * multiplier * self._noise(0.14, dates)
     
-    def _add_bordeaux_trends(self, df):
-        """Ajoute des tendances réalistes adaptées au marché bordelais"""
-        for i, row in df.iterrows():
-            year = row['Annee']
-            
-            # Développement du tramway (phases successives)
-            if year in [2003, 2004]:
-                df.loc[i, 'Investissement_Transport'] *= 2.5  # Lancement tramway
-            if year in [2007, 2008]:
-                df.loc[i, 'Investissement_Transport'] *= 2.0  # Extensions
-            if year in [2014, 2015]:
-                df.loc[i, 'Investissement_Transport'] *= 1.8  # Nouvelles lignes
-            
-            # Boom immobilier bordelais (2010-2019)
-            if 2010 <= year <= 2019:
-                df.loc[i, 'Prix_m2_Moyen'] *= 1.05
-                df.loc[i, 'Transactions_Immobilieres'] *= 1.08
-                df.loc[i, 'Investissement_Immobilier'] *= 1.3
+    def _event_multipliers(self, years, periods=None):
+        """Calcule, par colonne, le multiplicateur cumulé des événements du calendrier
+        
+        Pour une série infra-annuelle, `periods` donne le numéro de période de
+        chaque ligne : un événement touche toute période qui chevauche ses mois
+        (mois_debut et mois_fin, par défaut l'année entière). Une colonne
+        inconnue lève ValueError, quel que soit le chemin de génération.
+        """
+        # Premier et dernier mois couverts par chaque ligne, comptés depuis l'an 0
+        months = 12 // self.periods if periods is not None else 12
+        first = years * 12 + ((np.asarray(periods) - 1) * months if periods is not None else 0)
+        last = first + months - 1
+        
+        multipliers = {}
+        for event in self.events:
+            if event["colonne"] not in INDICATOR_COLUMNS:
+                raise ValueError(f"Colonne inconnue dans le calendrier d'événements: {event['colonne']}")
+            mask = last >= event["annee_debut"] * 12 + (event.get("mois_debut") or 1) - 1
+            if event["annee_fin"] is not None:
+                mask &= first <= event["annee_fin"] * 12 + (event.get("mois_fin") or 12) - 1
+            if event["communes"] is not None:
+                mask = mask & self._in_communes(event["communes"])
             
-            # Effet Cité du Vin (2016)
-            if year == 2016:
-                df.loc[i, 'Investissement_Tourisme'] *= 2.0
-                df.loc[i, 'Investissement_Culture'] *= 1.8
-            
-            # Impact COVID-19 (2020-2021) - marché résilient à Bordeaux
-            if 2020 <= year <= 2021:
-                if year == 2020:
-                    df.loc[i, 'Transactions_Immobilieres'] *= 0.80
-                else:
-                    df.loc[i, 'Prix_m2_Moyen'] *= 1.03  # Reprise rapide
-                    df.loc[i, 'Transactions_Immobilieres'] *= 1.10
+            multiplier = multipliers.get(event["colonne"], np.ones(len(years)))
+            multipliers[event["colonne"]] = np.where(mask, multiplier * event["multiplicateur"], multiplier)
+        return multipliers
+    
+    def _in_communes(self, communes):
+        """Indique si la commune analysée fait partie de la liste donnée"""
+        return self.commune in communes
+    
+    def simulate_replicates(self, n_replicates, chunk_size=1000):
+        """Génère les réplicats par blocs (réplicats x périodes x indicateurs)
+        
+        Les tirages d'un réplicat ne dépendent que de la commune et de son
+        numéro, par tranches de MONTE_CARLO_BLOCK réplicats (voir _draw_noise) :
+        chunk_size ne règle que la mémoire, pas le résultat. Il est arrondi au
+        multiple de MONTE_CARLO_BLOCK supérieur pour ne jamais tirer une
+        tranche sans en utiliser tous les réplicats. Produit des couples
+        (indice du premier réplicat, bloc) ; les lignes d'un bloc sont celles
+        de _replicate_labels().
+        """
+        chunk_size = -(-chunk_size // MONTE_CARLO_BLOCK) * MONTE_CARLO_BLOCK
+        dates = self._dates()
+        labels = self._period_labels(dates)
+        multipliers = self._event_multipliers(labels['Annee'], labels.get('Periode'))
+        
+        for start in range(0, n_replicates, chunk_size):
+            size = min(chunk_size, n_replicates - start)
+            blocks = range(start // MONTE_CARLO_BLOCK, (start + size - 1) // MONTE_CARLO_BLOCK + 1)
+            self.rng = [self._make_rng((MONTE_CARLO_STREAM, block)) for block in blocks]
+            self._replicates = (start, size)
+            try:
+                data = self._to_periods(self._simulate_columns(dates))
+            finally:
+                self._replicates = None
             
-            # Plan de relance métropolitain (2022-2025)
-            if year >= 2022:
-                df.loc[i, 'Investissement_Transport'] *= 1.15
-                df.loc[i, 'Investissement_Immobilier'] *= 1.20
-                df.loc[i, 'Nouveaux_Logements'] *= 1.25
-    
-    def create_financial_analysis(self, df):
-        """Crée une analyse complète des finances et de l'immobilier"""
+            columns = np.broadcast_arrays(*(data[column] * multipliers.get(column, 1.0)
+                                            for column in INDICATOR_COLUMNS))
+            yield start, np.stack(columns, axis=-1).reshape(size, -1, len(INDICATOR_COLUMNS))
+    
+    def _replicate_labels(self):
+        """Colonnes d'index des lignes des réplicats : Annee[, Periode]"""
+        return self._period_labels(self._dates())
+    
+    def monte_carlo(self, n_replicates, chunk_size=1000,
+                    quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), bins=1024):
+        """Simule n réplicats et les réduit en moyenne, écart-type et bandes de quantiles
+        
+        Les réplicats sont traités par blocs de chunk_size : la mémoire utilisée
+        ne dépend pas du nombre total de réplicats.
+        """
+        print(f"🎲 Monte Carlo ({n_replicates} réplicats) pour {self.commune}...")
+        blocks = (block for _, block in self.simulate_replicates(n_replicates, chunk_size))
+        with span("monte_carlo", commune=self.commune, replicats=n_replicates):
+            return summarize_blocks(blocks, self._replicate_labels(), INDICATOR_COLUMNS,
+                                    quantiles=quantiles, bins=bins)
+    
+    def _add_bordeaux_trends(self, panel, observed=None):
+        """Ajoute des tendances réalistes adaptées au marché bordelais (en place dans le panel)
+        
+        Les valeurs observées (`observed`, annuelles) intègrent déjà les chocs
+        réels : les événements ne s'y appliquent pas.
+        """
+        observed = observed or {}
+        multipliers = self._event_multipliers(panel.labels['Annee'], panel.labels.get('Periode'))
+        for column, multiplier in multipliers.items():
+            if column in observed:
+                measured = np.repeat(~np.isnan(observed[column]), self.periods, axis=-1)
+                multiplier = np.where(measured, 1.0, multiplier)
+            values = panel.indicator(column)
+            values *= multiplier
+    
+    def create_financial_analysis(self, df, output_file=None, show=True, insights=True, bands=None,
+                                  preset='print'):
+        """Crée une analyse complète des finances et de l'immobilier
+        
+        Avec un résumé de Monte Carlo (bands), les courbes sont entourées de
+        leurs bandes de quantiles ; df est alors typiquement bands.mean. La
+        résolution de l'image vient du préréglage (RENDER_PRESETS).
+        """
+        plt = _pyplot()
         plt.style.use('seaborn-v0_8')
-        fig = plt.figure(figsize=(20, 28))
+        fig = plt.figure(figsize=DASHBOARD_FIGSIZE)
         
         # 1. Évolution des recettes et dépenses
-        ax1 = plt.subplot(5, 2, 1)
-        self._plot_revenue_expenses(df, ax1)
+        with span("panneau", commune=self.commune, panneau="recettes_depenses"):
+            ax1 = plt.subplot(5, 2, 1)
+            self._plot_revenue_expenses(df, ax1, bands=bands)
         
         # 2. Structure des recettes
-        ax2 = plt.subplot(5, 2, 2)
-        self._plot_revenue_structure(df, ax2)
+        with span("panneau", commune=self.commune, panneau="structure_recettes"):
+            ax2 = plt.subplot(5, 2, 2)
+            self._plot_revenue_structure(df, ax2)
         
         # 3. Évolution des prix immobiliers
-        ax3 = plt.subplot(5, 2, 3)
-        self._plot_real_estate_prices(df, ax3)
+        with span("panneau", commune=self.commune, panneau="prix_immobiliers"):
+            ax3 = plt.subplot(5, 2, 3)
+            self._plot_real_estate_prices(df, ax3, bands=bands)
         
         # 4. Activité immobilière
-        ax4 = plt.subplot(5, 2, 4)
-        self._plot_real_estate_activity(df, ax4)
+        with span("panneau", commune=self.commune, panneau="activite_immobiliere"):
+            ax4 = plt.subplot(5, 2, 4)
+            self._plot_real_estate_activity(df, ax4, bands=bands)
         
         # 5. Structure des dépenses
-        ax5 = plt.subplot(5, 2, 5)
-        self._plot_expenses_structure(df, ax5)
+        with span("panneau", commune=self.commune, panneau="structure_depenses"):
+            ax5 = plt.subplot(5, 2, 5)
+            self._plot_expenses_structure(df, ax5)
         
         # 6. Investissements communaux
-        ax6 = plt.subplot(5, 2, 6)
-        self._plot_investments(df, ax6)
+        with span("panneau", commune=self.commune, panneau="investissements"):
+            ax6 = plt.subplot(5, 2, 6)
+            self._plot_investments(df, ax6, bands=bands)
         
         # 7. Dette et endettement
-        ax7 = plt.subplot(5, 2, 7)
-        self._plot_debt(df, ax7)
+        with span("panneau", commune=self.commune, panneau="dette"):
+            ax7 = plt.subplot(5, 2, 7)
+            self._plot_debt(df, ax7, bands=bands)
         
         # 8. Indicateurs de performance
-        ax8 = plt.subplot(5, 2, 8)
-        self._plot_performance_indicators(df, ax8)
+        with span("panneau", commune=self.commune, panneau="performance"):
+            ax8 = plt.subplot(5, 2, 8)
+            self._plot_performance_indicators(df, ax8, bands=bands)
         
         # 9. Démographie
-        ax9 = plt.subplot(5, 2, 9)
-        self._plot_demography(df, ax9)
+        with span("panneau", commune=self.commune, panneau="demographie"):
+            ax9 = plt.subplot(5, 2, 9)
+            self._plot_demography(df, ax9)
         
         # 10. Investissements sectoriels
-        ax10 = plt.subplot(5, 2, 10)
-        self._plot_sectorial_investments(df, ax10)
+        with span("panneau", commune=self.commune, panneau="investissements_sectoriels"):
+            ax10 = plt.subplot(5, 2, 10)
+            self._plot_sectorial_investments(df, ax10)
         
         plt.suptitle(f'Analyse des Comptes Communaux et Immobiliers de {self.commune} - Bordeaux Métropole ({self.start_year}-{self.end_year})', 
                     fontsize=16, fontweight='bold')
-        plt.tight_layout()
-        plt.savefig(f'{self.commune}_bordeaux_analysis.png', dpi=300, bbox_inches='tight')
-        plt.show()
+        with span("mise_en_page", commune=self.commune):
+            plt.tight_layout()
+        if output_file is None:
+            output_file = f'{self.commune}_bordeaux_analysis.png'
+        with span("savefig", commune=self.commune, dpi=RENDER_PRESETS[preset]["dpi"]):
+            plt.savefig(output_file, dpi=RENDER_PRESETS[preset]["dpi"], bbox_inches='tight')
+        if show:
+            plt.show()
+        plt.close(fig)
         
         # Générer les insights
-        self._generate_financial_insights(df)
+        if insights:
+            with span("insights", commune=self.commune):
+                self._generate_financial_insights(df)
+        
+        return output_file
+    
+    def render_panel(self, df, name, output_file=None, dpi=150):
+        """Rend un seul panneau du tableau de bord dans sa propre figure
+        
+        Retourne les octets PNG, ou le chemin du fichier si output_file est
+        donné. La taille en pixels est fixe (PANEL_FIGSIZE x dpi), ce qui
+        permet de recomposer le tableau de bord à partir des tuiles.
+        """
+        method = {panel: method for panel, method, _ in DASHBOARD_PANELS}[name]
+        plt = _pyplot()
+        with plt.style.context('seaborn-v0_8'):
+            fig = plt.figure(figsize=PANEL_FIGSIZE)
+            ax = fig.add_axes([0.09, 0.1, 0.82, 0.8])
+            getattr(self, method)(df, ax)
+            
+            buffer = io.BytesIO()
+            fig.savefig(buffer, format='png', dpi=dpi)
+            plt.close(fig)
+        
+        png = buffer.getvalue()
+        if output_file is None:
+            return png
+        with open(output_file, 'wb') as f:
+            f.write(png)
+        return output_file
+    
+    def create_dashboard_from_tiles(self, df, panel_cache, output_file=None, dpi=150, show=False):
+        """Compose le tableau de bord à partir des tuiles de panneaux, en ne rendant que les manquantes
+        
+        Retourne le chemin du fichier et le nombre de panneaux effectivement rendus.
+        """
+        plt = _pyplot()
+        tiles = []
+        rendered = 0
+        for name, _, columns in DASHBOARD_PANELS:
+            key = panel_cache.key(name, df, columns, dpi)
+            png = panel_cache.get(key)
+            if png is None:
+                png = self.render_panel(df, name, dpi=dpi)
+                panel_cache.put(key, png)
+                rendered += 1
+            tiles.append(plt.imread(io.BytesIO(png), format='png'))
+        
+        # Bandeau de titre à la largeur de deux tuiles
+        title_fig = plt.figure(figsize=(2 * PANEL_FIGSIZE[0], 0.8))
+        title_fig.text(0.5, 0.5, f'Analyse des Comptes Communaux et Immobiliers de {self.commune} - '
+                       f'Bordeaux Métropole ({self.start_year}-{self.end_year})',
+                       ha='center', va='center', fontsize=16, fontweight='bold')
+        buffer = io.BytesIO()
+        title_fig.savefig(buffer, format='png', dpi=dpi, facecolor='white')
+        plt.close(title_fig)
+        title = plt.imread(io.BytesIO(buffer.getvalue()), format='png')
+        
+        rows = [np.hstack(tiles[i:i + 2]) for i in range(0, len(tiles), 2)]
+        sheet = np.vstack([title[:, :rows[0].shape[1]]] + rows)
+        
+        if output_file is None:
+            output_file = f'{self.commune}_bordeaux_analysis.png'
+        plt.imsave(output_file, sheet)
+        if show:
+            fig = plt.figure(figsize=(sheet.shape[1] / dpi, sheet.shape[0] / dpi))
+            ax = fig.add_axes([0, 0, 1, 1])
+            ax.imshow(sheet)
+            ax.axis('off')
+            plt.show()
+            plt.close(fig)
+        return output_file, rendered
     
-    def _plot_revenue_expenses(self, df, ax):
+    def _plot_band(self, ax, df, bands, column, color, inner=True):
+        """Trace les bandes de quantiles (Monte Carlo) d'une courbe"""
+        if bands is None:
+            return
+        low, high = bands.band(column)
+        ax.fill_between(df['Annee'], low, high, color=color, alpha=0.12, linewidth=0)
+        inner_band = bands.band(column, inner=True) if inner else None
+        if inner_band is not None:
+            ax.fill_between(df['Annee'], *inner_band, color=color, alpha=0.22, linewidth=0)
+    
+    def _plot_bar_band(self, ax, df, bands, column, color='black'):
+        """Ajoute l'intervalle de quantiles (Monte Carlo) d'une série en barres d'erreur"""
+        if bands is None:
+            return
+        low, high = bands.band(column)
+        values = df[column].to_numpy()
+        ax.errorbar(df['Annee'], values, yerr=[np.maximum(values - low, 0), np.maximum(high - values, 0)],
+                    fmt='none', ecolor=color, alpha=0.6, capsize=2)
+    
+    def _plot_revenue_expenses(self, df, ax, bands=None):
         """Plot de l'évolution des recettes et dépenses"""
-        ax.plot(df['Annee'], df['Recettes_Totales'], label='Recettes Totales', 
+        ax.plot(df['Annee'], df['Recettes_Totales'], gid='Recettes_Totales', label='Recettes Totales', 
                linewidth=2, color='#8B0000', alpha=0.8)
-        ax.plot(df['Annee'], df['Depenses_Totales'], label='Dépenses Totales', 
+        ax.plot(df['Annee'], df['Depenses_Totales'], gid='Depenses_Totales', label='Dépenses Totales', 
                linewidth=2, color='#00008B', alpha=0.8)
+        self._plot_band(ax, df, bands, 'Recettes_Totales', '#8B0000')
+        self._plot_band(ax, df, bands, 'Depenses_Totales', '#00008B')
         
         ax.set_title('Évolution des Recettes et Dépenses (M€)', 
                     fontsize=12, fontweight='bold')
@@ -852,7 +2216,7 @@ class BordeauxCommuneImmobilierAnalyzer:
         labels = ['Impôts Locaux', 'Dotations État', 'Autres Recettes']
         
         for i, category in enumerate(categories):
-            ax.bar(years, df[category], width, label=labels[i], bottom=bottom, color=colors[i])
+            ax.bar(years, df[category], width, gid=category, label=labels[i], bottom=bottom, color=colors[i])
             bottom += df[category]
         
         ax.set_title('Structure des Recettes (M€)', fontsize=12, fontweight='bold')
@@ -860,29 +2224,35 @@ class BordeauxCommuneImmobilierAnalyzer:
         ax.legend()
         ax.grid(True, alpha=0.3, axis='y')
     
-    def _plot_real_estate_prices(self, df, ax):
+    def _plot_real_estate_prices(self, df, ax, bands=None):
         """Plot de l'évolution des prix immobiliers"""
-        ax.plot(df['Annee'], df['Prix_m2_Moyen'], label='Prix moyen au m²', 
+        ax.plot(df['Annee'], df['Prix_m2_Moyen'], gid='Prix_m2_Moyen', label='Prix moyen au m²', 
                linewidth=3, color='#8B0000', alpha=0.8)
+        self._plot_band(ax, df, bands, 'Prix_m2_Moyen', '#8B0000')
         
         ax.set_title('Évolution des Prix Immobiliers (€/m²)', fontsize=12, fontweight='bold')
         ax.set_ylabel('Prix (€/m²)')
         ax.grid(True, alpha=0.3)
         
-        # Ajouter des annotations pour les événements marquants
-        ax.annotate('Lancement Tramway', xy=(2003, df.loc[df['Annee'] == 2003, 'Prix_m2_Moyen'].values[0]), 
-                   xytext=(2003, df.loc[df['Annee'] == 2003, 'Prix_m2_Moyen'].values[0] * 0.9),
-                   arrowprops=dict(arrowstyle='->', color='red'))
-        
-        ax.annotate('Boom immobilier', xy=(2015, df.loc[df['Annee'] == 2015, 'Prix_m2_Moyen'].values[0]), 
-                   xytext=(2015, df.loc[df['Annee'] == 2015, 'Prix_m2_Moyen'].values[0] * 1.1),
-                   arrowprops=dict(arrowstyle='->', color='green'))
+        # Ajouter des annotations pour les événements marquants (si inclus dans la période)
+        price_2003 = value_at_year(df, 'Prix_m2_Moyen', 2003)
+        if price_2003 is not None:
+            ax.annotate('Lancement Tramway', gid='Prix_m2_Moyen', xy=(2003, price_2003), 
+                       xytext=(2003, price_2003 * 0.9),
+                       arrowprops=dict(arrowstyle='->', color='red'))
+        
+        price_2015 = value_at_year(df, 'Prix_m2_Moyen', 2015)
+        if price_2015 is not None:
+            ax.annotate('Boom immobilier', gid='Prix_m2_Moyen', xy=(2015, price_2015), 
+                       xytext=(2015, price_2015 * 1.1),
+                       arrowprops=dict(arrowstyle='->', color='green'))
     
-    def _plot_real_estate_activity(self, df, ax):
+    def _plot_real_estate_activity(self, df, ax, bands=None):
         """Plot de l'activité immobilière"""
         # Transactions immobilières
-        ax.bar(df['Annee'], df['Transactions_Immobilieres'], label='Transactions', 
+        ax.bar(df['Annee'], df['Transactions_Immobilieres'], gid='Transactions_Immobilieres', label='Transactions', 
               color='#8B0000', alpha=0.7)
+        self._plot_bar_band(ax, df, bands, 'Transactions_Immobilieres')
         
         ax.set_title('Activité Immobilière', fontsize=12, fontweight='bold')
         ax.set_ylabel('Transactions immobilières', color='#8B0000')
@@ -891,8 +2261,9 @@ class BordeauxCommuneImmobilierAnalyzer:
         
         # Nouveaux logements en second axe
         ax2 = ax.twinx()
-        ax2.plot(df['Annee'], df['Nouveaux_Logements'], label='Nouveaux logements', 
+        ax2.plot(df['Annee'], df['Nouveaux_Logements'], gid='Nouveaux_Logements', label='Nouveaux logements', 
                 linewidth=2, color='#00008B')
+        self._plot_band(ax2, df, bands, 'Nouveaux_Logements', '#00008B')
         ax2.set_ylabel('Nouveaux logements', color='#00008B')
         ax2.tick_params(axis='y', labelcolor='#00008B')
         
@@ -912,7 +2283,7 @@ class BordeauxCommuneImmobilierAnalyzer:
         labels = ['Fonctionnement', 'Investissement', 'Charge Dette', 'Personnel']
         
         for i, category in enumerate(categories):
-            ax.bar(years, df[category], width, label=labels[i], bottom=bottom, color=colors[i])
+            ax.bar(years, df[category], width, gid=category, label=labels[i], bottom=bottom, color=colors[i])
             bottom += df[category]
         
         ax.set_title('Structure des Dépenses (M€)', fontsize=12, fontweight='bold')
@@ -920,29 +2291,34 @@ class BordeauxCommuneImmobilierAnalyzer:
         ax.legend()
         ax.grid(True, alpha=0.3, axis='y')
     
-    def _plot_investments(self, df, ax):
+    def _plot_investments(self, df, ax, bands=None):
         """Plot des investissements communaux"""
-        ax.plot(df['Annee'], df['Investissement_Immobilier'], label='Immobilier', 
+        ax.plot(df['Annee'], df['Investissement_Immobilier'], gid='Investissement_Immobilier', label='Immobilier', 
                linewidth=2, color='#8B0000', alpha=0.8)
-        ax.plot(df['Annee'], df['Investissement_Transport'], label='Transport', 
+        ax.plot(df['Annee'], df['Investissement_Transport'], gid='Investissement_Transport', label='Transport', 
                linewidth=2, color='#FFD700', alpha=0.8)
-        ax.plot(df['Annee'], df['Investissement_Viticole'], label='Viticole', 
+        ax.plot(df['Annee'], df['Investissement_Viticole'], gid='Investissement_Viticole', label='Viticole', 
                linewidth=2, color='#00008B', alpha=0.8)
-        ax.plot(df['Annee'], df['Investissement_Tourisme'], label='Tourisme', 
+        ax.plot(df['Annee'], df['Investissement_Tourisme'], gid='Investissement_Tourisme', label='Tourisme', 
                linewidth=2, color='#228B22', alpha=0.8)
-        ax.plot(df['Annee'], df['Investissement_Education'], label='Éducation', 
+        ax.plot(df['Annee'], df['Investissement_Education'], gid='Investissement_Education', label='Éducation', 
                linewidth=2, color='#FF6B6B', alpha=0.8)
+        for column, color in [('Investissement_Immobilier', '#8B0000'), ('Investissement_Transport', '#FFD700'),
+                              ('Investissement_Viticole', '#00008B'), ('Investissement_Tourisme', '#228B22'),
+                              ('Investissement_Education', '#FF6B6B')]:
+            self._plot_band(ax, df, bands, column, color, inner=False)
         
         ax.set_title('Répartition des Investissements (M€)', fontsize=12, fontweight='bold')
         ax.set_ylabel('Montants (M€)')
         ax.legend()
         ax.grid(True, alpha=0.3)
     
-    def _plot_debt(self, df, ax):
+    def _plot_debt(self, df, ax, bands=None):
         """Plot de la dette et du taux d'endettement"""
         # Dette totale
-        ax.bar(df['Annee'], df['Dette_Totale'], label='Dette Totale (M€)', 
+        ax.bar(df['Annee'], df['Dette_Totale'], gid='Dette_Totale', label='Dette Totale (M€)', 
               color='#8B0000', alpha=0.7)
+        self._plot_bar_band(ax, df, bands, 'Dette_Totale')
         
         ax.set_title('Dette Communale et Taux d\'Endettement', fontsize=12, fontweight='bold')
         ax.set_ylabel('Dette (M€)', color='#8B0000')
@@ -951,8 +2327,9 @@ class BordeauxCommuneImmobilierAnalyzer:
         
         # Taux d'endettement en second axe
         ax2 = ax.twinx()
-        ax2.plot(df['Annee'], df['Taux_Endettement'], label='Taux d\'Endettement', 
+        ax2.plot(df['Annee'], df['Taux_Endettement'], gid='Taux_Endettement', label='Taux d\'Endettement', 
                 linewidth=3, color='#00008B')
+        self._plot_band(ax2, df, bands, 'Taux_Endettement', '#00008B')
         ax2.set_ylabel('Taux d\'Endettement', color='#00008B')
         ax2.tick_params(axis='y', labelcolor='#00008B')
         
@@ -961,11 +2338,12 @@ class BordeauxCommuneImmobilierAnalyzer:
         lines2, labels2 = ax2.get_legend_handles_labels()
         ax.legend(lines1 + lines2, labels1 + labels2, loc='upper left')
     
-    def _plot_performance_indicators(self, df, ax):
+    def _plot_performance_indicators(self, df, ax, bands=None):
         """Plot des indicateurs de performance"""
         # Épargne brute
-        ax.bar(df['Annee'], df['Epargne_Brute'], label='Épargne Brute (M€)', 
+        ax.bar(df['Annee'], df['Epargne_Brute'], gid='Epargne_Brute', label='Épargne Brute (M€)', 
               color='#228B22', alpha=0.7)
+        self._plot_bar_band(ax, df, bands, 'Epargne_Brute')
         
         ax.set_title('Indicateurs de Performance', fontsize=12, fontweight='bold')
         ax.set_ylabel('Épargne Brute (M€)', color='#228B22')
@@ -974,8 +2352,9 @@ class BordeauxCommuneImmobilierAnalyzer:
         
         # Taux de fiscalité en second axe
         ax2 = ax.twinx()
-        ax2.plot(df['Annee'], df['Taux_Fiscalite'], label='Taux de Fiscalité', 
+        ax2.plot(df['Annee'], df['Taux_Fiscalite'], gid='Taux_Fiscalite', label='Taux de Fiscalité', 
                 linewidth=3, color='#FF6B6B')
+        self._plot_band(ax2, df, bands, 'Taux_Fiscalite', '#FF6B6B')
         ax2.set_ylabel('Taux de Fiscalité', color='#FF6B6B')
         ax2.tick_params(axis='y', labelcolor='#FF6B6B')
         
@@ -986,7 +2365,7 @@ class BordeauxCommuneImmobilierAnalyzer:
     
     def _plot_demography(self, df, ax):
         """Plot de l'évolution démographique"""
-        ax.plot(df['Annee'], df['Population'], label='Population', 
+        ax.plot(df['Annee'], df['Population'], gid='Population', label='Population', 
                linewidth=2, color='#8B0000', alpha=0.8)
         
         ax.set_title('Évolution Démographique', fontsize=12, fontweight='bold')
@@ -996,7 +2375,7 @@ class BordeauxCommuneImmobilierAnalyzer:
         
         # Nombre de ménages en second axe
         ax2 = ax.twinx()
-        ax2.plot(df['Annee'], df['Menages'], label='Ménages', 
+        ax2.plot(df['Annee'], df['Menages'], gid='Menages', label='Ménages', 
                 linewidth=2, color='#00008B', alpha=0.8)
         ax2.set_ylabel('Ménages', color='#00008B')
         ax2.tick_params(axis='y', labelcolor='#00008B')
@@ -1020,7 +2399,7 @@ class BordeauxCommuneImmobilierAnalyzer:
         labels = ['Immobilier', 'Transport', 'Viticole', 'Tourisme', 'Éducation']
         
         for i, category in enumerate(categories):
-            ax.bar(years, df[category], width, label=labels[i], bottom=bottom, color=colors[i])
+            ax.bar(years, df[category], width, gid=category, label=labels[i], bottom=bottom, color=colors[i])
             bottom += df[category]
         
         ax.set_title('Répartition Sectorielle des Investissements (M€)', fontsize=12, fontweight='bold')
@@ -1028,51 +2407,40 @@ class BordeauxCommuneImmobilierAnalyzer:
         ax.legend()
         ax.grid(True, alpha=0.3, axis='y')
     
-    def _generate_financial_insights(self, df):
-        """Génère des insights analytiques adaptés au marché bordelais"""
+    def _generate_financial_insights(self, df, insights=None):
+        """Génère des insights analytiques adaptés au marché bordelais
+        
+        Les statistiques sont lues dans la table de compute_insights (calculée
+        ici si elle n'est pas fournie, par exemple pour tout un panel).
+        """
+        row = (insights if insights is not None else compute_insights(df, self.commune)).loc[self.commune]
         print(f"🏛️ INSIGHTS ANALYTIQUES - Commune de {self.commune} (Bordeaux Métropole)")
         print("=" * 60)
         
         # 1. Statistiques de base
         print("\n1. 📈 STATISTIQUES GÉNÉRALES:")
-        avg_revenue = df['Recettes_Totales'].mean()
-        avg_expenses = df['Depenses_Totales'].mean()
-        avg_price = df['Prix_m2_Moyen'].mean()
-        avg_transactions = df['Transactions_Immobilieres'].mean()
-        
-        print(f"Recettes moyennes annuelles: {avg_revenue:.2f} M€")
-        print(f"Dépenses moyennes annuelles: {avg_expenses:.2f} M€")
-        print(f"Prix moyen au m²: {avg_price:.0f} €")
-        print(f"Transactions immobilières moyennes: {avg_transactions:.0f}")
+        print(f"Recettes moyennes annuelles: {row['Recettes_Moyennes']:.2f} M€")
+        print(f"Dépenses moyennes annuelles: {row['Depenses_Moyennes']:.2f} M€")
+        print(f"Prix moyen au m²: {row['Prix_m2_Moyen']:.0f} €")
+        print(f"Transactions immobilières moyennes: {row['Transactions_Moyennes']:.0f}")
         
         # 2. Croissance immobilière
         print("\n2. 📊 CROISSANCE IMMOBILIÈRE:")
-        price_growth = ((df['Prix_m2_Moyen'].iloc[-1] / 
-                        df['Prix_m2_Moyen'].iloc[0]) - 1) * 100
-        population_growth = ((df['Population'].iloc[-1] / 
-                             df['Population'].iloc[0]) - 1) * 100
-        
-        print(f"Croissance des prix au m² ({self.start_year}-{self.end_year}): {price_growth:.1f}%")
-        print(f"Croissance de la population ({self.start_year}-{self.end_year}): {population_growth:.1f}%")
+        print(f"Croissance des prix au m² ({self.start_year}-{self.end_year}): {row['Croissance_Prix_Pct']:.1f}%")
+        print(f"Croissance de la population ({self.start_year}-{self.end_year}): "
+              f"{row['Croissance_Population_Pct']:.1f}%")
         
         # 3. Structure financière
         print("\n3. 📋 STRUCTURE FINANCIÈRE:")
-        tax_share = (df['Impots_Locaux'].mean() / df['Recettes_Totales'].mean()) * 100
-        state_share = (df['Dotations_Etat'].mean() / df['Recettes_Totales'].mean()) * 100
-        property_tax_share = (df['Taxe_Fonciere'].mean() / df['Recettes_Totales'].mean()) * 100
-        
-        print(f"Part des impôts locaux dans les recettes: {tax_share:.1f}%")
-        print(f"Part des dotations de l'État dans les recettes: {state_share:.1f}%")
-        print(f"Part de la taxe foncière dans les recettes: {property_tax_share:.1f}%")
+        print(f"Part des impôts locaux dans les recettes: {row['Part_Impots_Locaux_Pct']:.1f}%")
+        print(f"Part des dotations de l'État dans les recettes: {row['Part_Dotations_Etat_Pct']:.1f}%")
+        print(f"Part de la taxe foncière dans les recettes: {row['Part_Taxe_Fonciere_Pct']:.1f}%")
         
         # 4. Marché immobilier
         print("\n4. 🏠 MARCHÉ IMMOBILIER:")
-        last_price = df['Prix_m2_Moyen'].iloc[-1]
-        price_2020 = df.loc[df['Annee'] == 2020, 'Prix_m2_Moyen'].values[0]
-        covid_impact = ((last_price / price_2020) - 1) * 100
-        
-        print(f"Prix actuel au m²: {last_price:.0f} €")
-        print(f"Impact COVID-19 sur les prix (2020-{self.end_year}): +{covid_impact:.1f}%")
+        print(f"Prix actuel au m²: {row['Prix_m2_Actuel']:.0f} €")
+        if not pd.isna(row['Impact_COVID_Pct']):
+            print(f"Impact COVID-19 sur les prix (2020-{self.end_year}): +{row['Impact_COVID_Pct']:.1f}%")
         print(f"Segment immobilier: {self.config['segment_immobilier']}")
         
         # 5. Spécificités de la commune bordelaise
@@ -1106,55 +2474,1496 @@ class BordeauxCommuneImmobilierAnalyzer:
         print("• Développer l'économie numérique et créative")
         print("• Renforcer l'attractivité commerciale et touristique")
 
-def main():
-    """Fonction principale pour Bordeaux Métropole"""
-    # Liste des communes de Bordeaux Métropole
-    communes = [
-        "Bordeaux", "Mérignac", "Pessac", "Talence", "Bègles", 
-        "Villenave-d'Ornon", "Gradignan", "Cenon", "Floirac", "Bouliac",
-        "Parempuyre", "Le Haillan", "Saint-Médard-en-Jalles", "Eysines", 
-        "Bruges", "Blanquefort", "Lormont", "Carbon-Blanc", "Ambès", "Bassens"
-    ]
-    
-    print("🏛️ ANALYSE DES COMPTES COMMUNAUX ET IMMOBILIERS - BORDEAUX MÉTROPOLE (2002-2025)")
-    print("=" * 70)
+class BordeauxMetropoleBatch(BordeauxCommuneImmobilierAnalyzer):
+    """Génère en un seul passage les données de plusieurs communes de la métropole
+    
+    Les méthodes _simulate_* de l'analyseur sont réutilisées telles quelles :
+    la configuration est stockée sous forme de colonnes (une ligne par commune)
+    et chaque indicateur est calculé pour toutes les communes à la fois. Chaque
+    commune conserve son propre flux aléatoire, si bien que le panel obtenu est
+    identique à la concaténation des analyses commune par commune.
+    
+    Avec insee=True, les communes sont données par leur code INSEE, qui sert
+    alors de clé (configuration et flux aléatoire) : à l'échelle nationale,
+    plusieurs communes portent le même nom. Le panel gagne une colonne Insee.
+    """
+    
+    def __init__(self, communes=None, seed=None, events=None, start_year=2002, end_year=2025,
+                 cache=None, frequency='A', registry=None, insee=False, observations=None):
+        registry = registry if registry is not None else commune_registry()
+        self.insee = insee
+        self.codes = [str(code) for code in communes] if insee else None
+        self.communes = ([registry.name(commune) for commune in communes] if communes is not None
+                         else metropole_communes())
+        super().__init__("Bordeaux Métropole", seed=seed, events=events,
+                         start_year=start_year, end_year=end_year, cache=cache, frequency=frequency,
+                         registry=registry, observations=observations)
+    
+    @property
+    def _keys(self):
+        """Clés des communes dans le référentiel et les flux aléatoires : codes INSEE ou noms"""
+        return self.codes if self.insee else self.communes
+    
+    def _get_commune_config(self):
+        """Configurations des communes en colonnes (une ligne par commune), lues en bloc dans le référentiel"""
+        return {key: column[:, None] for key, column in self.registry.columns(self._keys).items()}
+    
+    def _make_rng(self, replicate=0):
+        """Crée un générateur indépendant par commune pour le réplicat donné"""
+        return [np.random.default_rng(commune_seed_sequence(self.seed_sequence, commune, replicate))
+                for commune in self._keys]
+    
+    def _noise_table(self, stop):
+        """Tire la table de chaque commune dans son propre flux (communes x années x colonnes)"""
+        # En Monte Carlo, self.rng contient les générateurs des tranches, chacun par commune
+        rngs = self.rng if self._replicates is None else list(zip(*self.rng))
+        return np.stack([self._draw_noise(rng, stop) for rng in rngs], axis=-3)
+    
+    def _config_rate(self, key, rates, default):
+        """Associe un taux à chaque commune selon sa valeur catégorielle"""
+        return np.array([[rates.get(value, default)] for value in self.config[key][:, 0]])
+    
+    def _has_specialty(self, specialty):
+        """Indique, pour chaque commune, si elle possède la spécialité donnée"""
+        return np.array([[specialty in specialites] for specialites in self.config["specialites"][:, 0]])
+    
+    def _in_communes(self, communes):
+        """Indique, pour chaque commune du lot, si elle fait partie de la liste donnée"""
+        return np.isin(self.communes, communes)[:, None]
+    
+    def _replicate_labels(self):
+        """Colonnes d'index des lignes des réplicats : celles du panel long (voir CommunePanel.to_frame)"""
+        labels = self._period_labels(self._dates())
+        periods = len(labels['Annee'])
+        columns = {'Commune': np.repeat(self.communes, periods)}
+        if self.codes is not None:
+            columns['Insee'] = np.repeat(self.codes, periods)
+        columns.update({name: np.tile(values, len(self.communes)) for name, values in labels.items()})
+        return columns
+    
+    def _observation_codes(self):
+        """Codes INSEE des communes du lot"""
+        if self.insee:
+            return self.codes
+        rows = [self.registry.row(commune) for commune in self.communes]
+        return [self.registry.insee[row] if row >= 0 else '' for row in rows]
+    
+    def _observed_values(self, values):
+        """Valeurs observées : une ligne par commune"""
+        return values
+    
+    def _cache_communes(self):
+        """Communes du lot et leurs configurations, pour l'empreinte du cache"""
+        return [[commune, dict(self.registry.config(commune))] for commune in self._keys]
+    
+    def _generate(self, replicate):
+        """Génère le panel long (Commune, Annee[, Periode]) de toutes les communes du lot"""
+        print(f"🏛️ Génération des données financières et immobilières pour "
+              f"{len(self.communes)} communes de Bordeaux Métropole...")
+        return self._panel_frame(self.generate_panel(replicate))
+    
+    def _panel_frame(self, panel):
+        """DataFrame des données générées : le panel long de toutes les communes"""
+        return panel.to_frame()
+    
+    def _anchor(self, values):
+        """Points d'ancrage d'un stock : une valeur par commune"""
+        return None if values is None else np.asarray(values)
+    
+    def _empty_panel(self, labels):
+        """Panel à remplir par la simulation : toutes les communes du lot"""
+        return CommunePanel(self.communes, labels, codes=self.codes)
+
+
+class ResultCube:
+    """Échantillons bruts (communes x réplicats x années x indicateurs) stockés hors mémoire
+    
+    Le cube est un fichier .npy ouvert en memory-map, accompagné d'un fichier
+    .json décrivant ses axes (communes, années, indicateurs), la graine et la
+    taille de bloc utilisées. Il peut être relu et réduit bloc par bloc sans
+    jamais être chargé entièrement en mémoire.
+    """
+    
+    def __init__(self, path, data, metadata):
+        self.path = path
+        self.data = data
+        self.metadata = metadata
+        self.communes = metadata["communes"]
+        self.years = np.array(metadata["annees"])
+        self.indicators = metadata["indicateurs"]
+        # Cubes antérieurs aux séries infra-annuelles : fréquence annuelle
+        self.frequency = metadata.get("frequence", "A")
+    
+    @staticmethod
+    def _paths(path):
+        """Retourne les chemins du tableau et de son fichier de métadonnées"""
+        stem = path[:-4] if path.endswith('.npy') else path
+        return stem + '.npy', stem + '.json'
+    
+    @classmethod
+    def create(cls, path, communes, n_replicates, start_year=2002, end_year=2025,
+               seed=None, chunk_size=1000, dtype='float64', frequency='A'):
+        """Crée un cube vide sur disque et écrit ses métadonnées"""
+        if not isinstance(seed, np.random.SeedSequence):
+            seed = np.random.SeedSequence(seed)
+        array_path, metadata_path = cls._paths(path)
+        periods = FREQUENCIES[frequency]
+        years = [year for year in range(start_year, end_year + 1) for _ in range(periods)]
+        
+        metadata = {
+            "communes": list(communes),
+            "annees": years,
+            "frequence": frequency,
+            "indicateurs": list(INDICATOR_COLUMNS),
+            "replicats": n_replicates,
+            "taille_bloc": chunk_size,
+            "graine": {"entropie": seed.entropy, "spawn_key": list(seed.spawn_key)},
+            "dtype": np.dtype(dtype).name,
+        }
+        os.makedirs(os.path.dirname(os.path.abspath(array_path)), exist_ok=True)
+        data = np.lib.format.open_memmap(
+            array_path, mode='w+', dtype=dtype,
+            shape=(len(communes), n_replicates, len(years), len(INDICATOR_COLUMNS)))
+        with open(metadata_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, ensure_ascii=False, indent=2)
+        return cls(path, data, metadata)
+    
+    @classmethod
+    def open(cls, path, mode='r'):
+        """Ouvre un cube existant en memory-map (lecture seule par défaut)"""
+        array_path, metadata_path = cls._paths(path)
+        with open(metadata_path, encoding='utf-8') as f:
+            metadata = json.load(f)
+        return cls(path, np.load(array_path, mmap_mode=mode), metadata)
+    
+    @property
+    def seed_sequence(self):
+        """Reconstruit la SeedSequence racine de la simulation"""
+        seed = self.metadata["graine"]
+        return np.random.SeedSequence(seed["entropie"], spawn_key=tuple(seed["spawn_key"]))
+    
+    def fill_commune(self, commune, events=None):
+        """Simule les réplicats d'une commune et les écrit directement dans le cube"""
+        index = self.communes.index(commune)
+        analyzer = BordeauxCommuneImmobilierAnalyzer(
+            commune, seed=self.seed_sequence, events=events,
+            start_year=int(self.years[0]), end_year=int(self.years[-1]), frequency=self.frequency)
+        for start, block in analyzer.simulate_replicates(self.metadata["replicats"],
+                                                         self.metadata["taille_bloc"]):
+            self.data[index, start:start + len(block)] = block
+        self.data.flush()
+    
+    def iter_blocks(self, commune, chunk_size=None):
+        """Parcourt les réplicats d'une commune par blocs (réplicats x années x indicateurs)"""
+        index = self.communes.index(commune)
+        chunk_size = chunk_size or self.metadata["taille_bloc"]
+        for start in range(0, self.metadata["replicats"], chunk_size):
+            yield np.asarray(self.data[index, start:start + chunk_size], dtype=np.float64)
+    
+    def summary(self, commune, chunk_size=None, quantiles=(0.05, 0.25, 0.5, 0.75, 0.95), bins=1024):
+        """Calcule moyenne, variance et quantiles approchés d'une commune en lecture par blocs"""
+        labels = {'Annee': self.years}
+        if self.frequency != 'A':
+            periods = FREQUENCIES[self.frequency]
+            labels['Periode'] = np.tile(np.arange(1, periods + 1), len(self.years) // periods)
+        return summarize_blocks(self.iter_blocks(commune, chunk_size), labels,
+                                self.indicators, quantiles=quantiles, bins=bins)
+
+
+def _fill_cube_worker(path, commune, events):
+    """Écrit les réplicats d'une commune dans un cube ouvert en écriture (worker)"""
+    ResultCube.open(path, mode='r+').fill_commune(commune, events=events)
+    return commune
+
+
+def write_result_cube(path, communes, n_replicates, seed=None, chunk_size=1000, max_workers=1,
+                      events=None, start_year=2002, end_year=2025, dtype='float64', frequency='A'):
+    """Simule toutes les communes et écrit leurs échantillons bruts dans un cube sur disque
+    
+    Chaque worker écrit la tranche de sa commune directement dans le
+    memory-map : aucun processus ne garde plus d'un bloc de réplicats en
+    mémoire, et le contenu du cube ne dépend pas du nombre de workers.
+    """
+    cube = ResultCube.create(path, communes, n_replicates, start_year=start_year, end_year=end_year,
+                             seed=seed, chunk_size=chunk_size, dtype=dtype, frequency=frequency)
+    print(f"🧊 Cube de résultats {cube.data.shape} ({cube.data.nbytes / 1e9:.2f} Go): {path}")
+    if max_workers == 1:
+        for commune in communes:
+            cube.fill_commune(commune, events=events)
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_fill_cube_worker, [path] * len(communes), communes,
+                              [events] * len(communes)))
+    return ResultCube.open(path)
+
+
+class DashboardSession:
+    """Rend les tableaux de bord de plusieurs communes en réutilisant une seule figure
+    
+    La première commune construit la figure et ses axes avec les méthodes
+    _plot_* ; les suivantes ne font que remplacer les données des artistes
+    (courbes, barres empilées, annotations), repérés par le nom de leur
+    colonne (gid), puis recalculer les échelles. La mise en page est fixe
+    (DASHBOARD_LAYOUT) : ni tight_layout ni bbox_inches='tight' à chaque
+    image. La figure n'est reconstruite que si les années changent.
+    """
+    
+    def __init__(self, preset='print'):
+        self.dpi = RENDER_PRESETS[preset]["dpi"]
+        self.figure = None
+        self._title = None
+        self._years = None
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+    
+    def render(self, analyzer, df, output_file=None):
+        """Rend le tableau de bord d'une commune et retourne le chemin de l'image"""
+        years = df['Annee'].to_numpy()
+        if self.figure is None or not np.array_equal(years, self._years):
+            with span("construction", commune=analyzer.commune):
+                self._build(analyzer, df)
+        else:
+            with span("mise_a_jour", commune=analyzer.commune):
+                self._update(df)
+        self._title.set_text(f'Analyse des Comptes Communaux et Immobiliers de {analyzer.commune} - '
+                             f'Bordeaux Métropole ({analyzer.start_year}-{analyzer.end_year})')
+        
+        if output_file is None:
+            output_file = f'{analyzer.commune}_bordeaux_analysis.png'
+        with span("savefig", commune=analyzer.commune, dpi=self.dpi):
+            self.figure.savefig(output_file, dpi=self.dpi)
+        return output_file
+    
+    def _build(self, analyzer, df):
+        """Construit la figure et ses dix panneaux"""
+        self.close()
+        plt = _pyplot()
+        with plt.style.context('seaborn-v0_8'):
+            self.figure = plt.figure(figsize=DASHBOARD_FIGSIZE)
+            self.figure.subplots_adjust(**DASHBOARD_LAYOUT)
+            for i, (_, method, _) in enumerate(DASHBOARD_PANELS, 1):
+                getattr(analyzer, method)(df, self.figure.add_subplot(5, 2, i))
+            self._title = self.figure.suptitle('', fontsize=16, fontweight='bold')
+        self._years = df['Annee'].to_numpy()
+    
+    def _update(self, df):
+        """Remplace les données de chaque artiste par celles de la nouvelle commune"""
+        from matplotlib.text import Annotation
+        
+        for ax in self.figure.axes:
+            for line in ax.lines:
+                if line.get_gid() in df:
+                    line.set_ydata(df[line.get_gid()].to_numpy())
+            
+            # Barres : les conteneurs sont empilés dans leur ordre de création ; la base
+            # de chaque barre est aussi une limite « collante » de l'autoscale
+            bottom = np.zeros(len(self._years))
+            for container in ax.containers:
+                column = container.patches[0].get_gid()
+                if column not in df:
+                    continue
+                values = df[column].to_numpy()
+                for patch, base, value in zip(container.patches, bottom, values):
+                    patch.set_y(base)
+                    patch.set_height(value)
+                    patch.sticky_edges.y[:] = [base]
+                bottom = bottom + values
+            
+            for text in ax.texts:
+                if isinstance(text, Annotation) and text.get_gid() in df:
+                    year, old_value = text.xy
+                    value = value_at_year(df, text.get_gid(), year)
+                    text.xyann = (text.xyann[0], value * text.xyann[1] / old_value)
+                    text.xy = (year, value)
+            
+            ax.relim()
+            ax.autoscale_view()
+    
+    def close(self):
+        """Libère la figure (à appeler une fois toutes les communes rendues)"""
+        if self.figure is not None:
+            _pyplot().close(self.figure)
+        self.figure = None
+        self._title = None
+        self._years = None
+
+
+def create_comparison_dashboard(data, indicator, output_file=None, preset='preview', columns=None):
+    """Compare un indicateur entre toutes les communes : petits multiples dans une seule figure
+    
+    Chaque commune a sa case et toutes les cases partagent la même échelle
+    (années en abscisse, valeurs de l'indicateur en ordonnée, graduées sur
+    les cases du bord). L'enveloppe min-max et la médiane de l'ensemble des
+    communes servent de repère dans chaque case. Les cases sont tracées dans
+    un seul axe par quelques collections (fonds, grilles, enveloppes,
+    médianes, séries) plutôt qu'un sous-graphique et un ax.plot par commune :
+    le coût du rendu dépend peu du nombre de communes. `data` est un panel
+    long (infra-annuel : agrégé par année) ou un CommunePanel.
+    """
+    from matplotlib.collections import LineCollection, PolyCollection
+    plt = _pyplot()
+    
+    if not isinstance(data, CommunePanel):
+        data = CommunePanel.from_frame(aggregate_to_annual(data))
+    values = data.indicator(indicator)
+    years = data.labels['Annee']
+    x = years.astype(float)
+    if 'Periode' in data.labels:
+        x = x + (data.labels['Periode'] - 1) / data.labels['Periode'].max()
+    n_communes = len(data.communes)
+    columns = columns or int(np.ceil(np.sqrt(n_communes)))
+    rows = -(-n_communes // columns)
+    gap_x, gap_y = COMPARISON_GAPS
+    
+    with span("comparaison", indicateur=indicator, communes=n_communes):
+        # Échelle partagée : chaque case couvre [0, 1] x [0, 1] en coordonnées normalisées
+        low, high = np.nanmin(values), np.nanmax(values)
+        scale = (high - low) or 1.0
+        x = (x - x[0]) / ((x[-1] - x[0]) or 1.0)
+        y = (values - low) / scale
+        row, column = np.divmod(np.arange(n_communes), columns)
+        origins = np.stack([column * (1 + gap_x), -row * (1 + gap_y)], axis=-1)[:, None, :]
+        
+        envelope_low, median, envelope_high = np.nanpercentile(y, [0, 50, 100], axis=0)
+        envelope = np.concatenate([np.stack([x, envelope_low], -1), np.stack([x, envelope_high], -1)[::-1]])
+        cells = np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=float)
+        grid = np.array([[[0, level], [1, level]] for level in (0, 0.5, 1)])
+        
+        figure = plt.figure(figsize=(columns * COMPARISON_CELL_SIZE[0] + 1, rows * COMPARISON_CELL_SIZE[1] + 1))
+        ax = figure.add_axes([0.06, 0.02, 0.92, 0.93 - 0.15 / rows])
+        ax.set_axis_off()
+        ax.add_collection(PolyCollection(cells[None] + origins, facecolors='#F4F4F4', edgecolors='none'),
+                          autolim=False)
+        ax.add_collection(LineCollection((grid[None] + origins[:, None]).reshape(-1, 2, 2),
+                                         colors='white', linewidths=0.8), autolim=False)
+        ax.add_collection(PolyCollection(envelope[None] + origins, facecolors='#4ECDC4', alpha=0.25,
+                                         edgecolors='none'), autolim=False)
+        ax.add_collection(LineCollection(np.stack([x, median], -1)[None] + origins, colors='#00008B',
+                                         linewidths=0.8, linestyles='--', alpha=0.6), autolim=False)
+        ax.add_collection(LineCollection(np.stack([np.broadcast_to(x, y.shape), y], -1) + origins,
+                                         colors='#8B0000', linewidths=1.6, gid=indicator), autolim=False)
+        
+        # Noms des communes, graduations sur la première colonne et sous la dernière case de chaque colonne
+        for commune, (x0, y0) in zip(data.communes, origins[:, 0]):
+            ax.text(x0, y0 + 1.04, commune, fontsize=9, fontweight='bold', va='bottom')
+        for x0, y0 in origins[column == 0, 0]:
+            for level in (0, 0.5, 1):
+                ax.text(x0 - 0.03, y0 + level, f'{low + level * scale:,.3g}', fontsize=7, ha='right', va='center')
+        for bottom in range(min(columns, n_communes)):
+            x0, y0 = origins[np.flatnonzero(column == bottom)[-1], 0]
+            for position, label in ((0, years[0]), (1, years[-1])):
+                ax.text(x0 + position, y0 - 0.06, str(label), fontsize=7, ha='center', va='top')
+        
+        ax.set_xlim(-0.3, columns * (1 + gap_x) - gap_x + 0.02)
+        ax.set_ylim(-(rows - 1) * (1 + gap_y) - 0.25, 1.25)
+        figure.suptitle(f'{indicator} - Comparaison des communes ({years[0]}-{years[-1]})',
+                        fontsize=14, fontweight='bold')
+    
+    if output_file is None:
+        output_file = f'bordeaux_comparaison_{indicator}.png'
+    with span("savefig", indicateur=indicator, dpi=RENDER_PRESETS[preset]["dpi"]):
+        figure.savefig(output_file, dpi=RENDER_PRESETS[preset]["dpi"])
+    plt.close(figure)
+    return output_file
+
+
+def _init_headless_worker():
+    """Initialise un worker de rendu sur le backend non graphique Agg"""
+    _pyplot().switch_backend('Agg')
+
+
+# Session de rendu propre à chaque processus worker, réutilisée d'une tâche à l'autre
+_worker_session = None
+
+
+def _worker_render(commune, df, output_file, preset):
+    """Rend un tableau de bord avec la session du worker, recréée si la résolution change"""
+    global _worker_session
+    analyzer = BordeauxCommuneImmobilierAnalyzer(commune, start_year=int(df['Annee'].min()),
+                                                 end_year=int(df['Annee'].max()))
+    if _worker_session is None or _worker_session.dpi != RENDER_PRESETS[preset]["dpi"]:
+        if _worker_session is not None:
+            _worker_session.close()
+        _worker_session = DashboardSession(preset)
+    return _worker_session.render(analyzer, df, output_file)
+
+
+def _render_dashboard_worker(commune, df, output_file, preset='print'):
+    """Rend le tableau de bord d'une commune dans un worker et mesure sa durée"""
+    start = time.perf_counter()
+    _worker_render(commune, df, output_file, preset)
+    return {"commune": commune, "fichier": output_file,
+            "duree": time.perf_counter() - start}
+
+
+def _render_png_worker(commune, df, preset='print'):
+    """Rend le tableau de bord d'une commune en mémoire et retourne l'image PNG (worker)"""
+    buffer = io.BytesIO()
+    _worker_render(commune, df, buffer, preset)
+    return buffer.getvalue()
+
+
+def render_dashboards_parallel(frames, output_dir='.', max_workers=None, preset='print'):
+    """Rend les tableaux de bord de plusieurs communes dans un pool de processus
+    
+    `frames` est soit un dictionnaire commune -> DataFrame, soit un panel long
+    contenant une colonne Commune. Chaque worker ne reçoit que les données de
+    sa commune et rend sur le backend Agg, en réutilisant sa figure d'une
+    commune à l'autre (DashboardSession) ; la fonction retourne, dans l'ordre
+    des communes, le fichier produit et la durée de rendu de chacune.
+    """
+    if isinstance(frames, pd.DataFrame):
+        frames = {commune: group.drop(columns='Commune').reset_index(drop=True)
+                  for commune, group in frames.groupby('Commune', sort=False)}
+    
+    os.makedirs(output_dir, exist_ok=True)
+    with ProcessPoolExecutor(max_workers=max_workers, initializer=_init_headless_worker) as executor:
+        futures = [executor.submit(_render_dashboard_worker, commune, df,
+                                   os.path.join(output_dir, f'{commune}_bordeaux_analysis.png'), preset)
+                   for commune, df in frames.items()]
+        return [future.result() for future in futures]
+
+
+# Fin de file : indique aux workers d'une étape qu'il n'y a plus de travail
+_PIPELINE_END = object()
+
+
+class BatchPipeline:
+    """Chaîne génération -> rendu -> écriture, étapes reliées par des files bornées
+    
+    Sans format de données (formats vide), seules les images sont écrites.
+    La génération tourne dans le fil appelant. Le rendu des tableaux de bord
+    est confié à un pool de processus (un fil d'envoi par processus) qui
+    retourne les images PNG en mémoire. L'écriture (données, état, images)
+    est assurée par un pool de fils. Les files ont une taille bornée : une
+    étape plus lente fait attendre les précédentes (contre-pression), ce qui
+    borne la mémoire. L'encodage et l'écriture de la commune N se font ainsi
+    pendant la simulation de la commune N+1 : la durée totale tend vers celle
+    de l'étape la plus lente plutôt que vers leur somme. Les indicateurs de
+    `keep` sont conservés (par année) pour toutes les communes et retournés
+    dans le bilan, sous la clé "donnees" (panel long).
+    """
+    
+    def __init__(self, output_dir='.', formats=('csv',), compact=False, render=True, preset='print',
+                 render_workers=1, write_workers=2, queue_size=4, keep=()):
+        self.output_dir = output_dir
+        self.formats = list(formats)
+        self.compact = compact
+        self.render = render
+        self.preset = preset
+        self.render_workers = max(1, render_workers)
+        self.write_workers = max(1, write_workers)
+        self.queue_size = queue_size
+        self.keep = list(keep)
+        # Temps cumulé passé dans chaque étape (toutes tâches confondues)
+        self.busy = {"generation": 0.0, "rendu": 0.0, "ecriture": 0.0}
+        self._lock = threading.Lock()
+        self._errors = []
+    
+    def _record(self, stage, start):
+        """Ajoute au temps de l'étape la durée écoulée depuis start"""
+        with self._lock:
+            self.busy[stage] += time.perf_counter() - start
+    
+    def _fail(self, error):
+        """Conserve l'erreur d'un worker ; le worker continue de vider sa file pour ne bloquer personne"""
+        with self._lock:
+            self._errors.append(error)
+    
+    def run(self, analyzers):
+        """Traite une suite d'analyseurs (un par commune) et retourne le bilan de l'exécution"""
+        start = time.perf_counter()
+        render_queue = queue.Queue(self.queue_size)
+        write_queue = queue.Queue(self.queue_size)
+        pool = (ProcessPoolExecutor(self.render_workers, initializer=_init_headless_worker)
+                if self.render else None)
+        renderers = [threading.Thread(target=self._render_loop, args=(render_queue, write_queue, pool))
+                     for _ in range(self.render_workers if self.render else 0)]
+        writers = [threading.Thread(target=self._write_loop, args=(write_queue,))
+                   for _ in range(self.write_workers)]
+        for thread in renderers + writers:
+            thread.start()
+        
+        count = 0
+        kept = []
+        try:
+            for analyzer in analyzers:
+                if self._errors:
+                    break
+                generation_start = time.perf_counter()
+                df = analyzer.generate_financial_data()
+                self._record("generation", generation_start)
+                count += 1
+                # put() bloque tant que l'étape suivante n'a pas libéré de place
+                if self.formats:
+                    write_queue.put(("donnees", analyzer, df))
+                if self.render or self.keep:
+                    annual = aggregate_to_annual(df)
+                if self.keep:
+                    kept.append(annual[['Annee'] + self.keep].assign(Commune=analyzer.commune))
+                if self.render:
+                    render_queue.put((analyzer.commune, annual))
+        finally:
+            for thread in renderers:
+                render_queue.put(_PIPELINE_END)
+            for thread in renderers:
+                thread.join()
+            for thread in writers:
+                write_queue.put(_PIPELINE_END)
+            for thread in writers:
+                thread.join()
+            if pool is not None:
+                pool.shutdown()
+        
+        if self._errors:
+            raise self._errors[0]
+        summary = {"communes": count, "duree": time.perf_counter() - start, "etapes": dict(self.busy)}
+        if self.keep:
+            summary["donnees"] = pd.concat(kept, ignore_index=True)
+        return summary
+    
+    def _render_loop(self, render_queue, write_queue, pool):
+        """Fil d'envoi du rendu : une commune à la fois vers le pool de processus"""
+        while True:
+            item = render_queue.get()
+            if item is _PIPELINE_END:
+                return
+            if self._errors:
+                continue
+            commune, df = item
+            try:
+                render_start = time.perf_counter()
+                png = pool.submit(_render_png_worker, commune, df, self.preset).result()
+                self._record("rendu", render_start)
+                write_queue.put(("image", os.path.join(self.output_dir, f'{commune}_bordeaux_analysis.png'), png))
+            except Exception as error:
+                self._fail(error)
+    
+    def _write_loop(self, write_queue):
+        """Fil d'écriture : fichiers de données et leur état, images PNG"""
+        while True:
+            item = write_queue.get()
+            if item is _PIPELINE_END:
+                return
+            if self._errors:
+                continue
+            try:
+                write_start = time.perf_counter()
+                if item[0] == "donnees":
+                    self._write_data(*item[1:])
+                else:
+                    _, output_file, png = item
+                    with open(output_file, 'wb') as f:
+                        f.write(png)
+                    print(f"🖼️ {output_file}")
+                self._record("ecriture", write_start)
+            except Exception as error:
+                self._fail(error)
+    
+    def _write_data(self, analyzer, df):
+        """Écrit les données d'une commune dans chaque format, avec leur fichier d'état"""
+        suffix = '' if analyzer.frequency == 'A' else f'_{analyzer.frequency}'
+        path = os.path.join(self.output_dir, f'{analyzer.commune}_bordeaux_data_'
+                                             f'{analyzer.start_year}_{analyzer.end_year}{suffix}')
+        for fmt in self.formats:
+            with span("export", fichier=os.path.basename(path), format=fmt):
+                output_file = save_financial_data(df, path, fmt=fmt, compact=self.compact)
+            print(f"💾 Données sauvegardées: {output_file}")
+        save_generator_state(analyzer, df, path, self.formats, compact=self.compact)
+
+
+def _monte_carlo_worker(commune, seed_sequence, n_replicates, chunk_size, events,
+                        start_year, end_year, frequency='A'):
+    """Exécute le Monte Carlo d'une commune (fonction exécutable dans un worker)"""
+    analyzer = BordeauxCommuneImmobilierAnalyzer(commune, seed=seed_sequence, events=events,
+                                                 start_year=start_year, end_year=end_year,
+                                                 frequency=frequency)
+    return analyzer.monte_carlo(n_replicates, chunk_size=chunk_size)
+
+
+def run_monte_carlo(communes, n_replicates, seed=None, chunk_size=1000, max_workers=1,
+                    events=None, start_year=2002, end_year=2025, frequency='A'):
+    """Exécute le Monte Carlo de plusieurs communes, au besoin dans un pool de processus
+    
+    Chaque commune tire dans ses propres flux : les résumés obtenus sont les
+    mêmes quel que soit le nombre de workers. Retourne un dictionnaire
+    commune -> MonteCarloSummary.
+    """
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    tasks = [(commune, seed, n_replicates, chunk_size, events, start_year, end_year, frequency)
+             for commune in communes]
+    
+    if max_workers == 1:
+        return {task[0]: _monte_carlo_worker(*task) for task in tasks}
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(_monte_carlo_worker, *task) for task in tasks]
+        return {task[0]: future.result() for task, future in zip(tasks, futures)}
+
+
+# Fichier décrivant un jeu de données national (paramètres et partitions écrites)
+NATIONAL_MANIFEST = "_dataset.json"
+
+
+def _national_partitions(registry, partition='departement', partition_size=500):
+    """Découpe les communes du référentiel en partitions (répertoire, numéro de fichier, codes INSEE)
+    
+    Par département, chaque département est un répertoire departement=XX,
+    découpé en fichiers d'au plus `partition_size` communes ; par lot, les
+    communes sont prises dans l'ordre du référentiel (répertoires lot=NNNNN).
+    """
+    if partition == 'departement':
+        groups = {}
+        for code, departement in zip(registry.insee, registry.departements):
+            groups.setdefault(departement, []).append(code)
+        for departement in sorted(groups):
+            codes = groups[departement]
+            for part, start in enumerate(range(0, len(codes), partition_size)):
+                yield f'departement={departement}', part, codes[start:start + partition_size]
+    elif partition == 'lot':
+        codes = list(registry.insee)
+        for lot, start in enumerate(range(0, len(codes), partition_size)):
+            yield f'lot={lot:05d}', 0, codes[start:start + partition_size]
+    else:
+        raise ValueError(f"Partitionnement inconnu: {partition} (departement ou lot)")
+
+
+def _national_partition_worker(output_dir, directory, part, codes, registry_path, seed, events,
+                               start_year, end_year, frequency, compact):
+    """Génère les communes d'une partition et l'écrit en Parquet (fonction exécutable dans un worker)"""
+    start = time.perf_counter()
+    batch = BordeauxMetropoleBatch(codes, seed=seed, events=events, start_year=start_year,
+                                   end_year=end_year, frequency=frequency,
+                                   registry=commune_registry(registry_path), insee=True)
+    with span("generation", partition=directory, communes=len(codes)):
+        panel = batch._generate(0)
+    os.makedirs(os.path.join(output_dir, directory), exist_ok=True)
+    with span("export", partition=directory, communes=len(codes)):
+        output_file = save_financial_data(panel, os.path.join(output_dir, directory, f'part-{part:05d}'),
+                                          fmt='parquet', compact=compact)
+    return {"fichier": os.path.relpath(output_file, output_dir), "communes": len(codes),
+            "lignes": len(panel), "duree": time.perf_counter() - start}
+
+
+def generate_national_dataset(output_dir, registry_path=None, seed=None, events=None,
+                              start_year=2002, end_year=2025, frequency='A', partition='departement',
+                              partition_size=500, max_workers=None, compact=False):
+    """Génère toutes les communes d'un référentiel national en un jeu Parquet partitionné
+    
+    Chaque partition (un département, ou un lot de communes) est générée et
+    écrite par un worker du pool, sur tous les cœurs par défaut : le panel
+    national n'est jamais assemblé en mémoire, chaque processus ne tient que
+    `partition_size` communes à la fois. Les communes sont identifiées par leur
+    code INSEE (configuration et flux aléatoire) ; le répertoire se relit avec
+    pd.read_parquet(output_dir), colonne de partition comprise. Le manifeste
+    _dataset.json (ignoré par les lecteurs Parquet) décrit la génération et
+    liste les fichiers écrits.
+    """
+    _require_pyarrow('parquet')
+    registry = commune_registry(registry_path)
+    if not isinstance(seed, np.random.SeedSequence):
+        seed = np.random.SeedSequence(seed)
+    os.makedirs(output_dir, exist_ok=True)
+    
+    # Les fichiers d'une génération précédente sont remplacés, pas mélangés aux nouveaux
+    manifest_path = os.path.join(output_dir, NATIONAL_MANIFEST)
+    if os.path.exists(manifest_path):
+        with open(manifest_path, encoding='utf-8') as f:
+            for previous in json.load(f)["fichiers"]:
+                previous_file = os.path.join(output_dir, previous["fichier"])
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(previous_file)
+                # Répertoire de partition devenu vide
+                with contextlib.suppress(OSError):
+                    os.rmdir(os.path.dirname(previous_file))
+    
+    partitions = list(_national_partitions(registry, partition, partition_size))
+    max_workers = max_workers or os.cpu_count()
+    print(f"🇫🇷 {len(registry)} communes en {len(partitions)} partitions ({max_workers} worker(s)): {output_dir}")
+    tasks = [(output_dir, directory, part, codes, registry_path, seed, events,
+              start_year, end_year, frequency, compact) for directory, part, codes in partitions]
+    
+    files = []
+    if max_workers == 1:
+        files = [_national_partition_worker(*task) for task in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            futures = [executor.submit(_national_partition_worker, *task) for task in tasks]
+            for future in futures:
+                files.append(future.result())
+    
+    manifest = {
+        "communes": len(registry),
+        "periode": [start_year, end_year],
+        "frequence": frequency,
+        "partitionnement": partition,
+        "graine": {"entropie": seed.entropy, "spawn_key": list(seed.spawn_key)},
+        "lignes": sum(result["lignes"] for result in files),
+        "fichiers": files,
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=2)
+    return manifest
+
+
+def _render_panel_worker(commune, df, name, dpi):
+    """Rend un panneau du tableau de bord d'une commune et retourne l'image PNG (worker)"""
+    analyzer = BordeauxCommuneImmobilierAnalyzer(commune, start_year=int(df['Annee'].min()),
+                                                 end_year=int(df['Annee'].max()))
+    return analyzer.render_panel(df, name, dpi=dpi)
+
+
+class LRUCache:
+    """Cache mémoire LRU borné en octets, partagé entre fils, qui regroupe les calculs concurrents
+    
+    get_or_compute() ne lance qu'un calcul par clé : les requêtes simultanées
+    pour une clé absente attendent le résultat de la première (coalescence)
+    au lieu de le recalculer. `sizeof` donne la taille d'une valeur en octets.
+    """
+    
+    def __init__(self, max_bytes, sizeof=len):
+        self.max_bytes = max_bytes
+        self.sizeof = sizeof
+        self.counts = {"hit": 0, "miss": 0, "coalesced": 0}
+        self._entries = OrderedDict()
+        self._pending = {}
+        self._bytes = 0
+        self._lock = threading.Lock()
+    
+    def get_or_compute(self, key, compute):
+        """Retourne (valeur, origine) ; origine : 'hit' (en cache), 'coalesced' (calcul partagé) ou 'miss'"""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.counts["hit"] += 1
+                return self._entries[key][0], "hit"
+            future = self._pending.get(key)
+            owner = future is None
+            if owner:
+                future = self._pending[key] = Future()
+            self.counts["miss" if owner else "coalesced"] += 1
+        if not owner:
+            return future.result(), "coalesced"
+        
+        try:
+            value = compute()
+        except BaseException as error:
+            with self._lock:
+                del self._pending[key]
+            future.set_exception(error)
+            raise
+        with self._lock:
+            del self._pending[key]
+            self._store(key, value)
+        future.set_result(value)
+        return value, "miss"
+    
+    def _store(self, key, value):
+        """Ajoute une valeur et évince les moins récemment utilisées au-delà de max_bytes"""
+        size = self.sizeof(value)
+        if size > self.max_bytes:
+            return
+        self._entries[key] = (value, size)
+        self._bytes += size
+        while self._bytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._bytes -= evicted
+    
+    def stats(self):
+        """Nombre d'entrées, octets occupés et compteurs d'accès"""
+        with self._lock:
+            return {"entrees": len(self._entries), "octets": self._bytes, **self.counts}
+
+
+class _HttpError(Exception):
+    """Erreur renvoyée au client avec son code HTTP"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+# Types MIME des réponses du service, par format
+API_CONTENT_TYPES = {
+    'json': 'application/json; charset=utf-8',
+    'csv': 'text/csv; charset=utf-8',
+    'parquet': 'application/vnd.apache.parquet',
+    'png': 'image/png',
+}
+
+
+class BordApiService:
+    """Service HTTP local servant les données, panneaux et tableaux de bord des communes
+    
+    Routes (GET) :
+        /communes                                    référentiel (nom, code INSEE)
+        /communes/<commune>/donnees?format=json|csv|parquet
+        /communes/<commune>/insights
+        /communes/<commune>/panneaux/<panneau>.png?dpi=150
+        /communes/<commune>/tableau_de_bord.png?preset=screen
+        /sante                                       état des caches
+    Les routes des communes acceptent debut, fin et frequence (A, Q, M) ; la
+    commune est désignée par son nom ou son code INSEE.
+    
+    Les données générées et les réponses encodées (JSON, CSV, Parquet, PNG)
+    sont gardées dans deux caches LRU bornés ; les requêtes simultanées pour
+    une même ressource sont regroupées en un seul calcul. Les rendus
+    matplotlib se font dans un pool de processus : un succès de cache ne
+    touche jamais matplotlib. Sans graine, une graine est tirée au démarrage
+    et reste la même pour toutes les requêtes.
+    """
+    
+    def __init__(self, host='127.0.0.1', port=8000, seed=None, events=None, start_year=2002, end_year=2025,
+                 frame_cache_mb=64, response_cache_mb=256, render_workers=None, cache=None, observations=None):
+        self.host = host
+        self.port = port
+        self.seed = seed if isinstance(seed, np.random.SeedSequence) else np.random.SeedSequence(seed)
+        self.events = events
+        self.start_year = start_year
+        self.end_year = end_year
+        self.cache = cache
+        self.observations = observations
+        self.frames = LRUCache(int(frame_cache_mb * 1024 ** 2),
+                               sizeof=lambda df: int(df.memory_usage(deep=True).sum()))
+        self.responses = LRUCache(int(response_cache_mb * 1024 ** 2))
+        self.render_pool = ProcessPoolExecutor(render_workers, initializer=_init_headless_worker)
+        self.server = None
+        self._thread = None
+    
+    @property
+    def url(self):
+        """Adresse de base du service (port effectif si le port 0 a été demandé)"""
+        host, port = self.server.server_address[:2]
+        return f'http://{host}:{port}'
+    
+    def start(self):
+        """Démarre le serveur dans un fil d'arrière-plan et retourne le service"""
+        from http.server import ThreadingHTTPServer
+        self.server = ThreadingHTTPServer((self.host, self.port), _api_handler(self))
+        self.server.daemon_threads = True
+        self._thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+    
+    def close(self):
+        """Arrête le serveur et le pool de rendu"""
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+            self.server = None
+        self.render_pool.shutdown()
+    
+    def __enter__(self):
+        return self.start()
+    
+    def __exit__(self, *exc):
+        self.close()
     
-    # Demander à l'utilisateur de choisir une commune
+    def handle(self, target):
+        """Traite une requête GET : retourne (statut, type MIME, corps, origine de la réponse)"""
+        from urllib.parse import parse_qs, unquote, urlsplit
+        url = urlsplit(target)
+        parts = [unquote(part) for part in url.path.strip('/').split('/') if part]
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            with span("requete", chemin=url.path):
+                return (200,) + self._route(parts, query)
+        except _HttpError as error:
+            status, message = error.status, str(error)
+        except Exception as error:
+            logging.getLogger(__name__).exception("Erreur sur %s", target)
+            status, message = 500, f"{type(error).__name__}: {error}"
+        body = json.dumps({"erreur": message}, ensure_ascii=False).encode('utf-8')
+        return status, API_CONTENT_TYPES['json'], body, "erreur"
+    
+    def _route(self, parts, query):
+        """Aiguille la requête vers la ressource demandée"""
+        if parts == ['sante']:
+            return API_CONTENT_TYPES['json'], self._json({"statut": "ok", "donnees": self.frames.stats(),
+                                                          "reponses": self.responses.stats()}), "direct"
+        if parts == ['communes']:
+            registry = commune_registry()
+            return API_CONTENT_TYPES['json'], self._json([{"nom": name, "insee": code} for name, code
+                                                          in zip(registry.names, registry.insee)]), "direct"
+        if len(parts) < 3 or parts[0] != 'communes':
+            raise _HttpError(404, f"Ressource inconnue: /{'/'.join(parts)}")
+        
+        registry = commune_registry()
+        if parts[1] not in registry:
+            raise _HttpError(404, f"Commune inconnue: {parts[1]}")
+        commune = registry.name(parts[1])
+        period = (self._int(query, 'debut', self.start_year), self._int(query, 'fin', self.end_year),
+                  query.get('frequence', 'A'))
+        if period[2] not in FREQUENCIES or period[0] > period[1]:
+            raise _HttpError(400, "Période ou fréquence invalide")
+        resource = parts[2:]
+        
+        if resource == ['donnees']:
+            fmt = query.get('format', 'json')
+            if fmt not in ('json', 'csv', 'parquet'):
+                raise _HttpError(400, f"Format inconnu: {fmt} (json, csv ou parquet)")
+            body, origin = self.responses.get_or_compute(
+                ('donnees', commune, period, fmt), lambda: self._encode(self._frame(commune, period), fmt))
+            return API_CONTENT_TYPES[fmt], body, origin
+        if resource == ['insights']:
+            body, origin = self.responses.get_or_compute(
+                ('insights', commune, period), lambda: self._insights(commune, period))
+            return API_CONTENT_TYPES['json'], body, origin
+        if resource == ['tableau_de_bord.png']:
+            preset = query.get('preset', 'screen')
+            if preset not in RENDER_PRESETS:
+                raise _HttpError(400, f"Préréglage inconnu: {preset} ({', '.join(RENDER_PRESETS)})")
+            body, origin = self.responses.get_or_compute(
+                ('tableau_de_bord', commune, period, preset),
+                lambda: self._render(_render_png_worker, commune, period, preset))
+            return API_CONTENT_TYPES['png'], body, origin
+        if len(resource) == 2 and resource[0] == 'panneaux' and resource[1].endswith('.png'):
+            name = resource[1][:-4]
+            if name not in {panel for panel, _, _ in DASHBOARD_PANELS}:
+                raise _HttpError(404, f"Panneau inconnu: {name}")
+            dpi = self._int(query, 'dpi', 150)
+            if not 10 <= dpi <= 300:
+                raise _HttpError(400, "dpi doit être compris entre 10 et 300")
+            body, origin = self.responses.get_or_compute(
+                ('panneau', commune, period, name, dpi),
+                lambda: self._render(_render_panel_worker, commune, period, name, dpi))
+            return API_CONTENT_TYPES['png'], body, origin
+        raise _HttpError(404, f"Ressource inconnue: /{'/'.join(parts)}")
+    
+    @staticmethod
+    def _int(query, name, default):
+        """Paramètre entier de la requête"""
+        try:
+            return int(query.get(name, default))
+        except ValueError:
+            raise _HttpError(400, f"Paramètre {name} invalide: {query[name]}") from None
+    
+    @staticmethod
+    def _json(content):
+        return json.dumps(content, ensure_ascii=False).encode('utf-8')
+    
+    def _frame(self, commune, period):
+        """Données d'une commune, générées une seule fois par période (cache LRU des données)"""
+        def generate():
+            start_year, end_year, frequency = period
+            analyzer = BordeauxCommuneImmobilierAnalyzer(commune, seed=self.seed, events=self.events,
+                                                         start_year=start_year, end_year=end_year,
+                                                         cache=self.cache, frequency=frequency,
+                                                         observations=self.observations)
+            return analyzer.generate_financial_data()
+        return self.frames.get_or_compute((commune, period), generate)[0]
+    
+    @staticmethod
+    def _encode(df, fmt):
+        """Encode des données au format demandé"""
+        if fmt == 'json':
+            return df.to_json(orient='records', force_ascii=False).encode('utf-8')
+        if fmt == 'csv':
+            return df.to_csv(index=False).encode('utf-8')
+        try:
+            _require_pyarrow(fmt)
+        except ImportError as error:
+            raise _HttpError(501, str(error)) from None
+        buffer = io.BytesIO()
+        df.to_parquet(buffer, index=False, compression='zstd')
+        return buffer.getvalue()
+    
+    def _insights(self, commune, period):
+        """Insights d'une commune en JSON"""
+        row = compute_insights(self._frame(commune, period), commune).reset_index().iloc[0]
+        return row.to_json(force_ascii=False).encode('utf-8')
+    
+    def _render(self, worker, commune, period, *options):
+        """Rend une image dans le pool de processus, à partir des données annuelles de la commune"""
+        df = aggregate_to_annual(self._frame(commune, period))
+        return self.render_pool.submit(worker, commune, df, *options).result()
+
+
+def _api_handler(service):
+    """Classe de gestionnaire HTTP reliée au service (http.server n'est importé qu'au démarrage)"""
+    from http.server import BaseHTTPRequestHandler
+    
+    class BordApiHandler(BaseHTTPRequestHandler):
+        server_version = "BordApi/1"
+        
+        def do_GET(self):
+            status, content_type, body, origin = service.handle(self.path)
+            self.send_response(status)
+            self.send_header('Content-Type', content_type)
+            self.send_header('Content-Length', str(len(body)))
+            self.send_header('X-Cache', origin)
+            self.end_headers()
+            self.wfile.write(body)
+        
+        def log_message(self, format, *args):
+            logging.getLogger(__name__).info("%s %s", self.address_string(), format % args)
+    
+    return BordApiHandler
+
+
+def _is_headless():
+    """Indique si aucun affichage graphique n'est disponible (cron, conteneur, SSH)"""
+    if sys.platform.startswith('linux'):
+        return not (os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'))
+    return False
+
+
+def _prompt_communes(communes):
+    """Demande interactivement la commune à analyser (0 : toutes les communes)"""
     print("Liste des communes disponibles:")
+    print("0. Toutes les communes (panel métropolitain)")
     for i, commune in enumerate(communes, 1):
         print(f"{i}. {commune}")
     
     try:
         choix = int(input("\nChoisissez le numéro de la commune à analyser: "))
-        if choix < 1 or choix > len(communes):
+        if choix < 0 or choix > len(communes):
             raise ValueError
-        commune_selectionnee = communes[choix-1]
+        if choix == 0:
+            return list(communes)
+        return [communes[choix-1]]
     except (ValueError, IndexError):
         print("Choix invalide. Sélection de Bordeaux par défaut.")
-        commune_selectionnee = "Bordeaux"
+        return ["Bordeaux"]
+
+
+def parse_args(argv=None):
+    """Analyse les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(
+        description="Analyse des comptes communaux et immobiliers - Bordeaux Métropole")
+    selection = parser.add_mutually_exclusive_group()
+    selection.add_argument('-c', '--commune', action='append', dest='communes', metavar='NOM',
+                           help="commune à analyser (option répétable)")
+    selection.add_argument('-a', '--all', action='store_true',
+                           help="analyser toutes les communes de la métropole")
+    selection.add_argument('--append', metavar='FICHIER',
+                           help="prolonger jusqu'à --end-year des données déjà sauvegardées (fichier de données "
+                                "ou .etat.json), sans regénérer l'historique")
+    selection.add_argument('--serve', type=int, metavar='PORT',
+                           help="servir données, panneaux et tableaux de bord en HTTP sur ce port (local)")
+    selection.add_argument('--national', metavar='REPERTOIRE',
+                           help="générer toutes les communes du référentiel en un jeu Parquet partitionné")
+    parser.add_argument('--host', default='127.0.0.1',
+                        help="avec --serve : adresse d'écoute (défaut : 127.0.0.1)")
+    parser.add_argument('--partition', choices=['departement', 'lot'], default='departement',
+                        help="avec --national : partitions par département (défaut) ou par lot de communes")
+    parser.add_argument('--partition-size', type=int, default=500,
+                        help="avec --national : nombre maximal de communes par fichier (défaut : 500)")
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help="répertoire des fichiers produits (défaut : répertoire courant)")
+    parser.add_argument('--outputs', choices=['data', 'plot', 'both'], default='both',
+                        help="sorties à produire : données, graphiques ou les deux (défaut : both)")
+    parser.add_argument('-f', '--format', action='append', dest='formats', choices=list(OUTPUT_FORMATS),
+                        help="format des données (option répétable ; défaut : csv)")
+    parser.add_argument('--compact', action='store_true',
+                        help="types compacts : float32, années et comptages entiers, communes catégorielles")
+    parser.add_argument('--no-show', action='store_true',
+                        help="ne pas afficher les graphiques (backend non graphique)")
+    parser.add_argument('--start-year', type=int, default=2002, help="première année (défaut : 2002)")
+    parser.add_argument('--end-year', type=int, default=2025, help="dernière année (défaut : 2025)")
+    parser.add_argument('--frequency', choices=list(FREQUENCIES), default='A',
+                        help="fréquence des données : annuelle (A, défaut), trimestrielle (Q) ou mensuelle (M)")
+    parser.add_argument('--seed', type=int, default=None, help="graine pour des résultats reproductibles")
+    parser.add_argument('--registry', metavar='FICHIER',
+                        help="référentiel des communes (JSON, TOML ou CSV ; défaut : communes.json)")
+    parser.add_argument('--events', metavar='FICHIER',
+                        help="événements de scénario supplémentaires (JSON ou CSV)")
+    parser.add_argument('--dvf', action='append', metavar='FICHIER',
+                        help="fichier DVF (DGFiP ou Etalab, éventuellement compressé) : prix médian au m² "
+                             "et ventes observés remplacent la simulation des années couvertes (option répétable)")
+    parser.add_argument('-j', '--workers', type=int, default=None,
+                        help="nombre de processus de rendu des tableaux de bord "
+                             "(défaut : 1 ; avec --national : tous les cœurs)")
+    parser.add_argument('--pipeline', action='store_true',
+                        help="plusieurs communes : générer, rendre et écrire en parallèle, commune par commune")
+    parser.add_argument('--queue-size', type=int, default=4,
+                        help="avec --pipeline : taille des files entre les étapes (défaut : 4)")
+    parser.add_argument('-n', '--replicates', type=int, default=0,
+                        help="nombre de réplicats de Monte Carlo par commune (défaut : 0, une trajectoire)")
+    parser.add_argument('--chunk-size', type=int, default=1000,
+                        help="taille des blocs de réplicats traités en mémoire, arrondie au multiple de 256 supérieur, "
+                             "sans effet sur les résultats (défaut : 1000)")
+    parser.add_argument('--cache-dir', metavar='REPERTOIRE',
+                        help="cache disque des données générées (utilisé avec --seed)")
+    parser.add_argument('--cache-max-mb', type=float, default=512,
+                        help="taille maximale du cache en Mo (défaut : 512)")
+    parser.add_argument('--clear-cache', action='store_true',
+                        help="vider le cache avant l'exécution (seul : vider et quitter)")
+    parser.add_argument('--preset', choices=list(RENDER_PRESETS), default='print',
+                        help="résolution des tableaux de bord : preview (50 dpi), screen (100 dpi) "
+                             "ou print (300 dpi, défaut)")
+    parser.add_argument('--compare', action='append', metavar='INDICATEUR', choices=INDICATOR_COLUMNS,
+                        help="figure comparative de toutes les communes pour un indicateur "
+                             "(ex. Prix_m2_Moyen ; option répétable)")
+    parser.add_argument('--panel-cache', metavar='REPERTOIRE',
+                        help="composer les tableaux de bord à partir de tuiles de panneaux en cache")
+    parser.add_argument('--trace', metavar='FICHIER',
+                        help="mesurer chaque étape (durée, CPU, mémoire) en lignes JSON dans FICHIER")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="avec --trace, mesurer aussi le pic mémoire Python de chaque étape (plus lent)")
+    parser.add_argument('--cube', metavar='CHEMIN',
+                        help="conserver les réplicats bruts dans un cube memory-map sur disque")
+    parser.add_argument('--from-cube', metavar='CHEMIN',
+                        help="réanalyser un cube existant sans regénérer les réplicats")
+    
+    args = parser.parse_args(argv)
+    args.formats = args.formats or ['csv']
+    if args.start_year > args.end_year:
+        parser.error("--start-year doit être inférieure ou égale à --end-year")
+    if args.workers is not None and args.workers < 1:
+        parser.error("--workers doit être au moins égal à 1")
+    if args.queue_size < 1:
+        parser.error("--queue-size doit être au moins égal à 1")
+    if args.partition_size < 1:
+        parser.error("--partition-size doit être au moins égal à 1")
+    if not args.national:
+        args.workers = args.workers or 1
+    if args.replicates < 0 or args.chunk_size < 1:
+        parser.error("--replicates doit être positif et --chunk-size au moins égal à 1")
+    if args.dvf:
+        # Les observations DVF ne passent que par les générations déterministes
+        unsupported = [option for option, used in (("--replicates", args.replicates), ("--from-cube", args.from_cube),
+                                                   ("--national", args.national), ("--append", args.append))
+                       if used]
+        if unsupported:
+            parser.error(f"--dvf n'est pas pris en charge avec {', '.join(unsupported)}")
+    if args.compare:
+        # La figure comparative reprend le panel d'une génération déterministe (voir run_comparisons)
+        unsupported = [option for option, used in (("--replicates", args.replicates), ("--from-cube", args.from_cube),
+                                                   ("--national", args.national), ("--append", args.append),
+                                                   ("--serve", args.serve is not None))
+                       if used]
+        if unsupported:
+            parser.error(f"--compare n'est pas pris en charge avec {', '.join(unsupported)}")
+    return args
+
+
+def _frequency_suffix(args):
+    """Suffixe des fichiers de données infra-annuelles (_Q, _M ; rien pour une série annuelle)"""
+    return '' if args.frequency == 'A' else f'_{args.frequency}'
+
+
+def _save_outputs(df, args, name, message):
+    """Sauvegarde un jeu de données dans chacun des formats demandés"""
+    for fmt in args.formats:
+        with span("export", fichier=name, format=fmt):
+            output_file = save_financial_data(df, os.path.join(args.output_dir, name), fmt=fmt,
+                                              compact=args.compact)
+        print(f"{message}: {output_file}")
+
+
+def _create_dashboard(analyzer, df, args, output_file, show=True, insights=True, session=None):
+    """Crée le tableau de bord, recomposé depuis le cache de tuiles si --panel-cache est donné
     
-    # Initialiser l'analyseur
-    analyzer = BordeauxCommuneImmobilierAnalyzer(commune_selectionnee)
+    Une session de rendu (DashboardSession), si fournie, réutilise sa figure
+    d'une commune à l'autre.
+    """
+    if session is not None and not args.panel_cache:
+        output_file = session.render(analyzer, df, output_file)
+        if insights:
+            analyzer._generate_financial_insights(df)
+        return output_file
+    if not args.panel_cache:
+        return analyzer.create_financial_analysis(df, output_file=output_file, show=show,
+                                                  insights=insights, preset=args.preset)
     
-    # Générer les données
+    output_file, rendered = analyzer.create_dashboard_from_tiles(df, PanelCache(args.panel_cache),
+                                                                 output_file=output_file,
+                                                                 dpi=RENDER_PRESETS[args.preset]["dpi"],
+                                                                 show=show)
+    print(f"🧩 {rendered} panneau(x) rendu(s), {len(DASHBOARD_PANELS) - rendered} repris du cache")
+    if insights:
+        analyzer._generate_financial_insights(df)
+    return output_file
+
+
+def run_commune(commune, args, events=None, show=True):
+    """Génère, sauvegarde et représente les données d'une commune"""
+    analyzer = BordeauxCommuneImmobilierAnalyzer(commune, seed=args.seed, events=events,
+                                                 start_year=args.start_year, end_year=args.end_year,
+                                                 cache=args.cache, frequency=args.frequency,
+                                                 observations=args.observations)
     financial_data = analyzer.generate_financial_data()
     
-    # Sauvegarder les données
-    output_file = f'{commune_selectionnee}_bordeaux_data_2002_2025.csv'
-    financial_data.to_csv(output_file, index=False)
-    print(f"💾 Données sauvegardées: {output_file}")
+    if args.outputs in ('data', 'both'):
+        name = f'{commune}_bordeaux_data_{args.start_year}_{args.end_year}{_frequency_suffix(args)}'
+        _save_outputs(financial_data, args, name, "💾 Données sauvegardées")
+        save_generator_state(analyzer, financial_data, os.path.join(args.output_dir, name), args.formats,
+                             compact=args.compact)
     
     # Aperçu des données
     print("\n👀 Aperçu des données:")
-    print(financial_data[['Annee', 'Population', 'Prix_m2_Moyen', 'Transactions_Immobilieres', 'Recettes_Totales']].head())
+    labels = ['Annee', 'Periode'] if 'Periode' in financial_data.columns else ['Annee']
+    print(financial_data[labels + ['Population', 'Prix_m2_Moyen', 'Transactions_Immobilieres', 'Recettes_Totales']].head())
+    
+    if args.outputs in ('plot', 'both'):
+        print("\n📈 Création de l'analyse financière et immobilière...")
+        output_file = os.path.join(args.output_dir, f'{commune}_bordeaux_analysis.png')
+        # Les tableaux de bord sont annuels : une série infra-annuelle y est agrégée par année
+        with span("tableau_de_bord", commune=commune):
+            _create_dashboard(analyzer, aggregate_to_annual(financial_data), args, output_file,
+                              show=show, insights=True)
+    
+    return financial_data
+
+
+def run_metropole_batch(communes, args, events=None, show=True):
+    """Génère le panel de plusieurs communes, le sauvegarde et rend leurs tableaux de bord"""
+    batch = BordeauxMetropoleBatch(communes, seed=args.seed, events=events,
+                                   start_year=args.start_year, end_year=args.end_year,
+                                   cache=args.cache, frequency=args.frequency,
+                                   observations=args.observations)
+    panel = batch.generate_financial_data()
+    
+    if args.outputs in ('data', 'both'):
+        name = f'bordeaux_metropole_data_{args.start_year}_{args.end_year}{_frequency_suffix(args)}'
+        _save_outputs(panel, args, name, "💾 Panel métropolitain sauvegardé")
+        save_generator_state(batch, panel, os.path.join(args.output_dir, name), args.formats,
+                             compact=args.compact)
+    print(f"🏘️ {panel['Commune'].nunique()} communes x {len(panel) // panel['Commune'].nunique()} périodes")
+    
+    # Insights de toutes les communes en un passage, classements compris
+    with span("insights", communes=panel['Commune'].nunique()):
+        insights = compute_insights(panel)
+    print_insight_rankings(insights)
+    if args.outputs in ('data', 'both'):
+        _save_outputs(insights.reset_index(), args,
+                      f'bordeaux_metropole_insights_{args.start_year}_{args.end_year}',
+                      "💾 Insights sauvegardés")
     
-    # Créer l'analyse
-    print("\n📈 Création de l'analyse financière et immobilière...")
-    analyzer.create_financial_analysis(financial_data)
+    if args.outputs in ('plot', 'both'):
+        print("\n📈 Création des tableaux de bord...")
+        annual = aggregate_to_annual(panel)
+        if args.workers > 1:
+            results = render_dashboards_parallel(annual, args.output_dir, max_workers=args.workers,
+                                                 preset=args.preset)
+            for result in results:
+                print(f"🖼️ {result['fichier']} ({result['duree']:.1f} s)")
+        else:
+            # Sans affichage, une seule figure est réutilisée pour toutes les communes
+            with DashboardSession(args.preset) as session:
+                for commune, group in annual.groupby('Commune', sort=False):
+                    analyzer = BordeauxCommuneImmobilierAnalyzer(commune, start_year=args.start_year,
+                                                                 end_year=args.end_year)
+                    output_file = os.path.join(args.output_dir, f'{commune}_bordeaux_analysis.png')
+                    with span("tableau_de_bord", commune=commune):
+                        _create_dashboard(analyzer, group.drop(columns='Commune').reset_index(drop=True),
+                                          args, output_file, show=show, insights=False,
+                                          session=None if show else session)
+                    print(f"🖼️ {output_file}")
+    
+    return panel
+
+
+def run_pipeline(communes, args, events=None):
+    """Traite les communes une à une dans la chaîne génération -> rendu -> écriture (BatchPipeline)"""
+    pipeline = BatchPipeline(args.output_dir, formats=args.formats if args.outputs != 'plot' else (),
+                             compact=args.compact, render=args.outputs in ('plot', 'both'),
+                             preset=args.preset, render_workers=args.workers, queue_size=args.queue_size,
+                             keep=args.compare if args.compare and args.outputs != 'data' else ())
+    analyzers = (BordeauxCommuneImmobilierAnalyzer(commune, seed=args.seed, events=events,
+                                                   start_year=args.start_year, end_year=args.end_year,
+                                                   cache=args.cache, frequency=args.frequency,
+                                                   observations=args.observations)
+                 for commune in communes)
+    summary = pipeline.run(analyzers)
+    stages = ", ".join(f"{stage} {duration:.1f} s" for stage, duration in summary["etapes"].items())
+    print(f"⏩ {summary['communes']} communes en {summary['duree']:.1f} s ({stages})")
+    return summary
+
+
+def run_comparisons(panel, args):
+    """Trace la figure comparative des communes du panel déjà généré, pour chaque indicateur demandé (--compare)"""
+    for indicator in args.compare:
+        output_file = os.path.join(args.output_dir, f'bordeaux_metropole_comparaison_{indicator}.png')
+        create_comparison_dashboard(panel, indicator, output_file, preset=args.preset)
+        print(f"📊 Comparaison {indicator}: {output_file}")
+
+
+def run_monte_carlo_communes(communes, args, events=None, show=True):
+    """Résume chaque commune par Monte Carlo, sauvegarde les bandes et les représente"""
+    if args.from_cube or args.cube:
+        if args.from_cube:
+            cube = ResultCube.open(args.from_cube)
+        else:
+            cube = write_result_cube(args.cube, communes, args.replicates, seed=args.seed,
+                                     chunk_size=args.chunk_size, max_workers=args.workers, events=events,
+                                     start_year=args.start_year, end_year=args.end_year,
+                                     frequency=args.frequency)
+        communes = [commune for commune in communes if commune in cube.communes]
+        summaries = {commune: cube.summary(commune) for commune in communes}
+    else:
+        summaries = run_monte_carlo(communes, args.replicates, seed=args.seed, chunk_size=args.chunk_size,
+                                    max_workers=args.workers, events=events,
+                                    start_year=args.start_year, end_year=args.end_year,
+                                    frequency=args.frequency)
+    
+    for commune, summary in summaries.items():
+        if args.outputs in ('data', 'both'):
+            _save_outputs(summary.to_frame(), args,
+                          f'{commune}_bordeaux_montecarlo_{args.start_year}_{args.end_year}{_frequency_suffix(args)}',
+                          "💾 Bandes de Monte Carlo sauvegardées")
+        
+        if args.outputs in ('plot', 'both'):
+            analyzer = BordeauxCommuneImmobilierAnalyzer(commune, start_year=args.start_year,
+                                                         end_year=args.end_year)
+            output_file = os.path.join(args.output_dir, f'{commune}_bordeaux_analysis.png')
+            # Les quantiles ne s'agrègent pas par année : série infra-annuelle tracée sans bandes
+            annual = args.frequency == 'A'
+            with span("tableau_de_bord", commune=commune):
+                analyzer.create_financial_analysis(aggregate_to_annual(summary.mean), output_file=output_file,
+                                                   show=show, insights=len(communes) == 1,
+                                                   bands=summary if annual else None, preset=args.preset)
+    
+    return summaries
+
+
+def run_national(args, events=None):
+    """Génère le jeu de données national partitionné décrit par les options"""
+    manifest = generate_national_dataset(args.national, registry_path=args.registry, seed=args.seed,
+                                         events=events, start_year=args.start_year,
+                                         end_year=args.end_year, frequency=args.frequency,
+                                         partition=args.partition, partition_size=args.partition_size,
+                                         max_workers=args.workers, compact=args.compact)
+    print(f"💾 {manifest['communes']} communes, {manifest['lignes']} lignes en "
+          f"{len(manifest['fichiers'])} fichiers Parquet: {args.national}")
+    return manifest
+
+
+def _read_observations(args, communes=None):
+    """Prix et ventes observés des fichiers DVF (--dvf), pour les communes données"""
+    if not args.dvf:
+        return None
+    observations = read_dvf(args.dvf, communes)
+    years = observations['Annee']
+    print(f"🏠 DVF: {int(observations['Transactions_Immobilieres'].sum())} ventes de logements, "
+          f"{observations['Insee'].nunique()} communes"
+          + (f", {years.min()}-{years.max()}" if len(years) else ""))
+    return observations
+
+
+def run_server(args):
+    """Sert l'API HTTP jusqu'à l'interruption (Ctrl+C)"""
+    service = BordApiService(args.host, args.serve, seed=args.seed,
+                             events=load_events(args.events) if args.events else None,
+                             start_year=args.start_year, end_year=args.end_year,
+                             render_workers=args.workers, cache=args.cache,
+                             observations=_read_observations(args))
+    service.start()
+    print(f"🌐 Service disponible sur {service.url} (Ctrl+C pour arrêter)")
+    try:
+        service._thread.join()
+    except KeyboardInterrupt:
+        print("\n🛑 Arrêt du service")
+    finally:
+        service.close()
+    return 0
+
+
+def main(argv=None):
+    """Fonction principale pour Bordeaux Métropole"""
+    args = parse_args(argv)
+    
+    # Sans affichage disponible, ne jamais initialiser de backend graphique ; matplotlib
+    # n'est importé qu'au premier rendu (jamais avec --outputs data)
+    show = not args.no_show and not _is_headless()
+    if not show:
+        if 'matplotlib.pyplot' in sys.modules:
+            _pyplot().switch_backend('Agg')
+        else:
+            os.environ['MPLBACKEND'] = 'Agg'
+    
+    print(f"🏛️ ANALYSE DES COMPTES COMMUNAUX ET IMMOBILIERS - BORDEAUX MÉTROPOLE ({args.start_year}-{args.end_year})")
+    print("=" * 70)
+    
+    # Le référentiel choisi passe par l'environnement pour être partagé avec les workers
+    if args.registry:
+        os.environ['BORD_COMMUNES_FILE'] = os.path.abspath(args.registry)
+    
+    args.cache = None
+    if args.cache_dir:
+        args.cache = ResultCache(args.cache_dir, max_bytes=int(args.cache_max_mb * 1024 ** 2))
+        if args.clear_cache:
+            print(f"🧹 Cache vidé: {args.cache.clear()} entrée(s) supprimée(s)")
+            # Sans autre travail demandé, le vidage du cache termine l'exécution
+            if not (args.all or args.communes or args.from_cube or args.national
+                    or args.serve is not None or args.append):
+                return 0
+    elif args.clear_cache:
+        print("❌ --clear-cache nécessite --cache-dir.")
+        return 2
+    
+    if args.serve is not None:
+        return run_server(args)
+    
+    if args.append:
+        append_financial_data(args.append, args.end_year)
+        print(f"\n✅ Données prolongées jusqu'à {args.end_year}!")
+        return 0
+    
+    if args.national:
+        events = load_events(args.events) if args.events else None
+        if args.trace:
+            enable_instrumentation(JsonLinesSink(args.trace), memory=args.trace_memory)
+        try:
+            with span("execution", national=args.national):
+                run_national(args, events=events)
+        finally:
+            if args.trace:
+                disable_instrumentation()
+        print(f"\n✅ Génération nationale terminée! 📊 Période: {args.start_year}-{args.end_year}")
+        return 0
+    
+    if args.from_cube:
+        # Les communes et la période sont celles enregistrées dans le cube
+        cube_metadata = ResultCube.open(args.from_cube).metadata
+        communes = args.communes or cube_metadata["communes"]
+        args.start_year, args.end_year = cube_metadata["annees"][0], cube_metadata["annees"][-1]
+        args.frequency = cube_metadata.get("frequence", "A")
+    elif args.all:
+        communes = metropole_communes()
+    elif args.communes:
+        # Communes désignées par leur nom ou leur code INSEE
+        communes = [commune_registry().name(commune) for commune in args.communes]
+    elif sys.stdin.isatty():
+        communes = _prompt_communes(BORDEAUX_METROPOLE_COMMUNES)
+    else:
+        print("❌ Aucune commune sélectionnée : utilisez --commune NOM ou --all.")
+        return 2
+    
+    events = load_events(args.events) if args.events else None
+    os.makedirs(args.output_dir, exist_ok=True)
+    args.observations = _read_observations(args, communes)
+    
+    if args.trace:
+        enable_instrumentation(JsonLinesSink(args.trace), memory=args.trace_memory)
+    try:
+        with span("execution", communes=len(communes)):
+            panel = None
+            if args.replicates or args.from_cube:
+                run_monte_carlo_communes(communes, args, events=events, show=show)
+            elif args.pipeline:
+                panel = run_pipeline(communes, args, events=events).get("donnees")
+            elif len(communes) == 1:
+                panel = run_commune(communes[0], args, events=events, show=show).assign(Commune=communes[0])
+            else:
+                panel = run_metropole_batch(communes, args, events=events, show=show)
+            # Les figures comparatives reprennent le panel déjà généré (pas de figure avec --outputs data)
+            if args.compare and panel is not None and args.outputs != 'data':
+                run_comparisons(panel, args)
+    finally:
+        if args.trace:
+            disable_instrumentation()
+            print(f"⏱️ Mesures enregistrées: {args.trace}")
     
-    print(f"\n✅ Analyse de {commune_selectionnee} terminée!")
-    print(f"📊 Période: {analyzer.start_year}-{analyzer.end_year}")
+    print(f"\n✅ Analyse de {', '.join(communes) if len(communes) <= 3 else f'{len(communes)} communes'} terminée!")
+    print(f"📊 Période: {args.start_year}-{args.end_year}")
     print("🏠 Données: Démographie, finances, marché immobilier, investissements")
+    return 0
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    sys.exit(main())
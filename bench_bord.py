@@ -0,0 +1,348 @@
+"""Mesures de performance de Bord.py
+
+    python3 bench_bord.py startup --repeat 10 --max-ms 1500
+    python3 bench_bord.py suite -o avant.json
+    python3 bench_bord.py compare avant.json apres.json
+"""
+import argparse
+import contextlib
+import datetime
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+REPO_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dernière année des périodes mesurées (les durées de la matrice remontent à partir d'elle)
+END_YEAR = 2025
+
+# Modules de la pile graphique qu'un processus « données seules » ne doit jamais charger
+PLOTTING_MODULES = ['matplotlib', 'matplotlib.pyplot', 'seaborn']
+
+# Processus court typique : importer l'analyseur, générer une commune, écrire le CSV
+STARTUP_SCRIPT = """
+import json, os, sys, tempfile, time
+start = time.perf_counter()
+import Bord
+imported = time.perf_counter()
+analyzer = Bord.BordeauxCommuneImmobilierAnalyzer('Pessac', seed=1)
+df = analyzer.generate_financial_data()
+with tempfile.TemporaryDirectory() as directory:
+    Bord.save_financial_data(df, os.path.join(directory, 'Pessac'))
+done = time.perf_counter()
+print(json.dumps({"import": imported - start, "donnees": done - imported,
+                  "modules_graphiques": [m for m in %r if m in sys.modules]}))
+"""
+
+
+def measure_startup(repeat=10):
+    """Lance `repeat` processus « données seules » et mesure leurs temps de démarrage"""
+    env = dict(os.environ, PYTHONPATH=REPO_DIR + os.pathsep + os.environ.get('PYTHONPATH', ''))
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        output = subprocess.run([sys.executable, '-c', STARTUP_SCRIPT % PLOTTING_MODULES],
+                                capture_output=True, text=True, check=True, env=env).stdout
+        run = json.loads(output.strip().splitlines()[-1])
+        run["total"] = time.perf_counter() - start
+        runs.append(run)
+
+    return {
+        "repetitions": repeat,
+        "total_median_ms": 1000 * statistics.median(run["total"] for run in runs),
+        "total_min_ms": 1000 * min(run["total"] for run in runs),
+        "import_median_ms": 1000 * statistics.median(run["import"] for run in runs),
+        "donnees_median_ms": 1000 * statistics.median(run["donnees"] for run in runs),
+        "modules_graphiques": sorted({m for run in runs for m in run["modules_graphiques"]}),
+    }
+
+
+def run_startup(args):
+    """Sous-commande startup : affiche les mesures et échoue en cas de régression"""
+    result = measure_startup(args.repeat)
+    print(f"🚀 Démarrage « données seules » ({result['repetitions']} processus)")
+    print(f"   total  : {result['total_median_ms']:.0f} ms (médiane), {result['total_min_ms']:.0f} ms (min)")
+    print(f"   import : {result['import_median_ms']:.0f} ms, génération + CSV : {result['donnees_median_ms']:.0f} ms")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(result, f, indent=2)
+
+    status = 0
+    if result["modules_graphiques"]:
+        print(f"❌ Pile graphique chargée sans rendu : {', '.join(result['modules_graphiques'])}")
+        status = 1
+    if args.max_ms is not None and result["total_median_ms"] > args.max_ms:
+        print(f"❌ Démarrage plus lent que le seuil ({args.max_ms:.0f} ms)")
+        status = 1
+    return status
+
+
+def time_call(function, repeat, setup=None):
+    """Chronomètre `repeat` appels de function(état), l'état étant préparé hors chronomètre par setup"""
+    durations = []
+    for _ in range(repeat):
+        state = setup() if setup is not None else None
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            function(state)
+            durations.append(time.perf_counter() - start)
+    return durations
+
+
+def _result(etape, durations, **cas):
+    """Mesure d'une étape pour un cas de la matrice (les durées sont en secondes)"""
+    return {
+        "cas": "|".join([etape] + [f"{key}={value}" for key, value in cas.items()]),
+        "etape": etape,
+        **cas,
+        "repetitions": len(durations),
+        "median_s": statistics.median(durations),
+        "min_s": min(durations),
+        "max_s": max(durations),
+    }
+
+
+def _metadata():
+    """Contexte de la mesure : révision, versions et machine"""
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_DIR,
+                                  capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        revision = None
+    import numpy as np
+    import pandas as pd
+    import matplotlib
+    return {
+        "revision": revision,
+        "date": datetime.datetime.now().isoformat(timespec='seconds'),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "matplotlib": matplotlib.__version__,
+        "plateforme": platform.platform(),
+        "processeurs": os.cpu_count(),
+    }
+
+
+def bench_data(communes, spans, repeat):
+    """Génération, tendances et export CSV pour chaque nombre de communes et durée de période"""
+    import Bord
+
+    results = []
+    for count in communes:
+        names = Bord.metropole_communes()[:count]
+        for span in spans:
+            cas = dict(communes=count, annees=span)
+            start_year = END_YEAR - span + 1
+
+            if count == 1:
+                make = lambda: Bord.BordeauxCommuneImmobilierAnalyzer(names[0], seed=1, start_year=start_year,
+                                                                       end_year=END_YEAR)
+            else:
+                make = lambda: Bord.BordeauxMetropoleBatch(names, seed=1, start_year=start_year,
+                                                           end_year=END_YEAR)
+            results.append(_result("generation", time_call(
+                lambda analyzer: analyzer.generate_financial_data(), repeat, setup=make), **cas))
+            with contextlib.redirect_stdout(io.StringIO()):
+                panel = make().generate_financial_data()
+
+            # Tendances : appliquées commune par commune, sur des panels copiés hors chronomètre
+            analyzers = [Bord.BordeauxCommuneImmobilierAnalyzer(name, seed=1, start_year=start_year,
+                                                                end_year=END_YEAR) for name in names]
+            frames = [panel[panel['Commune'] == name].drop(columns='Commune') if count > 1 else panel
+                      for name in names]
+            results.append(_result("tendances", time_call(
+                lambda copies: [analyzer._add_bordeaux_trends(copy) for analyzer, copy in zip(analyzers, copies)],
+                repeat, setup=lambda: [Bord.CommunePanel.from_frame(df, name)
+                                       for name, df in zip(names, frames)]), **cas))
+
+            with tempfile.TemporaryDirectory() as directory:
+                results.append(_result("export_csv", time_call(
+                    lambda _: Bord.save_financial_data(panel, os.path.join(directory, 'panel')), repeat), **cas))
+    return results
+
+
+def bench_rendering(spans, presets, repeat):
+    """Chaque méthode _plot_* sur son propre axe, puis savefig du tableau de bord complet"""
+    import Bord
+    plt = Bord._pyplot()
+
+    results = []
+    for span in spans:
+        analyzer = Bord.BordeauxCommuneImmobilierAnalyzer('Bordeaux', seed=1, start_year=END_YEAR - span + 1,
+                                                          end_year=END_YEAR)
+        with contextlib.redirect_stdout(io.StringIO()):
+            df = analyzer.generate_financial_data()
+
+        for name, method, _ in Bord.DASHBOARD_PANELS:
+            figures = []
+
+            def new_axes():
+                figures.append(plt.figure(figsize=Bord.PANEL_FIGSIZE))
+                return figures[-1].add_subplot(1, 1, 1)
+
+            durations = time_call(lambda ax: getattr(analyzer, method)(df, ax), repeat, setup=new_axes)
+            for figure in figures:
+                plt.close(figure)
+            results.append(_result(method, durations, annees=span))
+
+        for preset in presets:
+            with Bord.DashboardSession(preset) as session:
+                session.render(analyzer, df, os.devnull)
+                results.append(_result("savefig", time_call(
+                    lambda buffer: session.figure.savefig(buffer, dpi=session.dpi), repeat,
+                    setup=io.BytesIO), annees=span, preset=preset))
+
+        # Vue comparative de toutes les communes (petits multiples), image comprise
+        batch = Bord.BordeauxMetropoleBatch(seed=1, start_year=END_YEAR - span + 1, end_year=END_YEAR)
+        with contextlib.redirect_stdout(io.StringIO()):
+            panel = batch.generate_financial_data()
+        for preset in presets:
+            results.append(_result("comparaison", time_call(
+                lambda buffer: Bord.create_comparison_dashboard(panel, 'Prix_m2_Moyen', buffer, preset=preset),
+                repeat, setup=io.BytesIO), annees=span, preset=preset, communes=len(batch.communes)))
+    return results
+
+
+def bench_replicates(replicates, repeat):
+    """Monte Carlo d'une commune pour chaque nombre de réplicats"""
+    import Bord
+
+    analyzer = Bord.BordeauxCommuneImmobilierAnalyzer('Bordeaux', seed=1)
+    return [_result("monte_carlo", time_call(lambda _: analyzer.monte_carlo(count), repeat), replicats=count)
+            for count in replicates]
+
+
+def bench_workers(workers, repeat, communes=4, replicates=1000):
+    """Courbe de passage à l'échelle : Monte Carlo et rendu de plusieurs communes selon le nombre de workers"""
+    import Bord
+
+    names = Bord.metropole_communes()[:communes]
+    with contextlib.redirect_stdout(io.StringIO()):
+        panel = Bord.BordeauxMetropoleBatch(names, seed=1).generate_financial_data()
+
+    results = []
+    for count in workers:
+        results.append(_result("monte_carlo_parallele", time_call(
+            lambda _: Bord.run_monte_carlo(names, replicates, seed=1, max_workers=count), repeat),
+            communes=communes, replicats=replicates, workers=count))
+        with tempfile.TemporaryDirectory() as directory:
+            results.append(_result("rendu_parallele", time_call(
+                lambda _: Bord.render_dashboards_parallel(panel, directory, max_workers=count, preset='preview'),
+                repeat), communes=communes, workers=count))
+    return results
+
+
+def run_suite(args):
+    """Sous-commande suite : parcourt la matrice de mesures et enregistre le JSON"""
+    os.environ.setdefault('MPLBACKEND', 'Agg')
+    sys.path.insert(0, REPO_DIR)
+
+    steps = [
+        ("donnees", lambda: bench_data(args.communes, args.years, args.repeat)),
+        ("rendu", lambda: bench_rendering(args.years, args.presets, args.repeat)),
+        ("replicats", lambda: bench_replicates(args.replicates, args.repeat)),
+        ("workers", lambda: bench_workers(args.workers, args.repeat)),
+    ]
+    results = []
+    for label, step in steps:
+        if label in args.skip:
+            continue
+        print(f"⏱️ Mesures : {label}...")
+        for result in step():
+            print(f"   {result['cas']:<60} {1000 * result['median_s']:10.1f} ms")
+            results.append(result)
+
+    report = {"meta": _metadata(), "resultats": results}
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"💾 Mesures enregistrées: {args.output}")
+    return 0
+
+
+def run_compare(args):
+    """Sous-commande compare : rapport médiane après / avant pour chaque cas commun aux deux fichiers"""
+    with open(args.before) as f:
+        before = json.load(f)
+    with open(args.after) as f:
+        after = json.load(f)
+
+    old = {result["cas"]: result for result in before["resultats"]}
+    print(f"📊 {before['meta'].get('revision')} -> {after['meta'].get('revision')}")
+    regressions = 0
+    for result in after["resultats"]:
+        if result["cas"] not in old:
+            continue
+        ratio = result["median_s"] / old[result["cas"]]["median_s"]
+        flag = ""
+        if ratio > 1 + args.threshold:
+            flag = " ⚠️"
+            regressions += 1
+        elif ratio < 1 - args.threshold:
+            flag = " ✅"
+        print(f"   {result['cas']:<60} {1000 * old[result['cas']]['median_s']:10.1f} -> "
+              f"{1000 * result['median_s']:10.1f} ms  x{ratio:.2f}{flag}")
+
+    print(f"{regressions} régression(s) au-delà de {100 * args.threshold:.0f} %")
+    return 1 if regressions and args.fail else 0
+
+
+def _int_list(value):
+    """Liste d'entiers séparés par des virgules (option de la matrice)"""
+    return [int(item) for item in value.split(',')]
+
+
+def parse_args(argv=None):
+    """Analyse les options de la ligne de commande"""
+    parser = argparse.ArgumentParser(description="Mesures de performance de Bord.py")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    startup = commands.add_parser('startup', help="temps de démarrage d'un processus « données seules »")
+    startup.add_argument('--repeat', type=int, default=10, help="nombre de processus lancés (défaut : 10)")
+    startup.add_argument('--max-ms', type=float, default=None,
+                         help="seuil de régression sur la médiane du temps total (ms)")
+    startup.add_argument('-o', '--output', metavar='FICHIER', help="enregistrer les mesures en JSON")
+    startup.set_defaults(run=run_startup)
+
+    suite = commands.add_parser('suite', help="matrice de mesures (génération, tendances, export, rendu)")
+    suite.add_argument('--communes', type=_int_list, default=[1, 5, 20],
+                       help="nombres de communes (défaut : 1,5,20)")
+    suite.add_argument('--years', type=_int_list, default=[10, 24, 50],
+                       help="durées de la période en années (défaut : 10,24,50)")
+    suite.add_argument('--replicates', type=_int_list, default=[100, 1000, 10000],
+                       help="nombres de réplicats de Monte Carlo (défaut : 100,1000,10000)")
+    suite.add_argument('--workers', type=_int_list, default=[1, 2, 4],
+                       help="nombres de workers (défaut : 1,2,4)")
+    suite.add_argument('--presets', type=lambda value: value.split(','), default=['screen', 'print'],
+                       help="préréglages de résolution mesurés pour savefig (défaut : screen,print)")
+    suite.add_argument('--repeat', type=int, default=5, help="répétitions de chaque mesure (défaut : 5)")
+    suite.add_argument('--skip', action='append', default=[],
+                       choices=["donnees", "rendu", "replicats", "workers"], help="étape à ne pas mesurer")
+    suite.add_argument('-o', '--output', metavar='FICHIER', help="enregistrer les mesures en JSON")
+    suite.set_defaults(run=run_suite)
+
+    compare = commands.add_parser('compare', help="comparer deux fichiers de mesures")
+    compare.add_argument('before', help="mesures de référence (JSON)")
+    compare.add_argument('after', help="nouvelles mesures (JSON)")
+    compare.add_argument('--threshold', type=float, default=0.1,
+                         help="écart relatif signalé comme régression ou gain (défaut : 0.1)")
+    compare.add_argument('--fail', action='store_true', help="code de sortie 1 en cas de régression")
+    compare.set_defaults(run=run_compare)
+
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
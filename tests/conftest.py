@@ -0,0 +1,6 @@
+import os
+import sys
+
+# Les tests importent Bord.py depuis la racine du dépôt, sans affichage graphique
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault('MPLBACKEND', 'Agg')
@@ -0,0 +1,75 @@
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+
+import pandas as pd
+import pytest
+
+from Bord import BordApiService, BordeauxCommuneImmobilierAnalyzer, LRUCache
+
+
+@pytest.fixture(scope='module')
+def service():
+    with BordApiService(port=0, seed=42, render_workers=1) as service:
+        yield service
+
+
+def _get(service, path):
+    try:
+        with urllib.request.urlopen(service.url + path) as response:
+            return response.status, response.headers['X-Cache'], response.read()
+    except urllib.error.HTTPError as error:
+        return error.code, error.headers['X-Cache'], error.read()
+
+
+def test_communes_lists_the_registry(service):
+    status, _, body = _get(service, '/communes')
+    assert status == 200
+    assert {"nom": "Pessac", "insee": "33318"} in json.loads(body)
+
+
+def test_data_matches_the_analyzer_and_is_cached(service):
+    status, origin, body = _get(service, '/communes/33318/donnees?format=csv&debut=2010')
+    assert (status, origin) == (200, 'miss')
+    expected = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=42, start_year=2010).generate_financial_data()
+    pd.testing.assert_frame_equal(pd.read_csv(io.BytesIO(body)), expected, rtol=1e-12)
+    assert _get(service, '/communes/Pessac/donnees?format=csv&debut=2010')[1:] == ('hit', body)
+
+
+def test_concurrent_identical_requests_render_once(service):
+    results = []
+    path = '/communes/Talence/panneaux/dette.png?dpi=20'
+    threads = [threading.Thread(target=lambda: results.append(_get(service, path))) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert all(status == 200 for status, _, _ in results)
+    assert sorted(origin for _, origin, _ in results).count('miss') == 1
+    assert len({body for _, _, body in results}) == 1
+    assert results[0][2].startswith(b'\x89PNG')
+
+
+@pytest.mark.parametrize('path, status', [
+    ('/communes/Nulle-Part/insights', 404),
+    ('/communes/Pessac/panneaux/inconnu.png', 404),
+    ('/communes/Pessac/donnees?format=xml', 400),
+    ('/communes/Pessac/donnees?debut=deux', 400),
+    ('/inconnu', 404),
+])
+def test_errors_are_json(service, path, status):
+    code, origin, body = _get(service, path)
+    assert (code, origin) == (status, 'erreur')
+    assert 'erreur' in json.loads(body)
+
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_bytes=10)
+    cache.get_or_compute('a', lambda: b'aaaa')
+    cache.get_or_compute('b', lambda: b'bbbb')
+    assert cache.get_or_compute('a', lambda: b'xxxx') == (b'aaaa', 'hit')
+    cache.get_or_compute('c', lambda: b'cccc')
+    assert cache.get_or_compute('b', lambda: b'BBBB') == (b'BBBB', 'miss')
+    assert cache.stats()['octets'] <= 10
@@ -0,0 +1,65 @@
+import os
+
+import pandas as pd
+import pytest
+
+from Bord import (BordeauxCommuneImmobilierAnalyzer, BordeauxMetropoleBatch, append_financial_data,
+                  save_financial_data, save_generator_state)
+
+
+def _sorted(df):
+    keys = [column for column in ('Commune', 'Annee', 'Periode') if column in df.columns]
+    return df.sort_values(keys, kind='stable', ignore_index=True)
+
+
+def _save(analyzer, directory, formats=('csv',)):
+    df = analyzer.generate_financial_data()
+    stem = os.path.join(directory, f'donnees_{analyzer.start_year}_{analyzer.end_year}')
+    for fmt in formats:
+        save_financial_data(df, stem, fmt=fmt)
+    save_generator_state(analyzer, df, stem, formats)
+    return stem
+
+
+def test_history_does_not_depend_on_end_year():
+    short = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=11, end_year=2020).generate_financial_data()
+    full = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=11, end_year=2025).generate_financial_data()
+    pd.testing.assert_frame_equal(full.iloc[:len(short)], short, check_exact=True)
+
+
+@pytest.mark.parametrize('frequency', ['A', 'Q'])
+def test_extend_by_steps_equals_extend_at_once_equals_fresh_run(frequency):
+    fresh = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=7, frequency=frequency).generate_financial_data()
+    results = []
+    for steps in ([2025], [2021, 2022, 2025]):
+        analyzer = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=7, end_year=2020, frequency=frequency)
+        frames = [analyzer.generate_financial_data()]
+        for end_year in steps:
+            frames.append(analyzer.extend_financial_data(end_year, anchors=analyzer.period_anchors(frames[-1])))
+        results.append(pd.concat(frames, ignore_index=True))
+    pd.testing.assert_frame_equal(results[0], results[1])
+    pd.testing.assert_frame_equal(results[0], fresh, rtol=1e-12)
+
+
+def test_append_keeps_history_and_matches_fresh_run(tmp_path):
+    batch = BordeauxMetropoleBatch(['Pessac', 'Talence'], seed=7, end_year=2020)
+    stem = _save(batch, str(tmp_path), formats=('csv', 'parquet'))
+    with open(stem + '.csv', 'rb') as f:
+        history = f.read()
+    
+    append_financial_data(stem + '.csv', 2023)
+    new_stem = os.path.join(str(tmp_path), 'donnees_2002_2023')
+    with open(new_stem + '.csv', 'rb') as f:
+        assert f.read().startswith(history)
+    assert not os.path.exists(stem + '.csv')
+    
+    fresh = BordeauxMetropoleBatch(['Pessac', 'Talence'], seed=7, end_year=2023).generate_financial_data()
+    for extension in ('.csv', '.parquet'):
+        data = pd.read_csv(new_stem + extension) if extension == '.csv' else pd.read_parquet(new_stem + extension)
+        pd.testing.assert_frame_equal(_sorted(data), _sorted(fresh), rtol=1e-12)
+
+
+def test_append_rejects_past_end_year(tmp_path):
+    stem = _save(BordeauxCommuneImmobilierAnalyzer('Pessac', seed=7, end_year=2020), str(tmp_path))
+    with pytest.raises(ValueError):
+        append_financial_data(stem + '.csv', 2020)
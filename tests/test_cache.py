@@ -0,0 +1,61 @@
+import os
+
+import pandas as pd
+import pytest
+
+import Bord
+from Bord import BordeauxCommuneImmobilierAnalyzer, ResultCache, main
+
+
+def _analyzer(cache, **options):
+    return BordeauxCommuneImmobilierAnalyzer('Pessac', seed=5, cache=cache, **options)
+
+
+def _entries(directory):
+    return sorted(name for name in os.listdir(directory) if name.endswith('.pkl'))
+
+
+def test_second_run_is_read_from_cache(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    first = _analyzer(cache).generate_financial_data()
+    monkeypatch.setattr(BordeauxCommuneImmobilierAnalyzer, '_generate',
+                        lambda self, replicate: pytest.fail('génération au lieu du cache'))
+    pd.testing.assert_frame_equal(_analyzer(cache).generate_financial_data(), first)
+    assert len(_entries(tmp_path)) == 1
+
+
+def test_changed_inputs_miss_the_stale_entry(tmp_path, monkeypatch):
+    cache = ResultCache(str(tmp_path))
+    key = _analyzer(cache).cache_key()
+    cache.put(key, pd.DataFrame({'Annee': [2002]}))
+    assert _analyzer(cache, end_year=2020).cache_key() != key
+    event = {"evenement": "Test", "annee_debut": 2010, "annee_fin": 2010,
+             "colonne": "Investissement_Transport", "multiplicateur": 1.5, "communes": None}
+    assert _analyzer(cache, events=[event]).cache_key() != key
+    # Une entrée écrite par une autre version du modèle n'est plus relue
+    monkeypatch.setattr(Bord, 'MODEL_VERSION', Bord.MODEL_VERSION + 1)
+    assert _analyzer(cache).cache_key() != key
+    assert len(_analyzer(cache).generate_financial_data()) == 2025 - 2002 + 1
+    assert len(_entries(tmp_path)) == 2
+
+
+def test_corrupt_entry_is_a_miss_and_removed(tmp_path):
+    cache = ResultCache(str(tmp_path))
+    expected = _analyzer(cache).generate_financial_data()
+    key = _analyzer(cache).cache_key()
+    with open(cache._path(key), 'r+b') as handle:
+        handle.truncate(10)
+    assert cache.get(key) is None
+    assert not os.path.exists(cache._path(key))
+    pd.testing.assert_frame_equal(_analyzer(cache).generate_financial_data(), expected)
+
+
+def test_clear_cache_still_runs_requested_work(tmp_path):
+    cache_dir = tmp_path / 'cache'
+    ResultCache(str(cache_dir)).put('ancienne', pd.DataFrame({'a': [1]}))
+    output = tmp_path / 'national'
+    status = main(['--cache-dir', str(cache_dir), '--clear-cache', '--national', str(output),
+                   '--start-year', '2020', '--end-year', '2021', '--no-show'])
+    assert status == 0
+    assert output.exists()
+    assert _entries(cache_dir) == []
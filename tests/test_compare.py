@@ -0,0 +1,19 @@
+import pytest
+
+from Bord import main, parse_args
+
+
+@pytest.mark.parametrize('options', [['--replicates', '10'], ['--from-cube', 'cube'], ['--national', 'sortie'],
+                                     ['--append', 'donnees.csv'], ['--serve', '0']])
+def test_compare_is_rejected_where_no_panel_is_generated(options, capsys):
+    with pytest.raises(SystemExit):
+        parse_args(['--compare', 'Prix_m2_Moyen'] + options)
+    assert "--compare n'est pas pris en charge" in capsys.readouterr().err
+
+
+def test_compare_draws_one_figure_per_indicator(tmp_path):
+    main(['--commune', 'Pessac', '--commune', 'Talence', '--seed', '1', '--outputs', 'plot', '--no-show',
+          '--preset', 'preview', '--output-dir', str(tmp_path),
+          '--compare', 'Prix_m2_Moyen', '--compare', 'Dette_Totale'])
+    for indicator in ('Prix_m2_Moyen', 'Dette_Totale'):
+        assert (tmp_path / f'bordeaux_metropole_comparaison_{indicator}.png').exists()
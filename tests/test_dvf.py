@@ -0,0 +1,76 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import BordeauxCommuneImmobilierAnalyzer, DvfAccumulator, read_dvf
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'fixtures')
+DVF_FILES = [os.path.join(FIXTURES, name) for name in ('dvf_etalab.csv', 'dvf_dgfip.txt')]
+
+
+def _table(path, **options):
+    return read_dvf(path, **options).set_index(['Insee', 'Annee'])
+
+
+@pytest.mark.parametrize('path', DVF_FILES)
+def test_read_dvf_keeps_single_dwelling_sales(path):
+    table = _table(path)
+    # Paris est hors métropole ; l'échange, la vente de deux appartements et
+    # celle d'un appartement avec un local commercial sont écartés
+    assert sorted(table.index) == [('33318', 2023), ('33522', 2022), ('33522', 2023)]
+    assert table.loc[('33318', 2023), 'Transactions_Immobilieres'] == 2
+    assert table.loc[('33522', 2023), 'Transactions_Immobilieres'] == 1
+    assert table.loc[('33318', 2023), 'Commune'] == 'Pessac'
+
+
+@pytest.mark.parametrize('path', DVF_FILES)
+def test_read_dvf_medians_are_exact_for_few_sales(path):
+    table = _table(path)
+    # Deux ventes à 5000 et 4000 €/m² : moyenne des deux valeurs centrales
+    assert table.loc[('33318', 2023), 'Prix_m2_Moyen'] == 4500
+    assert table.loc[('33522', 2023), 'Prix_m2_Moyen'] == 4500
+    assert table.loc[('33522', 2022), 'Prix_m2_Moyen'] == 4000
+
+
+@pytest.mark.parametrize('path', DVF_FILES)
+def test_read_dvf_does_not_depend_on_chunk_size(path):
+    # Avec des blocs de deux lignes, la maison (trois lignes) est coupée entre deux blocs
+    pd.testing.assert_frame_equal(_table(path, chunksize=2), _table(path))
+
+
+def test_dvf_layouts_give_the_same_table():
+    etalab, dgfip = (_table(path) for path in DVF_FILES)
+    pd.testing.assert_frame_equal(etalab, dgfip)
+
+
+def test_unknown_dvf_header_is_rejected(tmp_path):
+    path = tmp_path / 'ventes.csv'
+    path.write_text("a,b\n1,2\n")
+    with pytest.raises(ValueError, match="en-tête DVF"):
+        read_dvf(path)
+
+
+def test_histogram_median_is_within_one_bin():
+    prices = np.random.default_rng(0).lognormal(np.log(4500), 0.3, 5001)
+    accumulator = DvfAccumulator(['33318'], exact_sales=100)
+    for chunk in np.array_split(prices, 7):
+        accumulator.add(['33318'] * len(chunk), [2023] * len(chunk), chunk)
+    row = accumulator.table().iloc[0]
+    assert row['Transactions_Immobilieres'] == len(prices)
+    assert abs(row['Prix_m2_Moyen'] - np.median(prices)) < accumulator.bin_width
+
+
+def test_observations_replace_simulated_years_only():
+    observations = read_dvf(DVF_FILES[0])
+    simulated = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=1).generate_financial_data()
+    observed = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=1,
+                                                 observations=observations).generate_financial_data()
+    row = observed.set_index('Annee').loc[2023]
+    assert row['Prix_m2_Moyen'] == 4500
+    assert row['Transactions_Immobilieres'] == 2
+    unchanged = observed['Annee'] != 2023
+    pd.testing.assert_frame_equal(observed[unchanged], simulated[unchanged])
+    others = [column for column in observed.columns if column not in ('Prix_m2_Moyen', 'Transactions_Immobilieres')]
+    pd.testing.assert_frame_equal(observed[others], simulated[others])
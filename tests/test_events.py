@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+
+from Bord import INDICATOR_COLUMNS, BordeauxCommuneImmobilierAnalyzer
+
+
+def _legacy_trends(df):
+    """Boucle d'origine (iterrows/.loc) que remplace le calendrier d'événements"""
+    for i, row in df.iterrows():
+        year = row['Annee']
+        if year in [2003, 2004]:
+            df.loc[i, 'Investissement_Transport'] *= 2.5
+        if year in [2007, 2008]:
+            df.loc[i, 'Investissement_Transport'] *= 2.0
+        if year in [2014, 2015]:
+            df.loc[i, 'Investissement_Transport'] *= 1.8
+        if 2010 <= year <= 2019:
+            df.loc[i, 'Prix_m2_Moyen'] *= 1.05
+            df.loc[i, 'Transactions_Immobilieres'] *= 1.08
+            df.loc[i, 'Investissement_Immobilier'] *= 1.3
+        if year == 2016:
+            df.loc[i, 'Investissement_Tourisme'] *= 2.0
+            df.loc[i, 'Investissement_Culture'] *= 1.8
+        if 2020 <= year <= 2021:
+            if year == 2020:
+                df.loc[i, 'Transactions_Immobilieres'] *= 0.80
+            else:
+                df.loc[i, 'Prix_m2_Moyen'] *= 1.03
+                df.loc[i, 'Transactions_Immobilieres'] *= 1.10
+        if year >= 2022:
+            df.loc[i, 'Investissement_Transport'] *= 1.15
+            df.loc[i, 'Investissement_Immobilier'] *= 1.20
+            df.loc[i, 'Nouveaux_Logements'] *= 1.25
+    return df
+
+
+def test_event_masks_equal_legacy_loop():
+    years = np.arange(2002, 2026)
+    expected = _legacy_trends(pd.DataFrame(1.0, index=range(len(years)), columns=INDICATOR_COLUMNS)
+                              .assign(Annee=years))
+    multipliers = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=1)._event_multipliers(years)
+    for column in INDICATOR_COLUMNS:
+        np.testing.assert_allclose(np.broadcast_to(multipliers.get(column, 1.0), len(years)),
+                                   expected[column].to_numpy(), rtol=1e-12, err_msg=column)
+
+
+def test_commune_filtered_event_only_touches_its_communes():
+    event = {"evenement": "Test", "annee_debut": 2010, "annee_fin": 2011,
+             "colonne": "Nouveaux_Logements", "multiplicateur": 3.0, "communes": ["Talence"]}
+    years = np.arange(2008, 2014)
+    talence = BordeauxCommuneImmobilierAnalyzer('Talence', seed=1, events=[event])._event_multipliers(years)
+    pessac = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=1, events=[event])._event_multipliers(years)
+    np.testing.assert_allclose(talence['Nouveaux_Logements'] / pessac['Nouveaux_Logements'],
+                               [1, 1, 3, 3, 1, 1])
@@ -0,0 +1,33 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import (OUTPUT_FORMATS, BordeauxMetropoleBatch, compact_dtypes, load_financial_data,
+                  save_financial_data)
+
+
+@pytest.fixture(scope='module')
+def panel():
+    return BordeauxMetropoleBatch(['Pessac', 'Talence'], seed=9, frequency='Q').generate_financial_data()
+
+
+def _numeric(df):
+    return df.assign(Commune=df['Commune'].astype(str))
+
+
+@pytest.mark.parametrize('fmt', list(OUTPUT_FORMATS))
+def test_round_trip_keeps_values(panel, tmp_path, fmt):
+    path = save_financial_data(panel, str(tmp_path / 'donnees'), fmt=fmt)
+    assert path.endswith(OUTPUT_FORMATS[fmt])
+    loaded = load_financial_data(path)
+    pd.testing.assert_frame_equal(_numeric(loaded), panel, check_dtype=False, rtol=1e-12)
+
+
+@pytest.mark.parametrize('fmt', list(OUTPUT_FORMATS))
+def test_compact_round_trip_keeps_compact_values(panel, tmp_path, fmt):
+    compact = compact_dtypes(panel)
+    assert compact['Prix_m2_Moyen'].dtype == np.float32
+    assert compact['Transactions_Immobilieres'].dtype == np.int32
+    loaded = load_financial_data(save_financial_data(panel, str(tmp_path / 'donnees'), fmt=fmt, compact=True))
+    pd.testing.assert_frame_equal(_numeric(loaded), _numeric(compact), check_dtype=False,
+                                  check_categorical=False, rtol=1e-6)
@@ -0,0 +1,12 @@
+import pytest
+
+from Bord import BordeauxCommuneImmobilierAnalyzer
+
+
+@pytest.mark.parametrize('commune', ['Bordeaux', 'Pessac'])
+def test_market_indicators_stay_positive_over_long_range(commune):
+    df = BordeauxCommuneImmobilierAnalyzer(commune, seed=3, start_year=1990, end_year=2060,
+                                           frequency='M').generate_financial_data()
+    assert len(df) == (2060 - 1990 + 1) * 12
+    for column in ['Prix_m2_Moyen', 'Transactions_Immobilieres']:
+        assert (df[column] > 0).all(), column
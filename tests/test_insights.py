@@ -0,0 +1,47 @@
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import (BordeauxCommuneImmobilierAnalyzer, BordeauxMetropoleBatch, compute_insights,
+                  load_financial_data, main, metropole_communes)
+
+
+def test_all_compact_writes_data_and_insights(tmp_path):
+    for fmt in ('csv', 'parquet'):
+        output_dir = tmp_path / fmt
+        assert main(['--all', '--compact', '--format', fmt, '--outputs', 'data', '--seed', '1',
+                     '--start-year', '2015', '--end-year', '2021', '--output-dir', str(output_dir)]) == 0
+        insights, = glob.glob(os.path.join(output_dir, 'bordeaux_metropole_insights_*'))
+        table = load_financial_data(insights)
+        communes = len(metropole_communes())
+        assert len(table) == communes
+        assert pd.api.types.is_integer_dtype(table['Rang_Prix_m2_Actuel'])
+        assert sorted(table['Rang_Prix_m2_Actuel']) == list(range(1, communes + 1))
+
+
+def test_ranks_without_covid_year_are_zero():
+    panel = pd.DataFrame({'Commune': ['A', 'A', 'B', 'B'], 'Annee': [2022, 2023] * 2,
+                          **{column: [1.0, 2.0, 1.0, 3.0] for column in (
+                              'Population', 'Recettes_Totales', 'Depenses_Totales', 'Impots_Locaux',
+                              'Dotations_Etat', 'Taxe_Fonciere', 'Prix_m2_Moyen', 'Transactions_Immobilieres')}})
+    table = compute_insights(panel)
+    assert list(table['Rang_Prix_m2_Actuel']) == [2, 1]
+    assert list(table['Rang_Impact_COVID_Pct']) == [0, 0]
+
+
+def test_panel_insights_match_per_commune_insights():
+    communes = ['Bordeaux', 'Pessac', 'Talence', 'Bègles']
+    table = compute_insights(BordeauxMetropoleBatch(communes, seed=4, frequency='Q').generate_financial_data())
+    assert list(table.index) == communes
+    for commune in communes:
+        df = BordeauxCommuneImmobilierAnalyzer(commune, seed=4).generate_financial_data()
+        single = compute_insights(df, commune).loc[commune]
+        row = table.loc[commune]
+        values = [column for column in table.columns if not column.startswith('Rang_')]
+        pd.testing.assert_series_equal(row[values], single[values], check_names=False)
+        assert row['Prix_m2_Actuel'] == df['Prix_m2_Moyen'].iloc[-1]
+        assert row['Recettes_Moyennes'] == pytest.approx(df['Recettes_Totales'].mean(), rel=1e-12)
+    assert table['Rang_Prix_m2_Actuel'].loc[table['Prix_m2_Actuel'].idxmax()] == 1
@@ -0,0 +1,61 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import (MONTE_CARLO_BLOCK, BordeauxCommuneImmobilierAnalyzer, BordeauxMetropoleBatch,
+                  StreamingQuantiles, run_monte_carlo)
+
+COMMUNES = ['Bordeaux', 'Pessac', 'Talence']
+
+
+def test_monte_carlo_does_not_depend_on_chunk_size():
+    analyzer = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=3)
+    samples = [np.concatenate([block for _, block in analyzer.simulate_replicates(600, chunk_size)])
+               for chunk_size in (50, 300, 1000)]
+    assert samples[0].shape == (600, 24, 26)
+    np.testing.assert_array_equal(samples[0], samples[1])
+    np.testing.assert_array_equal(samples[0], samples[2])
+
+
+def test_chunks_are_whole_monte_carlo_blocks():
+    analyzer = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=3)
+    starts = [(start, len(block)) for start, block in analyzer.simulate_replicates(600, 300)]
+    assert starts == [(0, 2 * MONTE_CARLO_BLOCK), (2 * MONTE_CARLO_BLOCK, 600 - 2 * MONTE_CARLO_BLOCK)]
+
+
+def test_batch_replicates_equal_per_commune_replicates():
+    batch = BordeauxMetropoleBatch(COMMUNES, seed=3)
+    blocks = np.concatenate([block for _, block in batch.simulate_replicates(100, 40)])
+    for position, commune in enumerate(COMMUNES):
+        analyzer = BordeauxCommuneImmobilierAnalyzer(commune, seed=3)
+        single = np.concatenate([block for _, block in analyzer.simulate_replicates(100, 100)])
+        np.testing.assert_array_equal(blocks[:, position * 24:(position + 1) * 24], single)
+    summary = batch.monte_carlo(100, chunk_size=40)
+    assert list(summary.mean['Commune'].unique()) == COMMUNES
+
+
+def test_monte_carlo_serial_equals_parallel():
+    serial = run_monte_carlo(COMMUNES[:2], 64, seed=5, chunk_size=30, max_workers=1)
+    parallel = run_monte_carlo(COMMUNES[:2], 64, seed=5, chunk_size=30, max_workers=2)
+    for commune in COMMUNES[:2]:
+        pd.testing.assert_frame_equal(serial[commune].to_frame(), parallel[commune].to_frame(), check_exact=True)
+
+
+def test_unknown_event_column_is_rejected_for_replicates():
+    event = {"evenement": "Test", "annee_debut": 2010, "annee_fin": 2010,
+             "colonne": "Colonne_Inexistante", "multiplicateur": 1.5, "communes": None}
+    analyzer = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=3, events=[event])
+    with pytest.raises(ValueError, match="Colonne_Inexistante"):
+        analyzer.generate_financial_data()
+    with pytest.raises(ValueError, match="Colonne_Inexistante"):
+        next(analyzer.simulate_replicates(10))
+
+
+def test_quantile_sketch_fits_its_memory_budget():
+    rng = np.random.default_rng(0)
+    block = rng.normal(size=(2000, 500, 4))
+    sketch = StreamingQuantiles(bins=1024, max_bytes=500 * 4 * 100 * 8)
+    sketch.update(block[:1000])
+    sketch.update(block[1000:])
+    assert sketch.counts.shape == (2000, 100)
+    np.testing.assert_allclose(sketch.quantile(0.5), np.median(block, axis=0), atol=0.15)
@@ -0,0 +1,37 @@
+import os
+
+import pytest
+
+from Bord import DASHBOARD_PANELS, RENDER_PRESETS, BordeauxCommuneImmobilierAnalyzer, PanelCache, main
+
+
+@pytest.fixture(scope='module')
+def analyzer():
+    return BordeauxCommuneImmobilierAnalyzer('Pessac', seed=2)
+
+
+def test_cached_tiles_are_reused(analyzer, tmp_path):
+    df = analyzer.generate_financial_data()
+    cache = PanelCache(str(tmp_path / 'tuiles'))
+    first, rendered = analyzer.create_dashboard_from_tiles(df, cache, output_file=str(tmp_path / 'a.png'), dpi=40)
+    assert rendered == len(DASHBOARD_PANELS)
+    _, rendered = analyzer.create_dashboard_from_tiles(df, cache, output_file=str(tmp_path / 'b.png'), dpi=40)
+    assert rendered == 0
+    with open(first, 'rb') as a, open(tmp_path / 'b.png', 'rb') as b:
+        assert a.read() == b.read()
+    
+    # Seuls les panneaux qui lisent la colonne modifiée sont rendus à nouveau
+    changed = df.assign(Prix_m2_Moyen=df['Prix_m2_Moyen'] * 1.1)
+    _, rendered = analyzer.create_dashboard_from_tiles(changed, cache, output_file=str(tmp_path / 'c.png'), dpi=40)
+    readers = sum('Prix_m2_Moyen' in columns for _, _, columns in DASHBOARD_PANELS)
+    assert 0 < rendered == readers < len(DASHBOARD_PANELS)
+
+
+def test_panel_cache_follows_render_preset(tmp_path):
+    tiles = tmp_path / 'tuiles'
+    main(['--commune', 'Pessac', '--seed', '2', '--panel-cache', str(tiles), '--preset', 'preview',
+          '--outputs', 'plot', '--output-dir', str(tmp_path), '--no-show'])
+    assert len(os.listdir(tiles)) == len(DASHBOARD_PANELS)
+    key = PanelCache.key(DASHBOARD_PANELS[0][0], BordeauxCommuneImmobilierAnalyzer('Pessac', seed=2)
+                         .generate_financial_data(), DASHBOARD_PANELS[0][2], RENDER_PRESETS['preview']['dpi'])
+    assert os.path.exists(tiles / f'{key}.png')
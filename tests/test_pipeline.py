@@ -0,0 +1,49 @@
+import os
+
+import pandas as pd
+
+from Bord import (BatchPipeline, BordeauxCommuneImmobilierAnalyzer, aggregate_to_annual,
+                  save_financial_data, save_generator_state)
+
+COMMUNES = ['Bordeaux', 'Pessac', 'Talence']
+FORMATS = ('csv', 'parquet')
+
+
+def _analyzers():
+    return (BordeauxCommuneImmobilierAnalyzer(commune, seed=6, frequency='Q') for commune in COMMUNES)
+
+
+def _files(directory):
+    contents = {}
+    for name in sorted(os.listdir(directory)):
+        with open(os.path.join(directory, name), 'rb') as f:
+            contents[name] = f.read()
+    return contents
+
+
+def test_pipeline_output_equals_sequential_output(tmp_path):
+    sequential = tmp_path / 'sequentiel'
+    sequential.mkdir()
+    for analyzer in _analyzers():
+        df = analyzer.generate_financial_data()
+        path = str(sequential / f'{analyzer.commune}_bordeaux_data_2002_2025_Q')
+        for fmt in FORMATS:
+            save_financial_data(df, path, fmt=fmt, compact=True)
+        save_generator_state(analyzer, df, path, FORMATS, compact=True)
+    
+    pipelined = tmp_path / 'pipeline'
+    pipelined.mkdir()
+    summary = BatchPipeline(str(pipelined), formats=FORMATS, compact=True, render=False, queue_size=1,
+                            keep=['Prix_m2_Moyen']).run(_analyzers())
+    
+    assert summary["communes"] == len(COMMUNES)
+    assert _files(pipelined) == _files(sequential)
+    expected = pd.concat([aggregate_to_annual(analyzer.generate_financial_data())[['Annee', 'Prix_m2_Moyen']]
+                          .assign(Commune=analyzer.commune) for analyzer in _analyzers()], ignore_index=True)
+    pd.testing.assert_frame_equal(summary["donnees"], expected)
+
+
+def test_pipeline_renders_one_dashboard_per_commune(tmp_path):
+    summary = BatchPipeline(str(tmp_path), formats=(), render=True, preset='preview').run(_analyzers())
+    assert summary["communes"] == len(COMMUNES)
+    assert sorted(os.listdir(tmp_path)) == sorted(f'{commune}_bordeaux_analysis.png' for commune in COMMUNES)
@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import CommuneRegistry, commune_registry
+
+
+@pytest.fixture(scope='module')
+def registry():
+    return commune_registry()
+
+
+def test_lookup_by_insee_code_and_by_name(registry):
+    assert registry.row('33318') == registry.row('Pessac') >= 0
+    assert registry.name('33318') == 'Pessac'
+    assert registry.config('33318') is registry.config('Pessac')
+    assert registry.config('Pessac')['segment_immobilier'] == 'universitaire'
+    assert registry.departements[registry.row('Pessac')] == '33'
+
+
+def test_unknown_commune_gets_default_config(registry):
+    assert registry.row('Inconnue') == -1
+    assert registry.name('Inconnue') == 'Inconnue'
+    assert dict(registry.config('Inconnue')) == dict(registry.default)
+    columns = registry.columns(['Pessac', 'Inconnue'])
+    np.testing.assert_array_equal(columns['prix_m2_base'],
+                                  [registry.config('Pessac')['prix_m2_base'], registry.default['prix_m2_base']])
+
+
+def test_registry_is_loaded_once_and_read_only(registry):
+    assert commune_registry() is registry
+    assert CommuneRegistry.load() is registry
+    with pytest.raises(ValueError):
+        registry.arrays['prix_m2_base'][0] = 0
+    with pytest.raises(TypeError):
+        registry.config('Pessac')['prix_m2_base'] = 0
+
+
+def test_csv_registry_matches_json_registry(registry, tmp_path):
+    path = tmp_path / 'communes.csv'
+    rows = [{"insee": code, "nom": name, "specialites": ';'.join(registry.config(name)['specialites']),
+             **{key: value for key, value in registry.config(name).items() if key != 'specialites'}}
+            for name, code in zip(registry.names, registry.insee)]
+    pd.DataFrame(rows).to_csv(path, index=False)
+    loaded = CommuneRegistry.load(str(path))
+    assert loaded.names == registry.names
+    assert loaded.config('33318') == registry.config('33318')
@@ -0,0 +1,35 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from Bord import BordeauxCommuneImmobilierAnalyzer, BordeauxMetropoleBatch, generate_national_dataset
+
+COMMUNES = ['Bordeaux', 'Pessac', 'Talence']
+
+
+def _commune(commune, **options):
+    return BordeauxCommuneImmobilierAnalyzer(commune, seed=11, **options).generate_financial_data()
+
+
+def test_same_seed_same_data_and_other_seed_other_data():
+    pd.testing.assert_frame_equal(_commune('Pessac'), _commune('Pessac'))
+    other = BordeauxCommuneImmobilierAnalyzer('Pessac', seed=12).generate_financial_data()
+    assert not other['Prix_m2_Moyen'].equals(_commune('Pessac')['Prix_m2_Moyen'])
+
+
+@pytest.mark.parametrize('frequency', ['A', 'Q'])
+def test_batch_panel_equals_per_commune_runs(frequency):
+    panel = BordeauxMetropoleBatch(COMMUNES, seed=11, frequency=frequency).generate_financial_data()
+    for commune in COMMUNES:
+        rows = panel[panel['Commune'] == commune].drop(columns='Commune').reset_index(drop=True)
+        pd.testing.assert_frame_equal(rows, _commune(commune, frequency=frequency))
+
+
+def test_national_dataset_does_not_depend_on_workers(tmp_path):
+    frames = []
+    for workers in (1, 2):
+        output_dir = tmp_path / f'national_{workers}'
+        generate_national_dataset(str(output_dir), seed=11, start_year=2015, end_year=2020,
+                                  partition='lot', partition_size=10, max_workers=workers)
+        frames.append(pd.read_parquet(output_dir).sort_values(['Insee', 'Annee'], ignore_index=True))
+    pd.testing.assert_frame_equal(*frames)